@@ -1,13 +1,84 @@
 import asyncio
 import logging
+import time
 
-from config import Config
+from components.device_tracker import get_state_cache, publish_device_state, set_state_sink
+from config import Config, ConfigDiff
+from mqtt.discovery.run_discovery import (
+	add_devices_discovery,
+	remove_devices_discovery,
+	run_discovery,
+	update_device_discovery,
+)
+from mqtt.cluster_node import get_cluster_node
+from mqtt.device_sensors import get_device_sensors
+from mqtt.outbox import outbox
 from mqtt.start_mqtt_loop import start_mqtt_loop, stop_mqtt_loop
+from mqtt.topic_registry import clear_device_states, get_topic_registry, publish_state
+from mqtt.types import HomeState
+from utils.config_watcher import ConfigWatcher
+from utils.http_server import start_http_server, start_unix_http_server
+from utils.metrics import metrics_route, monitor_loop_lag, startup_clock
+from utils.presence_api import PresenceIndex, presence_routes
+from utils.presence_history import PresenceHistory
+from utils.presence_snapshot import PresenceSnapshot, SnapshotEntry
 from utils.scan import BluetoothScanner
 from utils.read_config import read_config
 
 logger = logging.getLogger("app")
 
+def apply_config_diff(diff: ConfigDiff, scanner: BluetoothScanner, presence_index: PresenceIndex | None) -> None:
+	"""Apply only the devices that changed in a reloaded config, keeping MQTT and the scanner running"""
+	added = [device.address for device in diff.added]
+	removed = [device.address for device in diff.removed]
+	registry = get_topic_registry()
+	removed_topics = registry.remove_devices(removed)
+	remove_devices_discovery(removed_topics)
+	add_devices_discovery(registry.add_devices(diff.added))
+	state_cache = get_state_cache()
+	for address in removed:
+		state_cache.forget(address)
+	cluster_node = get_cluster_node()
+	if cluster_node is not None:
+		cluster_node.forget(removed)
+	device_sensors = get_device_sensors()
+	if device_sensors is not None:
+		device_sensors.forget(removed)
+	if presence_index is not None:
+		presence_index.forget(removed)
+		presence_index.track(diff.added)
+	scanner.update_devices(added, removed)
+	# after the scanner dropped them, so no late state re-creates the topics
+	clear_device_states(removed_topics)
+
+def restore_names(config: Config, restored: dict[str, SnapshotEntry]) -> None:
+	for address, entry in restored.items():
+		device = config.devices.get(address)
+		if device is not None and device.name is None and entry.name is not None:
+			device.name = entry.name
+
+def restore_states(config: Config, restored: dict[str, SnapshotEntry]) -> None:
+	"""Queue the saved states, they are published retained as soon as MQTT connects"""
+	states = 0
+	for address, entry in restored.items():
+		if entry.state is None or address not in config.devices:
+			continue
+		try:
+			publish_device_state(address, HomeState(entry.state))
+			states += 1
+		except ValueError:
+			logger.warning("Ignoring saved state %s of %s", entry.state, address)
+	logger.info("Restored %d of %d device states", states, len(config.devices))
+
+def watch_first_states(config: Config) -> None:
+	state_cache = get_state_cache()
+
+	def on_state(address: str, state: HomeState) -> None:
+		if len(state_cache) >= len(config.devices):
+			startup_clock.all_states_known()
+
+	state_cache.add_listener(on_state)
+
 async def app_main(): 
 	# read devices_list from config.json
 	raw_config = read_config()
@@ -17,9 +88,57 @@ async def app_main():
 	logger.info("Raw config read: %s", raw_config)
 	config = Config.init(raw_config)
 	logger.info("Config initialized: %s", config)
+	watch_first_states(config)
+	snapshot: PresenceSnapshot | None = None
+	restored: dict[str, SnapshotEntry] = {}
+	if config.snapshot_path:
+		snapshot = PresenceSnapshot(config.snapshot_path)
+		restored = snapshot.load()
+		restore_names(config, restored)
+	# topics and discovery payloads are built once, discovery is published when MQTT connects
+	run_discovery()
+	config.devices.add_name_listener(update_device_discovery)
+	outbox.configure(config.outbox_size, config.outbox_spool_path, config.mqtt_qos)
+	cluster_node = get_cluster_node()
+	if cluster_node is not None:
+		logger.info("Cluster node %s in room %s, aggregator: %s", cluster_node.node_id, cluster_node.room, cluster_node.aggregator)
+		# states go to the cluster, only the aggregator publishes device tracker states
+		set_state_sink(cluster_node.on_local_state)
+		cluster_node.attach()
+	else:
+		set_state_sink(publish_state)
+	history: PresenceHistory | None = None
+	if config.history_path:
+		history = PresenceHistory(config.history_path)
+	presence_index: PresenceIndex | None = None
+	if config.presence_api_port > 0 or config.presence_api_socket:
+		presence_index = PresenceIndex()
+		presence_index.track(config.devices)
+		presence_index.restore(restored)
+		get_state_cache().add_listener(presence_index.record_state)
+		config.devices.add_name_listener(presence_index.record_name)
+	if snapshot is not None:
+		restore_states(config, restored)
+		config.devices.add_name_listener(lambda device: snapshot.record_name(device.address, device.name))
+		get_state_cache().add_listener(lambda address, state: snapshot.record_state(address, state.value))
+	if history is not None:
+		# after the restored states, which are not transitions
+		get_state_cache().add_listener(lambda address, state: history.record_state(address, state, time.time()))
 	# Start MQTT client in background
 	start_mqtt_loop(config.mqtt_host, config.mqtt_port, config.mqtt_username, config.mqtt_password)
 
+	background_tasks: list[asyncio.Task[None]] = []
+	servers: list[asyncio.Server] = []
+	if config.metrics_port > 0:
+		servers.append(await start_http_server(config.metrics_host, config.metrics_port, {"/metrics": metrics_route}))
+		background_tasks.append(asyncio.create_task(monitor_loop_lag()))
+	if presence_index is not None:
+		routes = presence_routes(presence_index)
+		if config.presence_api_port > 0:
+			servers.append(await start_http_server(config.presence_api_host, config.presence_api_port, routes))
+		if config.presence_api_socket:
+			servers.append(await start_unix_http_server(config.presence_api_socket, routes))
+
 	# Create a shutdown event
 	shutdown_event = asyncio.Event()
 	
@@ -27,12 +146,43 @@ async def app_main():
 		logger.info("Shutdown signal received")
 		shutdown_event.set()
 
+	scanner = BluetoothScanner(snapshot=snapshot, restored=restored)
+	if snapshot is not None:
+		scanner.add_sighting_listener(snapshot.record_sighting)
+	if history is not None:
+		scanner.add_sighting_listener(history.record_sighting)
+	if presence_index is not None:
+		scanner.add_sighting_listener(presence_index.record_sighting)
+	if cluster_node is not None:
+		scanner.add_sighting_listener(cluster_node.on_sighting)
+		background_tasks.append(asyncio.create_task(cluster_node.run()))
+	device_sensors = get_device_sensors()
+	if device_sensors is not None:
+		device_sensors.history = scanner.presence.history
+		scanner.add_sighting_listener(device_sensors.on_sighting)
+		background_tasks.append(asyncio.create_task(device_sensors.run()))
+	elif config.device_sensors:
+		logger.warning("device_sensors is not supported in cluster mode, the room sensors cover it")
+	if config.config_reload_interval > 0:
+		watcher = ConfigWatcher(lambda diff: apply_config_diff(diff, scanner, presence_index), config.config_reload_interval)
+		background_tasks.append(asyncio.create_task(watcher.run()))
 	try:
-		await BluetoothScanner().scan_loop(shutdown_event)
+		await scanner.scan_loop(shutdown_event)
 	except KeyboardInterrupt:
 		logger.info("Shutting down...")
 		signal_handler()
 	except Exception as e:
 		logger.error("Error in app: %s", e)
 	finally:
-		stop_mqtt_loop()
+		scanner.close()
+		if snapshot is not None:
+			snapshot.close()
+		if history is not None:
+			history.close()
+		if cluster_node is not None:
+			cluster_node.close()
+		for task in background_tasks:
+			task.cancel()
+		for server in servers:
+			server.close()
+		await stop_mqtt_loop()
@@ -0,0 +1,97 @@
+"""
+Throughput of the multi-adapter fan-in path: several fake adapters feed
+advertisements into one BluetoothScanner running in continuous mode.
+
+Run from the repository root:
+	python -m benchmarks.bench_adapter_fan_in
+"""
+import asyncio
+import random
+import time
+
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from benchmarks.bench_devices_list import make_address
+from config import Config
+from utils.scan import BluetoothScanner
+from utils.scanner_backend import DetectionCallback, ScannerBackend
+
+ADAPTERS = ["hci0", "hci1", "hci2", "hci3"]
+TRACKED_DEVICES = 1_000
+UNTRACKED_DEVICES = 4_000
+ADVERTISEMENTS_PER_ADAPTER = 50_000
+
+
+class FakeAdapterBackend(ScannerBackend):
+	def __init__(self, adapter: str | None, detection_callback: DetectionCallback):
+		super().__init__(adapter or "default", detection_callback)
+
+	async def start(self) -> None:
+		pass
+
+	async def stop(self) -> None:
+		pass
+
+
+def make_advertisement(rssi: int) -> AdvertisementData:
+	return AdvertisementData(
+		local_name=None,
+		manufacturer_data={},
+		service_data={},
+		service_uuids=[],
+		tx_power=None,
+		rssi=rssi,
+		platform_data=(),
+	)
+
+
+def main() -> None:
+	rng = random.Random(0)
+	addresses = [make_address(index) for index in range(TRACKED_DEVICES + UNTRACKED_DEVICES)]
+	Config.init({
+		"devices_list": addresses[:TRACKED_DEVICES],
+		"automatic_scan": 0,
+		"continuous_scan": True,
+		"adapters": ADAPTERS,
+		"mqtt_host": "localhost",
+		"mqtt_port": 1883,
+		"mqtt_username": "",
+		"mqtt_password": "",
+	})
+
+	scanner = BluetoothScanner(FakeAdapterBackend)
+	devices = [BLEDevice(address, None, None) for address in addresses]
+	advertisements = [make_advertisement(rssi) for rssi in range(-100, -30)]
+	streams = [
+		[(rng.choice(devices), rng.choice(advertisements)) for _ in range(ADVERTISEMENTS_PER_ADAPTER)]
+		for _ in scanner.backends
+	]
+
+	async def run() -> float:
+		shutdown_event = asyncio.Event()
+		scan_task = asyncio.create_task(scanner.scan_loop(shutdown_event))
+		# let the scan loop start the fake adapters
+		await asyncio.sleep(0.1)
+
+		started_at = time.perf_counter()
+		for backend, stream in zip(scanner.backends, streams):
+			for device, advertisement in stream:
+				backend.dispatch(device, advertisement)
+			# let other tasks run between adapter batches, as the event loop would
+			await asyncio.sleep(0)
+		elapsed = time.perf_counter() - started_at
+
+		shutdown_event.set()
+		await scan_task
+		return elapsed
+
+	elapsed = asyncio.run(run())
+	total = ADVERTISEMENTS_PER_ADAPTER * len(ADAPTERS)
+	print(f"{total} advertisements from {len(ADAPTERS)} adapters in {elapsed:.3f}s ({total / elapsed:,.0f} adv/s)")
+	for backend in scanner.backends:
+		print(f"  {backend.name}: {backend.stats.advertisements} advertisements, {backend.stats.tracked_sightings} tracked sightings")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,133 @@
+"""
+Several cluster nodes in one process, talking through an in-process broker
+stand-in: placement accuracy, observation message size, aggregation cost and
+state publishes while devices move between rooms and a node drops off.
+
+Run from the repository root:
+	python -m benchmarks.bench_cluster --nodes 4 --devices 1000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.bench_devices_list import make_address
+from benchmarks.in_process_mqtt import InProcessBroker, InProcessMqttClient
+from components.room_sensor import get_room_sensor_state_topic
+from config import Config
+from mqtt import cluster_node
+from mqtt.cluster_node import ClusterNode
+from mqtt.outbox import outbox
+from mqtt.types import HomeState
+
+TOPIC_PREFIX = "bench/cluster"
+# share of the devices that move to another room every round
+MOVING_SHARE = 0.1
+# chance a node other than the one in the device's room hears it
+OVERHEAR_CHANCE = 0.5
+
+
+def hear(node_index: int, room_index: int, rng: random.Random) -> int | None:
+	if node_index == room_index:
+		return rng.randint(-60, -45)
+	if rng.random() < OVERHEAR_CHANCE:
+		return rng.randint(-95, -70)
+	return None
+
+
+def observe(nodes: list[ClusterNode], rooms: dict[str, int], addresses: list[str], rng: random.Random) -> None:
+	for index, node in enumerate(nodes):
+		for address in addresses:
+			rssi = hear(index, rooms[address], rng)
+			if rssi is None:
+				node.on_local_state(address, HomeState.not_home)
+			else:
+				node.on_sighting(address, rssi, time.time())
+				node.on_local_state(address, HomeState.home)
+
+
+def tick(nodes: list[ClusterNode], now: float) -> float:
+	started_at = time.perf_counter()
+	# the aggregator goes last, so it places the devices with every node's latest observations
+	for node in [*nodes[1:], nodes[0]]:
+		node.tick(now)
+	return time.perf_counter() - started_at
+
+
+def count_misplaced(aggregator_client: InProcessMqttClient, nodes: list[ClusterNode], rooms: dict[str, int]) -> int:
+	latest: dict[str, str | bytes] = {}
+	for message in aggregator_client.messages:
+		latest[message.topic] = message.payload
+	return sum(
+		latest.get(get_room_sensor_state_topic(address)) != nodes[room].room
+		for address, room in rooms.items()
+	)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--nodes", type=int, default=4)
+	parser.add_argument("--devices", type=int, default=1000)
+	parser.add_argument("--rounds", type=int, default=10)
+	args = parser.parse_args()
+	if args.nodes < 2:
+		raise SystemExit("--nodes must be at least 2")
+
+	addresses = [make_address(index) for index in range(args.devices)]
+	Config.init({
+		"devices_list": addresses,
+		"automatic_scan": 0,
+		"mqtt_host": "localhost",
+		"mqtt_port": 1883,
+		"mqtt_username": "",
+		"mqtt_password": "",
+	})
+	broker = InProcessBroker()
+	clients = [InProcessMqttClient(broker) for _ in range(args.nodes)]
+	nodes = [
+		ClusterNode(client, f"node{index}", f"room{index}", TOPIC_PREFIX, aggregator=index == 0)
+		for index, client in enumerate(clients)
+	]
+	# the aggregator publishes device tracker and room states through the outbox
+	outbox.client = clients[0]
+	outbox.on_connected()
+	for node in nodes:
+		node.attach()
+		node.subscribe()
+
+	rng = random.Random(0)
+	rooms = {address: rng.randrange(args.nodes) for address in addresses}
+	now = time.monotonic() + cluster_node.PUBLISH_INTERVAL
+	observe(nodes, rooms, addresses, rng)
+	elapsed = tick(nodes, now)
+	observation_sizes = [
+		len(message.payload) for message in clients[1].messages if message.topic.startswith(TOPIC_PREFIX)
+	]
+	print(f"{args.nodes} nodes, {args.devices} devices, observations message up to {max(observation_sizes)} bytes")
+	print(f"initial placement: {elapsed * 1000:.1f} ms, {count_misplaced(clients[0], nodes, rooms)} devices misplaced")
+
+	tick_time = 0.0
+	published = len(clients[0].messages)
+	for _ in range(args.rounds):
+		moving = rng.sample(addresses, int(len(addresses) * MOVING_SHARE))
+		for address in moving:
+			rooms[address] = (rooms[address] + rng.randrange(1, args.nodes)) % args.nodes
+		observe(nodes, rooms, moving, rng)
+		now += cluster_node.PUBLISH_INTERVAL
+		tick_time += tick(nodes, now)
+	state_publishes = len(clients[0].messages) - published
+	print(
+		f"{args.rounds} rounds moving {MOVING_SHARE:.0%} of the devices: {tick_time / args.rounds * 1000:.2f} ms per round, "
+		f"{state_publishes} aggregator publishes, {count_misplaced(clients[0], nodes, rooms)} devices misplaced"
+	)
+
+	dropped = nodes[-1]
+	clients[-1].drop()
+	orphaned = [address for address, room in rooms.items() if room == len(nodes) - 1]
+	homeless = sum(nodes[0].view.resolve(address).room is None for address in orphaned)
+	print(f"{dropped.node_id} dropped off: {len(orphaned)} devices re-placed, {homeless} of them not heard by any other node")
+	owners = {node.node_id: sum(node.owns(address) for address in addresses) for node in nodes[:-1]}
+	print(f"targeted scan shards: {owners}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,45 @@
+"""
+Lookup cost of DevicesList from 10 to 100k devices.
+
+Run from the repository root:
+	python -m benchmarks.bench_devices_list
+"""
+import random
+import timeit
+
+from config import Device, DevicesList
+
+SIZES = [10, 100, 1_000, 10_000, 100_000]
+LOOKUPS = 100_000
+
+
+def make_address(index: int) -> str:
+	return ":".join(f"{byte:02X}" for byte in index.to_bytes(6, "big"))
+
+
+def bench_lookup(size: int, rng: random.Random) -> dict[str, float]:
+	devices = DevicesList([Device(make_address(index)) for index in range(size)])
+	addresses = [make_address(rng.randrange(size)) for _ in range(LOOKUPS)]
+	variants = {
+		"canonical": addresses,
+		"lower_case": [address.lower() for address in addresses],
+		"underscore": [address.replace(":", "_") for address in addresses],
+	}
+
+	results: dict[str, float] = {}
+	for name, keys in variants.items():
+		elapsed = timeit.timeit(lambda: [devices.get(key) for key in keys], number=1)
+		results[name] = elapsed / len(keys) * 1e9
+	return results
+
+
+def main() -> None:
+	rng = random.Random(0)
+	print(f"{'devices':>10} {'canonical ns':>14} {'lower_case ns':>14} {'underscore ns':>14}")
+	for size in SIZES:
+		results = bench_lookup(size, rng)
+		print(f"{size:>10} {results['canonical']:>14.1f} {results['lower_case']:>14.1f} {results['underscore']:>14.1f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,57 @@
+"""
+Discovery messages and bytes sent for every configured device and the service
+entities, with per-entity discovery and with device-based discovery.
+
+Run from the repository root:
+	python -m benchmarks.bench_discovery --devices 1000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.bench_devices_list import make_address
+from config import Config
+from mqtt.discovery import run_discovery
+from mqtt.topic_registry import TopicRegistry
+
+
+def measure(config: Config, device_discovery: bool, room_sensors: bool, device_sensors: bool) -> tuple[int, int, float]:
+	config.device_discovery = device_discovery
+	started_at = time.perf_counter()
+	registry = TopicRegistry(config.devices, room_sensors, device_sensors, device_discovery)
+	messages = [message for topics in registry for message in topics.discovery]
+	elapsed = time.perf_counter() - started_at
+	messages.extend(
+		(topic, json.dumps(payload)) for topic, payload in run_discovery.get_service_discovery_messages()
+	)
+	return len(messages), sum(len(topic) + len(payload) for topic, payload in messages), elapsed
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--devices", type=int, default=1000)
+	args = parser.parse_args()
+
+	config = Config.init({
+		"devices_list": [make_address(index) for index in range(args.devices)],
+		"automatic_scan": 0,
+		"mqtt_host": "localhost",
+		"mqtt_port": 1883,
+		"mqtt_username": "",
+		"mqtt_password": "",
+	})
+	for label, room_sensors, device_sensors in (
+		("tracker + scan button", False, False),
+		("with room sensor", True, False),
+		("with device sensors", False, True),
+	):
+		per_entity = measure(config, False, room_sensors, device_sensors)
+		per_device = measure(config, True, room_sensors, device_sensors)
+		print(f"{args.devices} devices, {label}:")
+		for name, (count, size, elapsed) in (("per-entity", per_entity), ("device-based", per_device)):
+			print(f"  {name:<13} {count:>7} messages {size / 1024:>10.1f} KiB, built in {elapsed * 1000:.1f} ms")
+		print(f"  {per_entity[1] / per_device[1]:.1f}x fewer bytes, {per_entity[0] / per_device[0]:.1f}x fewer messages")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,63 @@
+"""
+Resolution cost of 10k rotating private addresses against 100 IRKs: one address
+at a time, in batches, and from the cache. Needs the cryptography package.
+
+Run from the repository root:
+	python -m benchmarks.bench_irk_resolver
+"""
+import random
+import timeit
+
+from benchmarks.bench_devices_list import make_address
+from utils import irk_resolver
+from utils.irk_resolver import IrkResolver
+
+IRKS = 100
+ADDRESSES = 10_000
+# share of the addresses that belong to a configured device
+RESOLVABLE = 0.1
+BATCH_SIZES = [1, 64, 1024]
+
+
+def make_private_address(irk: bytes | None, rng: random.Random) -> str:
+	prand = bytes([0x40 | rng.randrange(0x40), rng.randrange(256), rng.randrange(256)])
+	if irk is None:
+		address_hash = rng.randbytes(3)
+	else:
+		encryptor = irk_resolver.aes_ecb(irk).encryptor()
+		address_hash = (encryptor.update(bytes(13) + prand) + encryptor.finalize())[13:]
+	return (prand + address_hash).hex(":").upper()
+
+
+def main() -> None:
+	if not irk_resolver.is_available():
+		raise SystemExit("This benchmark needs the cryptography package: pip install -e .[irk]")
+
+	rng = random.Random(0)
+	irks = {make_address(index): rng.randbytes(16) for index in range(IRKS)}
+	keys = list(irks.values())
+	addresses = [
+		make_private_address(rng.choice(keys) if rng.random() < RESOLVABLE else None, rng)
+		for _ in range(ADDRESSES)
+	]
+
+	print(f"{IRKS} IRKs, {ADDRESSES} private addresses")
+	print(f"{'batch':>10} {'us/address':>12} {'resolved':>10}")
+	for batch_size in BATCH_SIZES:
+		resolver = IrkResolver(irks, cache_size=ADDRESSES)
+
+		def resolve_all() -> None:
+			for start in range(0, ADDRESSES, batch_size):
+				resolver.resolve_batch(addresses[start:start + batch_size])
+
+		elapsed = timeit.timeit(resolve_all, number=1)
+		print(f"{batch_size:>10} {elapsed / ADDRESSES * 1e6:>12.2f} {resolver.resolved:>10}")
+
+	resolver = IrkResolver(irks, cache_size=ADDRESSES)
+	resolver.resolve_batch(addresses)
+	cached = timeit.timeit(lambda: [resolver.cached(address) for address in addresses], number=1)
+	print(f"{'cached':>10} {cached / ADDRESSES * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,108 @@
+"""
+Detection callback throughput of the continuous scan mode, with the presence
+decisions on the event loop and with the pipeline mode that hands them to a
+worker process through the shared-memory ring. The presence API and device
+sensors listen to the sightings, as they would in a full setup.
+
+Run from the repository root:
+	python -m benchmarks.bench_pipeline --advertisements 400000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from bleak.backends.device import BLEDevice
+
+from benchmarks.bench_adapter_fan_in import ADAPTERS, FakeAdapterBackend, make_advertisement
+from benchmarks.bench_devices_list import make_address
+from components.device_tracker import get_state_cache
+from config import Config
+from mqtt.device_sensors import DeviceSensors
+from utils.presence_api import PresenceIndex
+from utils.scan import BluetoothScanner
+from utils.sensor_throttle import SensorThrottle
+
+# share of the advertisements that come from tracked devices
+TRACKED_SHARE = 0.5
+
+
+async def run(scanner: BluetoothScanner, streams: list[list[tuple[BLEDevice, object]]]) -> tuple[float, float]:
+	"""Seconds spent in the detection callbacks, and until the worker processed every sighting"""
+	shutdown_event = asyncio.Event()
+	scan_task = asyncio.create_task(scanner.scan_loop(shutdown_event))
+	# let the scan loop start the fake adapters and the worker
+	await asyncio.sleep(1.0)
+
+	started_at = time.perf_counter()
+	for backend, stream in zip(scanner.backends, streams):
+		for device, advertisement in stream:
+			backend.dispatch(device, advertisement)  # pyright: ignore[reportArgumentType]
+		await asyncio.sleep(0)
+	ingested = time.perf_counter() - started_at
+
+	pipeline = scanner._pipeline  # pyright: ignore[reportPrivateUsage]
+	while pipeline is not None and pipeline.ring.stats()["depth"] > 0:
+		await asyncio.sleep(0.001)
+	# the last events travel back through the pipe
+	await asyncio.sleep(0.1)
+	processed = time.perf_counter() - started_at
+
+	shutdown_event.set()
+	await scan_task
+	return ingested, processed
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--devices", type=int, default=1000)
+	parser.add_argument("--advertisements", type=int, default=400_000)
+	args = parser.parse_args()
+
+	rng = random.Random(0)
+	addresses = [make_address(index) for index in range(args.devices * 2)]
+	config = Config.init({
+		"devices_list": addresses[:args.devices],
+		"automatic_scan": 0,
+		"continuous_scan": True,
+		"adapters": ADAPTERS,
+		"mqtt_host": "localhost",
+		"mqtt_port": 1883,
+		"mqtt_username": "",
+		"mqtt_password": "",
+		"snapshot_path": "",
+	})
+	tracked = [BLEDevice(address, None, None) for address in addresses[:args.devices]]
+	untracked = [BLEDevice(address, None, None) for address in addresses[args.devices:]]
+	advertisements = [make_advertisement(rssi) for rssi in range(-100, -30)]
+	per_adapter = args.advertisements // len(ADAPTERS)
+	streams = [
+		[
+			(rng.choice(tracked) if rng.random() < TRACKED_SHARE else rng.choice(untracked), rng.choice(advertisements))
+			for _ in range(per_adapter)
+		]
+		for _ in ADAPTERS
+	]
+	total = per_adapter * len(ADAPTERS)
+
+	for pipeline in (False, True):
+		config.pipeline = pipeline
+		for address in addresses:
+			get_state_cache().forget(address)
+		scanner = BluetoothScanner(FakeAdapterBackend)
+		presence_index = PresenceIndex()
+		presence_index.track(config.devices)
+		scanner.add_sighting_listener(presence_index.record_sighting)
+		device_sensors = DeviceSensors(SensorThrottle(30, 300, 3, 0.5, 20), scanner.presence.history, lambda address, reading: None)
+		scanner.add_sighting_listener(device_sensors.on_sighting)
+		sent_before = get_state_cache().sent
+		ingested, processed = asyncio.run(run(scanner, streams))  # pyright: ignore[reportArgumentType]
+		label = "pipeline" if pipeline else "in-process"
+		print(
+			f"{label:<11} callbacks {total / ingested:>11,.0f} adv/s ({ingested / total * 1e6:.2f} us each), "
+			f"all decided after {processed:.3f}s, {get_state_cache().sent - sent_before} state changes"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,89 @@
+"""
+Query cost of the presence history over months of data at a thousand devices.
+Needs the numpy package.
+
+Run from the repository root:
+	python -m benchmarks.bench_presence_history --devices 1000 --days 90
+"""
+import argparse
+import os
+import tempfile
+import timeit
+
+from benchmarks.bench_devices_list import make_address
+from utils import presence_history
+from utils.presence_history import (
+	DEVICES_FILE,
+	HEADER_SIZE,
+	KIND_HOME,
+	KIND_NOT_HOME,
+	KIND_SIGHTING,
+	MAGIC,
+	SEGMENT_SECONDS,
+	HistoryReader,
+	segment_path,
+)
+
+FIRST_DAY = 20_000
+TRANSITIONS_PER_DAY = 20
+SIGHTINGS_PER_DAY = 96
+
+
+def write_history(directory: str, reader: HistoryReader, devices: int, days: int) -> int:
+	np = presence_history.np
+	assert np is not None
+	rng = np.random.default_rng(0)
+	with open(os.path.join(directory, DEVICES_FILE), "w", encoding="utf-8") as f:
+		f.writelines(make_address(index) + "\n" for index in range(devices))
+
+	total = 0
+	per_device = TRANSITIONS_PER_DAY + SIGHTINGS_PER_DAY
+	for day in range(FIRST_DAY, FIRST_DAY + days):
+		records = np.zeros(devices * per_device, dtype=reader.dtype)
+		records["device"] = np.repeat(np.arange(devices, dtype=np.uint32), per_device)
+		records["time"] = day * SEGMENT_SECONDS + rng.uniform(0, SEGMENT_SECONDS, len(records))
+		kinds = np.tile(
+			np.array([KIND_HOME, KIND_NOT_HOME] * (TRANSITIONS_PER_DAY // 2) + [KIND_SIGHTING] * SIGHTINGS_PER_DAY),
+			devices,
+		)
+		records["kind"] = kinds
+		records["rssi"] = np.where(kinds == KIND_SIGHTING, rng.integers(-100, -30, len(records)), 0)
+		records = records[np.argsort(records["time"], kind="stable")]
+		with open(segment_path(directory, day), "wb") as f:
+			f.write(MAGIC.ljust(HEADER_SIZE, b"\0"))
+			records.tofile(f)
+		total += len(records)
+	return total
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--devices", type=int, default=1000)
+	parser.add_argument("--days", type=int, default=90)
+	args = parser.parse_args()
+	if presence_history.np is None:
+		raise SystemExit("This benchmark needs the numpy package: pip install -e .[history]")
+
+	with tempfile.TemporaryDirectory() as directory:
+		reader = HistoryReader(directory)
+		records = write_history(directory, reader, args.devices, args.days)
+		print(f"{args.devices} devices, {args.days} days, {records} records, {records * reader.dtype.itemsize / 1e6:.0f} MB")
+
+		start = FIRST_DAY * SEGMENT_SECONDS
+		end = start + args.days * SEGMENT_SECONDS
+		week = end - 7 * SEGMENT_SECONDS
+		address = make_address(args.devices // 2)
+		queries = {
+			"dwell time, 1 device, 1 week": lambda: reader.dwell_time(address, week, end),
+			f"dwell time, 1 device, {args.days} days": lambda: reader.dwell_time(address, start, end),
+			"transitions, 1 device, 1 week": lambda: reader.transitions(address, week, end),
+			f"hourly occupancy, {args.devices} devices, 1 week": lambda: reader.hourly_occupancy(week, end),
+			f"hourly occupancy, {args.devices} devices, {args.days} days": lambda: reader.hourly_occupancy(start, end),
+		}
+		for name, query in queries.items():
+			elapsed = min(timeit.repeat(query, number=1, repeat=3))
+			print(f"{name:<45} {elapsed * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+	main()
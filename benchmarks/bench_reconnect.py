@@ -0,0 +1,89 @@
+"""
+Cost of (re)subscribing the command listeners and of routing a command message,
+against the number of tracked devices. The per-device column reproduces the
+previous approach of one subscription and one callback per scan button.
+
+Run from the repository root:
+	python -m benchmarks.bench_reconnect
+"""
+import time
+from typing import Any
+
+import paho.mqtt.client as mqtt
+
+from benchmarks.bench_devices_list import make_address
+from components.scan_device_button import get_scan_button_command_topic
+from config import Device
+from mqtt.listeners import CommandRouter, subscribe_commands
+from mqtt.topic_registry import TopicRegistry
+
+SIZES = [10, 1_000, 10_000, 100_000]
+DISPATCHES = 100_000
+
+
+class CountingClient:
+	"""Records SUBSCRIBE packets and topic filters instead of sending them"""
+
+	def __init__(self):
+		self.subscribe_packets = 0
+		self.topic_filters = 0
+		self.callbacks: dict[str, Any] = {}
+
+	def subscribe(self, topic: str | list[tuple[str, int]]) -> None:
+		self.subscribe_packets += 1
+		self.topic_filters += len(topic) if isinstance(topic, list) else 1
+
+	def message_callback_add(self, topic: str, callback: Any) -> None:
+		self.callbacks[topic] = callback
+
+
+def per_device_subscribe(client: CountingClient, addresses: list[str]) -> None:
+	for address in addresses:
+		topic = get_scan_button_command_topic(address)
+		client.subscribe(topic)
+		client.message_callback_add(topic, None)
+
+
+def main() -> None:
+	print(
+		f"{'devices':>8} {'routes ms':>10} {'reconnect ms':>13} {'packets':>8} "
+		f"{'per-device ms':>14} {'packets':>8} {'dispatch ns':>12}"
+	)
+	for size in SIZES:
+		addresses = [make_address(index) for index in range(size)]
+
+		# the routes are built once with the topic registry, only the subscription is repeated on reconnect
+		started_at = time.perf_counter()
+		router = CommandRouter(TopicRegistry(Device(address) for address in addresses))
+		routes_ms = (time.perf_counter() - started_at) * 1000
+
+		started_at = time.perf_counter()
+		client = CountingClient()
+		subscribe_commands(client, router)  # pyright: ignore[reportArgumentType]
+		reconnect_ms = (time.perf_counter() - started_at) * 1000
+
+		started_at = time.perf_counter()
+		legacy_client = CountingClient()
+		per_device_subscribe(legacy_client, addresses)
+		per_device_ms = (time.perf_counter() - started_at) * 1000
+
+		# route messages for unknown topics so no handler runs, only the lookup
+		messages: list[mqtt.MQTTMessage] = []
+		for index in range(min(size, 1000)):
+			message = mqtt.MQTTMessage(topic=f"homeassistant/button/other_{index}/command".encode())
+			messages.append(message)
+		rounds = DISPATCHES // len(messages)
+		started_at = time.perf_counter()
+		for _ in range(rounds):
+			for message in messages:
+				router.dispatch(client, None, message)  # pyright: ignore[reportArgumentType]
+		dispatch_ns = (time.perf_counter() - started_at) / (rounds * len(messages)) * 1e9
+
+		print(
+			f"{size:>8} {routes_ms:>10.2f} {reconnect_ms:>13.3f} {client.subscribe_packets:>8} "
+			f"{per_device_ms:>14.2f} {legacy_client.subscribe_packets:>8} {dispatch_ns:>12.1f}"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,47 @@
+"""
+Sample insert cost, EMA lookup cost and memory of RssiHistory from 1k to 50k devices.
+
+Run from the repository root:
+	python -m benchmarks.bench_rssi_history
+"""
+import random
+import timeit
+import tracemalloc
+
+from benchmarks.bench_devices_list import make_address
+from utils.rssi_history import RssiHistory
+
+SIZES = [1_000, 10_000, 50_000]
+HISTORY_SIZE = 16
+SAMPLES = 200_000
+
+
+def bench(size: int, rng: random.Random) -> tuple[float, float, float]:
+	addresses = [make_address(index) for index in range(size)]
+	samples = [(rng.choice(addresses), rng.randint(-100, -30)) for _ in range(SAMPLES)]
+
+	tracemalloc.start()
+	history = RssiHistory(HISTORY_SIZE)
+	history.track(addresses)
+	memory, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	def add_all() -> None:
+		for now, (address, rssi) in enumerate(samples):
+			history.add(address, rssi, float(now))
+
+	add_ns = timeit.timeit(add_all, number=1) / SAMPLES * 1e9
+	ema_ns = timeit.timeit(lambda: [history.ema(address) for address in addresses], number=1) / size * 1e9
+	return add_ns, ema_ns, memory / 1e6
+
+
+def main() -> None:
+	rng = random.Random(0)
+	print(f"{'devices':>10} {'add ns':>10} {'ema ns':>10} {'memory MB':>10}")
+	for size in SIZES:
+		add_ns, ema_ns, memory = bench(size, rng)
+		print(f"{size:>10} {add_ns:>10.1f} {ema_ns:>10.1f} {memory:>10.2f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,89 @@
+import time
+from typing import Any, NamedTuple
+
+import paho.mqtt.client as mqtt
+
+
+class PublishedMessage(NamedTuple):
+	timestamp: float
+	topic: str
+	payload: str | bytes
+	qos: int
+	retain: bool
+
+
+class InProcessBroker:
+	"""Routes messages between in-process clients and keeps the retained ones"""
+
+	def __init__(self):
+		self.clients: list["InProcessMqttClient"] = []
+		self.retained: dict[str, str | bytes] = {}
+
+	def route(self, topic: str, payload: str | bytes, retain: bool) -> None:
+		if retain:
+			if payload:
+				self.retained[topic] = payload
+			else:
+				self.retained.pop(topic, None)
+		for client in list(self.clients):
+			client.deliver(topic, payload)
+
+
+class InProcessMqttClient:
+	"""
+	Stand-in for the paho client that keeps every published message in memory.
+	Attached to an InProcessBroker it also delivers messages to the subscribers,
+	so several nodes can talk to each other in one process.
+	"""
+
+	def __init__(self, broker: InProcessBroker | None = None):
+		self.messages: list[PublishedMessage] = []
+		self.broker = broker
+		self._mid = 0
+		self._subscriptions: list[str] = []
+		self._callbacks: list[tuple[str, Any]] = []
+		self._will: tuple[str, str | bytes, bool] | None = None
+		if broker is not None:
+			broker.clients.append(self)
+
+	def publish(self, topic: str, payload: str | bytes, qos: int = 0, retain: bool = False) -> mqtt.MQTTMessageInfo:
+		self._mid += 1
+		self.messages.append(PublishedMessage(time.monotonic(), topic, payload, qos, retain))
+		if self.broker is not None:
+			self.broker.route(topic, payload, retain)
+		info = mqtt.MQTTMessageInfo(self._mid)
+		info.rc = mqtt.MQTT_ERR_SUCCESS
+		return info
+
+	def is_connected(self) -> bool:
+		return True
+
+	def will_set(self, topic: str, payload: str | bytes | None = None, qos: int = 0, retain: bool = False) -> None:
+		self._will = (topic, payload or b"", retain)
+
+	def message_callback_add(self, sub: str, callback: Any) -> None:
+		self._callbacks.append((sub, callback))
+
+	def subscribe(self, topic: str, qos: int = 0) -> None:
+		self._subscriptions.append(topic)
+		if self.broker is not None:
+			for retained_topic, payload in list(self.broker.retained.items()):
+				if mqtt.topic_matches_sub(topic, retained_topic):
+					self.deliver(retained_topic, payload)
+
+	def deliver(self, topic: str, payload: str | bytes) -> None:
+		if not any(mqtt.topic_matches_sub(sub, topic) for sub in self._subscriptions):
+			return
+		msg = mqtt.MQTTMessage(topic=topic.encode("utf-8"))
+		msg.payload = payload.encode("utf-8") if isinstance(payload, str) else payload
+		for sub, callback in self._callbacks:
+			if mqtt.topic_matches_sub(sub, topic):
+				callback(self, None, msg)
+
+	def drop(self) -> None:
+		"""Lose the connection without disconnecting, so the broker publishes the will"""
+		if self.broker is None:
+			return
+		self.broker.clients.remove(self)
+		if self._will is not None:
+			self.broker.route(*self._will)
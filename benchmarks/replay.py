@@ -0,0 +1,149 @@
+"""
+End-to-end benchmark without Bluetooth hardware or a broker: a synthetic scanner
+backend feeds generated or recorded advertisements into BluetoothScanner, and
+an in-process stand-in replaces the MQTT client.
+
+Run from the repository root:
+	python -m benchmarks.replay --rate 50000 --devices 5000 --tracked 500
+	python -m benchmarks.replay --replay session.btadv
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.bench_devices_list import make_address
+from benchmarks.in_process_mqtt import InProcessMqttClient
+from components.device_tracker import get_device_tracker_state_topic, set_state_sink
+from config import Config
+from mqtt.outbox import outbox
+from mqtt.topic_registry import STATE_PAYLOADS, publish_state
+from mqtt.types import HomeState
+from utils.advertisement_recording import RecordedAdvertisement, read_recording
+from utils.metrics import detection_callback_duration
+from utils.scan import BluetoothScanner
+from utils.scanner_backend import DetectionCallback, ScannerBackend
+from utils.synthetic_backend import PresenceWindows, SyntheticScannerBackend, generate_advertisements
+
+# share of the tracked devices that leave and come back during the run, and when
+LEAVING_SHARE = 0.2
+LEAVE_AT = 0.25
+RETURN_AT = 0.75
+
+
+def parse_args() -> argparse.Namespace:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--rate", type=float, default=50_000, help="advertisements per second")
+	parser.add_argument("--devices", type=int, default=5_000, help="distinct advertising MACs")
+	parser.add_argument("--tracked", type=int, default=500, help="MACs listed in devices_list")
+	parser.add_argument("--duration", type=float, default=10, help="seconds of generated advertisements")
+	parser.add_argument("--away-timeout", type=int, default=2, help="away_timeout in continuous mode")
+	parser.add_argument("--mode", choices=["continuous", "cycle"], default="continuous")
+	parser.add_argument("--replay", help="replay a recording instead of generating advertisements")
+	parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor")
+	return parser.parse_args()
+
+
+def summarize(latencies: list[float]) -> str:
+	if not latencies:
+		return "n/a"
+	ordered = sorted(latencies)
+	p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+	return f"mean {statistics.mean(ordered):.3f}s, p50 {statistics.median(ordered):.3f}s, p95 {p95:.3f}s, n={len(ordered)}"
+
+
+def first_publish_after(client: InProcessMqttClient, topic: str, payload: bytes, after: float) -> float | None:
+	for message in client.messages:
+		if message.topic == topic and message.payload == payload and message.timestamp >= after:
+			return message.timestamp
+	return None
+
+
+def main() -> None:
+	args = parse_args()
+
+	advertisements: list[RecordedAdvertisement]
+	presence: PresenceWindows = {}
+	if args.replay:
+		advertisements = list(read_recording(args.replay))
+		tracked = sorted({advertisement.address for advertisement in advertisements})
+		duration = advertisements[-1].offset if advertisements else 0
+	else:
+		addresses = [make_address(index) for index in range(args.devices)]
+		tracked = addresses[:args.tracked]
+		duration = args.duration
+		leaving = tracked[:int(len(tracked) * LEAVING_SHARE)]
+		presence = {address: [(0, duration * LEAVE_AT), (duration * RETURN_AT, duration)] for address in leaving}
+		if duration * (RETURN_AT - LEAVE_AT) <= args.away_timeout:
+			parser_error = "--duration is too short for devices to be away longer than --away-timeout"
+			raise SystemExit(parser_error)
+		advertisements = list(generate_advertisements(addresses, args.rate, duration, presence))
+
+	Config.init({
+		"devices_list": tracked,
+		"automatic_scan": 1,
+		"continuous_scan": args.mode == "continuous",
+		"away_timeout": args.away_timeout,
+		"state_refresh_interval": 0,
+		"mqtt_host": "localhost",
+		"mqtt_port": 1883,
+		"mqtt_username": "",
+		"mqtt_password": "",
+	})
+	client = InProcessMqttClient()
+	outbox.client = client
+	outbox.on_connected()
+	set_state_sink(publish_state)
+
+	backends: list[SyntheticScannerBackend] = []
+
+	def backend_factory(adapter: str | None, detection_callback: DetectionCallback) -> ScannerBackend:
+		backend = SyntheticScannerBackend(adapter or "synthetic", detection_callback, advertisements, args.speed)
+		backends.append(backend)
+		return backend
+
+	scanner = BluetoothScanner(backend_factory)
+
+	async def run() -> tuple[float, float]:
+		shutdown_event = asyncio.Event()
+		cpu_started_at = time.process_time()
+		scan_task = asyncio.create_task(scanner.scan_loop(shutdown_event))
+		await asyncio.sleep(duration / args.speed + args.away_timeout + 1)
+		shutdown_event.set()
+		await scan_task
+		return time.process_time() - cpu_started_at, backends[0].stream_started_at or 0
+
+	cpu_time, stream_started_at = asyncio.run(run())
+
+	delivered = sum(backend.stats.advertisements for backend in backends)
+	callback_count, callback_time = detection_callback_duration.snapshot()
+	print(f"advertisements delivered: {delivered} of {len(advertisements)} over {duration:.1f}s")
+	# a run without callbacks, or too short for the clocks to tick, reports 0 instead of failing
+	print(f"callback throughput: {callback_count / max(callback_time, 1e-9):,.0f} adv/s of callback time "
+		f"({callback_time / max(callback_count, 1) * 1e6:.2f} us/adv), {delivered / max(cpu_time, 1e-9):,.0f} adv/s of process CPU")
+
+	not_home_latencies: list[float] = []
+	home_latencies: list[float] = []
+	for address, windows in presence.items():
+		topic = get_device_tracker_state_topic(address)
+		for (_, left_at), (returned_at, _) in zip(windows, windows[1:]):
+			left_at = stream_started_at + left_at / args.speed
+			returned_at = stream_started_at + returned_at / args.speed
+			not_home_at = first_publish_after(client, topic, STATE_PAYLOADS[HomeState.not_home], left_at)
+			home_at = first_publish_after(client, topic, STATE_PAYLOADS[HomeState.home], returned_at)
+			if not_home_at is not None:
+				not_home_latencies.append(not_home_at - left_at)
+			if home_at is not None:
+				home_latencies.append(home_at - returned_at)
+	if presence:
+		print(f"not_home detection latency: {summarize(not_home_latencies)}")
+		print(f"home detection latency: {summarize(home_latencies)}")
+
+	state_messages = [message for message in client.messages if message.topic.endswith("/state")]
+	print(f"publishes: {len(client.messages)} total, {len(state_messages)} state, "
+		f"{sum(message.payload == STATE_PAYLOADS[HomeState.home] for message in state_messages)} home, "
+		f"{sum(message.payload == STATE_PAYLOADS[HomeState.not_home] for message in state_messages)} not_home")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,253 @@
+"""
+Microbenchmarks of the pure-Python hot paths at 10, 1k and 100k devices, with
+machine-readable results and a regression check against a stored baseline.
+
+Run from the repository root:
+	python -m benchmarks.suite --output results.json
+	python -m benchmarks.suite --check benchmarks/baseline.json --runs 3
+	python -m benchmarks.suite --update-baseline benchmarks/baseline.json
+
+Per-operation timings depend on the machine, so by default only the scaling
+curves are compared: the cost at every size relative to the smallest size. A
+path that used to be flat and now grows with the device count fails the
+check on any machine. --absolute also compares the raw timings, which is only
+meaningful on the machine that recorded the baseline. --runs repeats the
+suite and compares the median of every timing, so one noisy run on a shared
+CI runner does not fail the check.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import timeit
+from typing import Callable
+
+import paho.mqtt.client as mqtt
+from bleak.backends.device import BLEDevice
+
+from benchmarks.bench_adapter_fan_in import FakeAdapterBackend, make_advertisement
+from benchmarks.bench_devices_list import make_address
+from components.device_tracker import (
+	get_device_tracker_config_topic,
+	get_device_tracker_discovery_message,
+	get_device_tracker_state_topic,
+)
+from components.scan_device_button import (
+	get_device_address_from_topic,
+	get_scan_button_command_topic,
+	get_scan_button_config_topic,
+)
+from config import Config
+from mqtt.outbox import outbox
+from mqtt.send_event import send_event
+from mqtt.topic_registry import TopicRegistry, get_device_discovery_messages
+from utils.presence_api import PresenceIndex
+from utils.scan import BluetoothScanner, ScanContext
+from utils.sensor_throttle import SensorThrottle
+
+SIZES = [10, 1_000, 100_000]
+# operations per timing run, and timing runs per case; the fastest run counts
+OPERATIONS = 20_000
+REPEAT = 5
+DEFAULT_THRESHOLD = 0.3
+# share of the advertisements that come from tracked devices
+TRACKED_SHARE = 0.1
+
+# case name -> size -> nanoseconds per operation
+Results = dict[str, dict[str, float]]
+Case = Callable[[], object]
+# runs a case, returning nanoseconds per operation
+Timing = Callable[[], float]
+
+
+class NullMqttClient:
+	"""Accepts publishes without keeping them, so send_event is measured without the broker"""
+
+	def publish(self, topic: str, payload: str | bytes, qos: int = 0, retain: bool = False) -> mqtt.MQTTMessageInfo:
+		return _published
+
+
+_published = mqtt.MQTTMessageInfo(0)
+
+
+def configure(addresses: list[str]) -> Config:
+	raw_config = {
+		"devices_list": addresses,
+		"automatic_scan": 0,
+		"mqtt_host": "localhost",
+		"mqtt_port": 1883,
+		"mqtt_username": "",
+		"mqtt_password": "",
+		"snapshot_path": "",
+	}
+	# the first call initializes the config, the reload switches the device list of later sizes
+	config = Config.init(raw_config)
+	config.reload(raw_config)
+	return config
+
+
+def make_cases(size: int, rng: random.Random) -> dict[str, Timing]:
+	addresses = [make_address(index) for index in range(size)]
+	config = configure(addresses)
+	picked = [rng.choice(addresses) for _ in range(OPERATIONS)]
+	picked_lower = [address.lower() for address in picked]
+	picked_devices = [config.devices[address] for address in picked[:OPERATIONS // 10]]
+	button_topics = [get_scan_button_config_topic(address) for address in picked]
+	registry = TopicRegistry(config.devices)
+	command_topics = [get_scan_button_command_topic(address) for address in picked]
+	picked_topics = [registry.get(device.address) for device in picked_devices]
+
+	scanner = BluetoothScanner(FakeAdapterBackend)
+	backend = scanner.backends[0]
+	# tracked devices are sighted during a scan that already found them
+	scanner._current_scan = ScanContext(not_found_devices=set(), started_at=0.0)  # pyright: ignore[reportPrivateUsage]
+	untracked = [BLEDevice(make_address(size + index), None, None) for index in range(1_000)]
+	tracked = [BLEDevice(address, None, None) for address in picked[:1_000]]
+	advertisements = [make_advertisement(rssi) for rssi in range(-100, -30)]
+	sightings = [
+		(rng.choice(tracked) if rng.random() < TRACKED_SHARE else rng.choice(untracked), rng.choice(advertisements))
+		for _ in range(OPERATIONS)
+	]
+	on_device_found = backend.detection_callback
+	throttle = SensorThrottle(30, 300, 3, 0.5, 20)
+	readings = [(address, float(rng.randint(-95, -45))) for address in picked]
+	clock = iter(range(1 << 62))
+
+	def record_sensor_readings() -> None:
+		now = float(next(clock))
+		for address, rssi in readings:
+			throttle.record(address, rssi, now, now)
+		throttle.due(now)
+
+	presence_index = PresenceIndex()
+	presence_index.track(config.devices)
+
+	def send_discovery() -> None:
+		for device in picked_devices:
+			for topic, payload in get_device_discovery_messages(device):
+				send_event(topic, payload)
+
+	cases: dict[str, Case] = {
+		"devices_list_get": lambda: [config.devices.get(address) for address in picked],
+		"devices_list_get_lower_case": lambda: [config.devices.get(address) for address in picked_lower],
+		"device_tracker_topics": lambda: [
+			(get_device_tracker_config_topic(address), get_device_tracker_state_topic(address)) for address in picked
+		],
+		"scan_button_topics": lambda: [
+			(get_scan_button_config_topic(address), get_scan_button_command_topic(address)) for address in picked
+		],
+		"device_address_from_topic": lambda: [get_device_address_from_topic(topic) for topic in button_topics],
+		"device_tracker_discovery_message": lambda: [
+			get_device_tracker_discovery_message(device) for device in picked_devices
+		],
+		# picked_devices has a tenth of the operations, with two messages per device
+		"discovery_send_event": send_discovery,
+		"registry_state_topic": lambda: [registry.state_topic(address) for address in picked],
+		"registry_command_lookup": lambda: [registry.by_command_topic(topic) for topic in command_topics],
+		"registry_discovery_send_event": lambda: [
+			send_event(topic, payload) for topics in picked_topics if topics for topic, payload in topics.discovery
+		],
+		"sensor_throttle_record": record_sensor_readings,
+		"presence_index_sighting": lambda: [presence_index.record_sighting(address, -60, 0.0) for address in picked],
+		# within LAST_SEEN_RESOLUTION of the first request, the cached responses are served
+		"presence_api_device": lambda: [presence_index.device(address, 0.0) for address in picked],
+		"presence_api_snapshot": lambda: [presence_index.snapshot(0.0) for _ in picked],
+		"on_device_found": lambda: [on_device_found(device, advertisement, backend) for device, advertisement in sightings],
+	}
+	operations = {
+		"device_tracker_discovery_message": len(picked_devices),
+		"discovery_send_event": sum(len(get_device_discovery_messages(device)) for device in picked_devices),
+		"registry_discovery_send_event": sum(len(get_device_discovery_messages(device)) for device in picked_devices),
+	}
+	return {name: _per_operation(case, operations.get(name, OPERATIONS)) for name, case in cases.items()}
+
+
+def _per_operation(case: Case, operations: int) -> Timing:
+	def run() -> float:
+		return min(timeit.repeat(case, number=1, repeat=REPEAT)) / operations * 1e9
+	return run
+
+
+def run_suite(sizes: list[int], runs: int = 1) -> Results:
+	"""Median timings over `runs` runs of every case"""
+	rng = random.Random(0)
+	outbox.client = NullMqttClient()
+	outbox.on_connected()
+	samples: dict[str, dict[str, list[float]]] = {}
+	for size in sizes:
+		cases = make_cases(size, rng)
+		for _ in range(runs):
+			for name, case in cases.items():
+				samples.setdefault(name, {}).setdefault(str(size), []).append(case())
+	return {
+		name: {size: round(statistics.median(timings), 1) for size, timings in by_size.items()}
+		for name, by_size in samples.items()
+	}
+
+
+def compare(results: Results, baseline: Results, threshold: float, absolute: bool) -> list[str]:
+	"""Regressions beyond `threshold`, as readable lines"""
+	regressions: list[str] = []
+	for name, timings in sorted(results.items()):
+		expected = baseline.get(name)
+		if not expected:
+			continue
+		sizes = sorted((size for size in timings if size in expected), key=int)
+		if not sizes:
+			continue
+		smallest = sizes[0]
+		for size in sizes:
+			if absolute and timings[size] > expected[size] * (1 + threshold):
+				regressions.append(
+					f"{name} at {size} devices: {timings[size]:.0f} ns, baseline {expected[size]:.0f} ns"
+				)
+			if size == smallest:
+				continue
+			growth = timings[size] / timings[smallest]
+			expected_growth = expected[size] / expected[smallest]
+			if growth > expected_growth * (1 + threshold):
+				regressions.append(
+					f"{name} scales {growth:.2f}x from {smallest} to {size} devices, baseline {expected_growth:.2f}x"
+				)
+	return regressions
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+	parser.add_argument("--output", help="write the results as JSON")
+	parser.add_argument("--check", metavar="BASELINE", help="exit with status 1 on regressions against this baseline")
+	parser.add_argument("--update-baseline", metavar="BASELINE", help="store the results as the new baseline")
+	parser.add_argument("--runs", type=int, default=1, help="repeat the suite and compare the median timings")
+	parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, 0.3 is 30%%")
+	parser.add_argument("--absolute", action="store_true", help="also compare per-operation timings")
+	args = parser.parse_args()
+
+	results = run_suite(sorted(args.sizes), max(args.runs, 1))
+	sizes = [str(size) for size in sorted(args.sizes)]
+	print(f"{'case':<36}" + "".join(f"{size + ' ns':>14}" for size in sizes))
+	for name, timings in results.items():
+		print(f"{name:<36}" + "".join(f"{timings[size]:>14.1f}" for size in sizes))
+
+	document = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+	for path in (args.output, args.update_baseline):
+		if path:
+			with open(path, "w", encoding="utf-8") as f:
+				json.dump(document, f, indent=2, sort_keys=True)
+				f.write("\n")
+
+	if args.check:
+		with open(args.check, "r", encoding="utf-8") as f:
+			baseline = json.load(f)["results"]
+		regressions = compare(results, baseline, args.threshold, args.absolute)
+		for regression in regressions:
+			print(f"REGRESSION: {regression}")
+		if regressions:
+			sys.exit(1)
+		print(f"No regressions beyond {args.threshold:.0%} against {args.check}")
+
+
+if __name__ == "__main__":
+	main()
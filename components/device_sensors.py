@@ -0,0 +1,61 @@
+import json
+from datetime import datetime, timezone
+from typing import NotRequired
+
+from config import Device
+from mqtt.discovery.components import Components
+from mqtt.discovery.device_payload import device_payload
+from mqtt.discovery.discovery_payload import DiscoveryPayload
+from utils.sensor_throttle import SensorReading
+
+# sensor -> (name, unit, device class)
+DEVICE_SENSORS: dict[str, tuple[str, str | None, str]] = {
+	"rssi": ("RSSI", "dBm", "signal_strength"),
+	"distance": ("Distance", "m", "distance"),
+	"last_seen": ("Last Seen", None, "timestamp"),
+}
+
+def get_device_sensor_config_topic(sensor: str, device_address: str):
+	safeDeviceAddress = device_address.replace(":", "_")
+	return f"homeassistant/{Components.Sensor.value}/{sensor}_{safeDeviceAddress}/config"
+
+def get_device_sensors_state_topic(device_address: str):
+	"""One JSON state topic shared by the sensors of a device"""
+	safeDeviceAddress = device_address.replace(":", "_")
+	return f"homeassistant/{Components.Sensor.value}/sensors_{safeDeviceAddress}/state"
+
+class DeviceSensorDiscoveryPayload(DiscoveryPayload):
+	state_topic: str
+	value_template: str
+	device_class: str
+	state_class: NotRequired[str]
+	entity_category: str
+
+def get_device_sensor_discovery_messages(device: Device) -> list[tuple[str, DeviceSensorDiscoveryPayload]]:
+	safe_device_address = device.address.replace(":", "_")
+	device_name = device.name if device.name is not None else safe_device_address
+	state_topic = get_device_sensors_state_topic(device.address)
+
+	messages: list[tuple[str, DeviceSensorDiscoveryPayload]] = []
+	for sensor, (name, unit, device_class) in DEVICE_SENSORS.items():
+		discovery_payload = DeviceSensorDiscoveryPayload(
+			name=f"{name} {device_name}",
+			unique_id=f"{sensor}_{safe_device_address}",
+			device=device_payload,
+			state_topic=state_topic,
+			value_template=f"{{{{ value_json.{sensor} }}}}",
+			device_class=device_class,
+			entity_category="diagnostic",
+		)
+		if unit is not None:
+			discovery_payload["unit_of_measurement"] = unit
+			discovery_payload["state_class"] = "measurement"
+		messages.append((get_device_sensor_config_topic(sensor, device.address), discovery_payload))
+	return messages
+
+def format_device_sensors_state(reading: SensorReading) -> str:
+	return json.dumps({
+		"rssi": reading.rssi,
+		"distance": reading.distance,
+		"last_seen": datetime.fromtimestamp(reading.last_seen, timezone.utc).isoformat(timespec="seconds"),
+	})
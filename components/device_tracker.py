@@ -1,12 +1,15 @@
 import enum
 import logging
-from typing import NotRequired
-from config import Device
+import time
+from collections import OrderedDict
+from typing import Callable, NotRequired
+from config import Config, Device
 from mqtt.discovery.components import Components
 from mqtt.discovery.device_payload import device_payload
 from mqtt.discovery.discovery_payload import DiscoveryPayload
-from mqtt.send_event import DeviceStatusUpdateData, send_event
+from mqtt.send_event import DeviceStatusUpdateData
 from mqtt.types import HomeState
+from utils.metrics import Counter, registry
 
 logger = logging.getLogger("components.device_tracker")
 
@@ -39,8 +42,7 @@ def get_device_tracker_state_topic(device_address: str):
 	return f"{coreTopic}/state"
 
 
-def publish_discovery_message_for_device_tracker(device: Device):
-	logger.info(f"Publishing discovery message for {device.address}")
+def get_device_tracker_discovery_message(device: Device) -> tuple[str, DeviceTrackerDiscoveryPayload]:
 	discovery_topic = get_device_tracker_config_topic(device.address)
 	state_topic = get_device_tracker_state_topic(device.address)
 	safe_device_address = device.address.replace(":", "_")
@@ -57,12 +59,131 @@ def publish_discovery_message_for_device_tracker(device: Device):
 		"source_type": SourceType.bluetooth_le
 	}
 
-	send_event(discovery_topic, discovery_payload)
+	return discovery_topic, discovery_payload
+
+class PresenceStateCache:
+	"""
+	Last published state per device. Only transitions are published; unchanged
+	states are re-sent as a keep-alive once per `refresh_interval` seconds, at most
+	`refresh_rate` refreshes per second. A `refresh_interval` of 0 disables refreshes.
+	"""
+	def __init__(self, refresh_interval: float, refresh_rate: float):
+		self.refresh_interval = refresh_interval
+		self.refresh_rate = refresh_rate
+		# ordered by last publish time, oldest first
+		self._states: OrderedDict[str, tuple[HomeState, float]] = OrderedDict()
+		self._refresh_tokens = refresh_rate
+		self._refresh_tokens_at = 0.0
+		self._listeners: list[Callable[[str, HomeState], None]] = []
+		self.sent = 0
+		self.suppressed = 0
+		self.refreshed = 0
+
+	def __len__(self) -> int:
+		return len(self._states)
+
+	def add_listener(self, listener: Callable[[str, HomeState], None]) -> None:
+		"""Call `listener` whenever a device changes state"""
+		self._listeners.append(listener)
+
+	def get_state(self, address: str) -> HomeState | None:
+		entry = self._states.get(address)
+		return entry[0] if entry is not None else None
+
+	def record(self, address: str, state: HomeState, now: float) -> bool:
+		"""Store the state and return whether it must be published"""
+		entry = self._states.get(address)
+		if entry is not None and entry[0] == state:
+			self.suppressed += 1
+			return False
+		self._states[address] = (state, now)
+		self._states.move_to_end(address)
+		self.sent += 1
+		for listener in self._listeners:
+			listener(address, state)
+		return True
+
+	def forget(self, address: str) -> None:
+		self._states.pop(address, None)
+
+	def due_refreshes(self, now: float) -> list[tuple[str, HomeState]]:
+		if self.refresh_interval <= 0 or self.refresh_rate <= 0:
+			return []
+
+		self._refresh_tokens = min(
+			self.refresh_rate,
+			self._refresh_tokens + (now - self._refresh_tokens_at) * self.refresh_rate,
+		)
+		self._refresh_tokens_at = now
+
+		due: list[tuple[str, HomeState]] = []
+		while self._states and self._refresh_tokens >= 1:
+			address, (state, published_at) = next(iter(self._states.items()))
+			if published_at + self.refresh_interval > now:
+				break
+			self._states[address] = (state, now)
+			self._states.move_to_end(address)
+			self._refresh_tokens -= 1
+			self.refreshed += 1
+			due.append((address, state))
+		return due
+
+	def next_refresh_time(self) -> float | None:
+		if self.refresh_interval <= 0 or self.refresh_rate <= 0 or not self._states:
+			return None
+		_, published_at = next(iter(self._states.values()))
+		token_wait = max(1 - self._refresh_tokens, 0) / self.refresh_rate
+		return max(published_at + self.refresh_interval, self._refresh_tokens_at + token_wait)
+
+	def stats(self) -> dict[str, int]:
+		return {"sent": self.sent, "suppressed": self.suppressed, "refreshed": self.refreshed}
+
+
+_state_cache: PresenceStateCache | None = None
+
+def get_state_cache() -> PresenceStateCache:
+	global _state_cache
+	if _state_cache is None:
+		config = Config.get_instance()
+		_state_cache = PresenceStateCache(config.state_refresh_interval, config.state_refresh_rate)
+	return _state_cache
+
+for _stat in ("sent", "suppressed", "refreshed"):
+	registry.register(Counter(
+		f"presence_publishes_{_stat}_total",
+		f"Device tracker state publishes {_stat} by the state cache",
+		lambda stat=_stat: get_state_cache().stats()[stat],
+	))
+
+StateSink = Callable[[str, HomeState], None]
+
+def _publish_state(deviceAddress: str, state: HomeState) -> None:
+	# the topic registry imports this module, so it is only looked up when publishing
+	from mqtt.topic_registry import publish_state
+	publish_state(deviceAddress, state)
+
+_state_sink: StateSink = _publish_state
+
+def set_state_sink(sink: StateSink) -> None:
+	"""Send this node's states somewhere else than the device tracker topics, e.g. to the cluster"""
+	global _state_sink
+	_state_sink = sink
+
+def publish_device_state(deviceAddress: str, state: HomeState):
+	if get_state_cache().record(deviceAddress, state, time.monotonic()):
+		_state_sink(deviceAddress, state)
+
+def refresh_device_states():
+	"""Re-publish unchanged states whose keep-alive interval elapsed"""
+	for deviceAddress, state in get_state_cache().due_refreshes(time.monotonic()):
+		_state_sink(deviceAddress, state)
+
+def log_publish_stats():
+	stats = get_state_cache().stats()
+	logger.info(f"Presence publishes: {stats['sent']} sent, {stats['suppressed']} suppressed, {stats['refreshed']} refreshed")
 
 def sendDeviceHomeEvent(device: DeviceStatusUpdateData):
-	deviceTopic = get_device_tracker_state_topic(device["address"])
-	send_event(deviceTopic, HomeState.home.value)
+	publish_device_state(device["address"], HomeState.home)
 
 def sendDeviceNotHomeEvent(deviceAddress: str):
-	deviceTopic = get_device_tracker_state_topic(deviceAddress)
-	send_event(deviceTopic, HomeState.not_home.value)
+	publish_device_state(deviceAddress, HomeState.not_home)
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import logging
+from typing import Any, cast
+from mqtt.discovery.components import Components
+from mqtt.discovery.device_payload import device_payload
+from mqtt.discovery.discovery_payload import DiscoveryPayload
+import paho.mqtt.client as mqtt
+from config import Config
+from mqtt.send_event import send_event
+from utils.profiler import ProfileResult, start_profile
+
+logger = logging.getLogger("components.profile_button")
+
+profile_button_core_topic = f"homeassistant/{Components.Button.value}/profile_button"
+
+profile_button_config_topic = f"{profile_button_core_topic}/config"
+
+profile_button_command_topic = f"{profile_button_core_topic}/command"
+
+# Profile results are published here, not retained
+diagnostics_topic = "bt-scan/diagnostics/profile"
+
+class ProfileButtonDiscoveryPayload(DiscoveryPayload):
+	command_topic: str
+	entity_category: str
+
+def get_profile_button_discovery_message() -> tuple[str, ProfileButtonDiscoveryPayload]:
+	discovery_payload = ProfileButtonDiscoveryPayload(
+		name="Profile",
+		unique_id="profile_button",
+		device=device_payload,
+		command_topic=profile_button_command_topic,
+		entity_category="diagnostic",
+	)
+	return profile_button_config_topic, discovery_payload
+
+def publish_profile(result: ProfileResult, path: str) -> None:
+	logger.info("Profile written to %s", path)
+	send_event(diagnostics_topic, {**result, "path": path})
+
+def on_profile_button_press(msg: mqtt.MQTTMessage) -> None:
+	"""
+	Home Assistant sends PRESS, which profiles with the configured defaults; a JSON
+	payload such as {"mode": "sampling", "seconds": 10} overrides them.
+	"""
+	try:
+		config = Config.get_instance()
+		options: dict[str, Any] = {}
+		try:
+			parsed = json.loads(msg.payload)
+			if isinstance(parsed, dict):
+				options = cast(dict[str, Any], parsed)
+		except ValueError:
+			pass
+		mode = options.get("mode", config.profile_mode)
+		seconds = float(options.get("seconds", config.profile_seconds))
+		if start_profile(asyncio.get_running_loop(), mode, seconds, config.profile_dir, publish_profile):
+			logger.info("Profiling with %s for %g seconds", mode, seconds)
+		else:
+			logger.warning("A profile is already running")
+	except Exception as e:
+		logger.error(f"Error starting the profile: {e}")
@@ -0,0 +1,32 @@
+from config import Device
+from mqtt.discovery.components import Components
+from mqtt.discovery.device_payload import device_payload
+from mqtt.discovery.discovery_payload import DiscoveryPayload
+
+def get_room_sensor_core_topic(device_address: str):
+	safeDeviceAddress = device_address.replace(":", "_")
+	return f"homeassistant/{Components.Sensor.value}/room_{safeDeviceAddress}"
+
+def get_room_sensor_config_topic(device_address: str):
+	return f"{get_room_sensor_core_topic(device_address)}/config"
+
+def get_room_sensor_state_topic(device_address: str):
+	return f"{get_room_sensor_core_topic(device_address)}/state"
+
+class RoomSensorDiscoveryPayload(DiscoveryPayload):
+	state_topic: str
+	icon: str
+
+def get_room_sensor_discovery_message(device: Device) -> tuple[str, RoomSensorDiscoveryPayload]:
+	"""Room of the cluster node that hears the device loudest, published by the aggregator"""
+	safe_device_address = device.address.replace(":", "_")
+	device_name = device.name if device.name is not None else safe_device_address
+
+	discovery_payload = RoomSensorDiscoveryPayload(
+		name=f"Room {device_name}",
+		unique_id=f"room_{safe_device_address}",
+		device=device_payload,
+		state_topic=get_room_sensor_state_topic(device.address),
+		icon="mdi:map-marker",
+	)
+	return get_room_sensor_config_topic(device.address), discovery_payload
@@ -2,9 +2,9 @@ import logging
 from mqtt.discovery.components import Components
 from mqtt.discovery.device_payload import device_payload
 from mqtt.discovery.discovery_payload import DiscoveryPayload
-from mqtt.send_event import send_event
 import paho.mqtt.client as mqtt
-from utils.scan import BluetoothScanner
+from config import Config
+from utils.scan_scheduler import ScanPriority, scan_scheduler
 
 logger = logging.getLogger("components.scan_all_button")
 
@@ -17,7 +17,7 @@ scan_all_button_command_topic = f"{scan_all_button_core_topic}/command"
 class ScanButtonDiscoveryPayload(DiscoveryPayload):
 	command_topic: str
 
-def publish_discovery_message_for_scan_all_button():
+def get_scan_all_button_discovery_message() -> tuple[str, ScanButtonDiscoveryPayload]:
 	discovery_topic = scan_all_button_config_topic
 	discovery_payload = ScanButtonDiscoveryPayload(
 		name="Scan All",
@@ -25,11 +25,12 @@ def publish_discovery_message_for_scan_all_button():
 		device=device_payload,
 		command_topic=scan_all_button_command_topic,
 	)
-	send_event(discovery_topic, discovery_payload)
+	return discovery_topic, discovery_payload
 
-def on_scan_all_button_press(client: mqtt.Client, userdata: None, msg: mqtt.MQTTMessage) -> None:
+def on_scan_all_button_press(msg: mqtt.MQTTMessage) -> None:
 	try:
-		BluetoothScanner.start_scanning()
 		logger.info("Received scan all button press")
+		config = Config.get_instance()
+		scan_scheduler.request(config.devices.get_addresses(), config.scan_timeout, ScanPriority.manual)
 	except Exception as e:
 		logger.error(f"Error processing scan button press: {e}")
\ No newline at end of file
@@ -1,12 +1,10 @@
 import logging
-from config import Device
+from config import Config, Device
 from mqtt.discovery.components import Components
 from mqtt.discovery.device_payload import device_payload
 from mqtt.discovery.discovery_payload import DiscoveryPayload
-from mqtt.send_event import send_event
 import paho.mqtt.client as mqtt
-
-from utils.scan import BluetoothScanner
+from utils.scan_scheduler import ScanPriority, scan_scheduler
 
 logger = logging.getLogger("components.scan_device_button")
 
@@ -25,7 +23,7 @@ def get_scan_button_command_topic(device_address: str):
 class ScanButtonDiscoveryPayload(DiscoveryPayload):
 	command_topic: str
 
-def publish_discovery_message_for_scan_button(device: Device):
+def get_scan_button_discovery_message(device: Device) -> tuple[str, ScanButtonDiscoveryPayload]:
 	discovery_topic = get_scan_button_config_topic(device.address)
 	safe_device_address = device.address.replace(":", "_")
 
@@ -37,7 +35,7 @@ def publish_discovery_message_for_scan_button(device: Device):
 		device=device_payload,
 		command_topic=get_scan_button_command_topic(device.address),
 	)
-	send_event(discovery_topic, discovery_payload)
+	return discovery_topic, discovery_payload
 
 
 def get_device_address_from_topic(topic: str) -> str:
@@ -53,10 +51,9 @@ def get_device_address_from_topic(topic: str) -> str:
 
 	return mac
 	
-def on_scan_button_press(client: mqtt.Client, userdata: None, msg: mqtt.MQTTMessage) -> None:
+def on_scan_button_press(msg: mqtt.MQTTMessage, device_address: str) -> None:
 	try:
-		device_address = get_device_address_from_topic(msg.topic)
 		logger.info(f"Received scan button press for device {device_address}")
-		BluetoothScanner.start_scanning()
+		scan_scheduler.request([device_address], Config.get_scan_timeout(), ScanPriority.manual)
 	except Exception as e:
 		logger.error(f"Error processing scan button press: {e}")
\ No newline at end of file
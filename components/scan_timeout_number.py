@@ -3,7 +3,6 @@ from config import Config
 from mqtt.discovery.components import Components
 from mqtt.discovery.device_payload import device_payload
 from mqtt.discovery.discovery_payload import DiscoveryPayload
-from mqtt.send_event import send_event
 import paho.mqtt.client as mqtt
 
 logger = logging.getLogger("components.scan_timeout_number")
@@ -26,7 +25,7 @@ class TimeoutNumberDiscoveryPayload(DiscoveryPayload):
 	state_topic: str
 
 
-def publish_discovery_message_for_timeout():
+def get_timeout_discovery_message() -> tuple[str, TimeoutNumberDiscoveryPayload]:
 	discovery_topic = get_timeout_config_topic()
 	discovery_payload = TimeoutNumberDiscoveryPayload(
 		name="Timeout",
@@ -38,9 +37,9 @@ def publish_discovery_message_for_timeout():
 		min=0,
 		max=3600
 	)
-	send_event(discovery_topic, discovery_payload)
+	return discovery_topic, discovery_payload
 
-def on_timeout_change(client: mqtt.Client, userdata: None, msg: mqtt.MQTTMessage) -> None:
+def on_timeout_change(msg: mqtt.MQTTMessage) -> None:
 	try:
 		payload_str = msg.payload.decode('utf-8')
 		new_timeout = int(payload_str)
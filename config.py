@@ -1,29 +1,132 @@
-from typing import Dict, Any, Iterator
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Iterable, Iterator
+
+from utils.irk_resolver import parse_irk
+
+def normalize_address(address: str) -> str:
+	"""Canonical form of a MAC address: upper case with ':' separators"""
+	return address.upper().replace("_", ":").replace("-", ":")
 
 class Device:
-	def __init__(self, address: str, name: str | None = None):
+	__slots__ = ("address", "name", "irk")
+
+	def __init__(self, address: str, name: str | None = None, irk: bytes | None = None):
 		self.address = address
 		self.name = name
+		# identity resolving key, for devices that advertise from rotating private addresses
+		self.irk = irk
 
 class DevicesList:
+	"""Devices indexed by normalized address, so lookups do not depend on the list size"""
 	def __init__(self, devices: list[Device]):
-		self.devices = devices
+		self._devices: dict[str, Device] = {}
+		self._name_listeners: list[Callable[[Device], None]] = []
+		self.add_devices(devices)
 	def _find_device(self, address: str) -> Device:
-		matches = list(filter(lambda device: device.address == address, self.devices))
-		if len(matches) == 0:
+		device = self._devices.get(normalize_address(address))
+		if device is None:
 			raise ValueError(f"Device with address {address} not found")
-		return matches[0]
+		return device
+	def get(self, address: str) -> Device | None:
+		return self._devices.get(normalize_address(address))
+	def add_devices(self, devices: Iterable[Device]) -> None:
+		for device in devices:
+			# the first entry wins for duplicated addresses
+			self._devices.setdefault(normalize_address(device.address), device)
+	def remove_devices(self, addresses: Iterable[str]) -> list[Device]:
+		removed: list[Device] = []
+		for address in addresses:
+			device = self._devices.pop(normalize_address(address), None)
+			if device is not None:
+				removed.append(device)
+		return removed
 	def get_addresses(self) -> list[str]:
-		return [device.address for device in self.devices]
+		return [device.address for device in self._devices.values()]
+	def get_irks(self) -> dict[str, bytes]:
+		return {device.address: device.irk for device in self._devices.values() if device.irk is not None}
 	def __getitem__(self, address: str) -> Device:
 		return self._find_device(address)
+	def add_name_listener(self, listener: Callable[[Device], None]) -> None:
+		"""Call `listener` whenever a device name changes"""
+		self._name_listeners.append(listener)
 	def set_device_name(self, address: str, name: str) -> None:
 		device = self._find_device(address)
+		if device.name == name:
+			return
 		device.name = name
+		for listener in self._name_listeners:
+			listener(device)
 	def __setitem__(self, address: str, name: str) -> None:
 		self.set_device_name(address, name)
+	def __contains__(self, address: str) -> bool:
+		return normalize_address(address) in self._devices
+	def __len__(self) -> int:
+		return len(self._devices)
 	def __iter__(self) -> Iterator[Device]:
-		return iter(self.devices)
+		return iter(self._devices.values())
+
+# Settings that are only read at startup, a reload leaves them pending until a restart
+RESTART_REQUIRED_SETTINGS = {
+	"automatic_scan",
+	"adaptive_scan",
+	"adaptive_min_interval",
+	"adaptive_max_interval",
+	"presence_enter_rssi",
+	"presence_exit_rssi",
+	"presence_enter_scans",
+	"presence_exit_scans",
+	"rssi_history_size",
+	"irk_cache_size",
+	"adapters",
+	"record_advertisements",
+	"continuous_scan",
+	"pipeline",
+	"pipeline_ring_size",
+	"away_timeout",
+	"state_refresh_interval",
+	"state_refresh_rate",
+	"mqtt_host",
+	"mqtt_port",
+	"mqtt_username",
+	"mqtt_password",
+	"metrics_host",
+	"metrics_port",
+	"presence_api_host",
+	"presence_api_port",
+	"presence_api_socket",
+	"mqtt_qos",
+	"outbox_size",
+	"outbox_spool_path",
+	"snapshot_path",
+	"history_path",
+	"config_reload_interval",
+	"cluster_node",
+	"cluster_room",
+	"cluster_aggregator",
+	"cluster_topic",
+	"device_discovery",
+	"device_sensors",
+	"sensor_interval",
+	"sensor_max_interval",
+	"sensor_rssi_deadband",
+	"sensor_distance_deadband",
+	"sensor_max_rate",
+	"sensor_rssi_at_1m",
+	"sensor_path_loss_exponent",
+}
+
+@dataclass
+class ConfigDiff:
+	added: list[Device]
+	removed: list[Device]
+	changed: list[Device]
+	# setting name -> (previous value, new value)
+	settings: dict[str, tuple[Any, Any]]
+	# restart-required settings changed in the file: setting name -> (running value, value in the file)
+	pending: dict[str, tuple[Any, Any]]
+
+	def __bool__(self) -> bool:
+		return bool(self.added or self.removed or self.changed or self.settings or self.pending)
 
 class Config:
 
@@ -40,7 +143,8 @@ class Config:
 			if isinstance(device, str):
 				devices_list.append(Device(device))
 			elif isinstance(device, dict):  # pyright: ignore[reportUnnecessaryIsInstance]
-				devices_list.append(Device(device["address"], device["name"]))
+				irk = device.get("irk")
+				devices_list.append(Device(device["address"], device["name"], parse_irk(irk) if irk else None))
 			else:
 				raise ValueError(f"Invalid device: {device}")
 		return devices_list
@@ -48,18 +152,120 @@ class Config:
 	def __init__(self, configData: Dict[str, Any]) -> None:
 		# Only initialize once
 		if not hasattr(self, '_initialized'):
-			# use only devices
-			devices_list = self._get_devices_list_from_config(configData["devices_list"])
-			self.devices: DevicesList = DevicesList(devices_list)
-			self.automatic_scan: int = configData["automatic_scan"]
-			self.scan_timeout: int = configData.get("scan_timeout", 60)
-			self.discovery_interval: int = configData.get("discovery_interval", 3600)  # Default 1 hour
-			self.mqtt_host: str = configData["mqtt_host"]
-			self.mqtt_port: int = configData["mqtt_port"]
-			self.mqtt_username: str = configData["mqtt_username"]
-			self.mqtt_password: str = configData["mqtt_password"]
+			self._load(configData)
 			self._initialized = True
 
+	def _load(self, configData: Dict[str, Any]) -> None:
+		# use only devices
+		devices_list = self._get_devices_list_from_config(configData["devices_list"])
+		self.devices: DevicesList = DevicesList(devices_list)
+		self.automatic_scan: int = configData["automatic_scan"]
+		self.scan_timeout: int = configData.get("scan_timeout", 60)
+		self.automatic_scan_timeout: int = configData.get("automatic_scan_timeout", 10)
+		self.adaptive_scan: bool = configData.get("adaptive_scan", False)
+		self.adaptive_min_interval: int = configData.get("adaptive_min_interval", 15)
+		self.adaptive_max_interval: int = configData.get("adaptive_max_interval", 3600)
+		self.presence_enter_rssi: int | None = configData.get("presence_enter_rssi")
+		self.presence_exit_rssi: int | None = configData.get("presence_exit_rssi")
+		self.presence_enter_scans: int = configData.get("presence_enter_scans", 1)
+		self.presence_exit_scans: int = configData.get("presence_exit_scans", 1)
+		self.rssi_history_size: int = configData.get("rssi_history_size", 16)
+		self.irk_cache_size: int = configData.get("irk_cache_size", 4096)
+		self.adapters: list[str] = configData.get("adapters", [])
+		self.record_advertisements: str | None = configData.get("record_advertisements")
+		self.continuous_scan: bool = configData.get("continuous_scan", False)
+		self.pipeline: bool = configData.get("pipeline", False)
+		self.pipeline_ring_size: int = configData.get("pipeline_ring_size", 65536)
+		self.away_timeout: int = configData.get("away_timeout", 180)
+		self.state_refresh_interval: int = configData.get("state_refresh_interval", 600)
+		self.state_refresh_rate: float = configData.get("state_refresh_rate", 5)
+		self.mqtt_host: str = configData["mqtt_host"]
+		self.mqtt_port: int = configData["mqtt_port"]
+		self.mqtt_username: str = configData["mqtt_username"]
+		self.mqtt_password: str = configData["mqtt_password"]
+		self.metrics_host: str = configData.get("metrics_host", "127.0.0.1")
+		self.metrics_port: int = configData.get("metrics_port", 0)
+		self.presence_api_host: str = configData.get("presence_api_host", "127.0.0.1")
+		self.presence_api_port: int = configData.get("presence_api_port", 0)
+		self.presence_api_socket: str | None = configData.get("presence_api_socket")
+		self.mqtt_qos: int = configData.get("mqtt_qos", 0)
+		self.outbox_size: int = configData.get("outbox_size", 1000)
+		self.outbox_spool_path: str = configData.get("outbox_spool_path", "outbox.spool")
+		self.snapshot_path: str | None = configData.get("snapshot_path")
+		self.history_path: str | None = configData.get("history_path")
+		self.config_reload_interval: float = configData.get("config_reload_interval", 5)
+		self.cluster_node: str | None = configData.get("cluster_node")
+		self.cluster_room: str | None = configData.get("cluster_room")
+		self.cluster_aggregator: bool = configData.get("cluster_aggregator", False)
+		self.cluster_topic: str = configData.get("cluster_topic", "bt-scan/cluster")
+		self.device_discovery: bool = configData.get("device_discovery", False)
+		self.device_sensors: bool = configData.get("device_sensors", False)
+		self.sensor_interval: float = configData.get("sensor_interval", 30)
+		self.sensor_max_interval: float = configData.get("sensor_max_interval", 300)
+		self.sensor_rssi_deadband: float = configData.get("sensor_rssi_deadband", 3)
+		self.sensor_distance_deadband: float = configData.get("sensor_distance_deadband", 0.5)
+		self.sensor_max_rate: float = configData.get("sensor_max_rate", 20)
+		self.sensor_rssi_at_1m: float = configData.get("sensor_rssi_at_1m", -59)
+		self.sensor_path_loss_exponent: float = configData.get("sensor_path_loss_exponent", 2.0)
+		self.profile_mode: str = configData.get("profile_mode", "cprofile")
+		self.profile_seconds: float = configData.get("profile_seconds", 30)
+		self.profile_dir: str = configData.get("profile_dir", "profiles")
+		# settings as read from the file, to tell file changes from runtime changes
+		self._loaded_settings: dict[str, Any] = self._settings()
+
+	def _settings(self) -> dict[str, Any]:
+		return {
+			key: value for key, value in vars(self).items()
+			if key not in ("devices", "_initialized", "_loaded_settings")
+		}
+
+	def reload(self, configData: Dict[str, Any]) -> ConfigDiff:
+		"""
+		Apply a re-read config file in place and return what changed. Existing Device
+		objects are kept, and settings that did not change in the file keep their
+		runtime value, e.g. a scan timeout set from Home Assistant. Restart-required
+		settings keep their running value and are reported as pending on every reload
+		until the file matches them again.
+		"""
+		loaded = object.__new__(Config)
+		loaded._load(configData)
+
+		settings: dict[str, tuple[Any, Any]] = {}
+		pending: dict[str, tuple[Any, Any]] = {}
+		loaded_settings = loaded._loaded_settings
+		for key, value in list(loaded_settings.items()):
+			if self._loaded_settings.get(key) == value:
+				continue
+			if key in RESTART_REQUIRED_SETTINGS:
+				pending[key] = (getattr(self, key, None), value)
+				# compared against the running value again on the next reload
+				loaded_settings[key] = self._loaded_settings.get(key)
+				continue
+			settings[key] = (getattr(self, key, None), value)
+			setattr(self, key, value)
+		self._loaded_settings = loaded_settings
+
+		added: list[Device] = []
+		changed: list[Device] = []
+		for device in loaded.devices:
+			current = self.devices.get(device.address)
+			if current is None:
+				added.append(device)
+				continue
+			if device.irk != current.irk:
+				current.irk = device.irk
+				changed.append(current)
+			if device.name is not None and device.name != current.name:
+				# notifies the name listeners, which re-publish discovery
+				self.devices.set_device_name(current.address, device.name)
+				if current not in changed:
+					changed.append(current)
+		removed = self.devices.remove_devices(
+			[device.address for device in self.devices if device.address not in loaded.devices]
+		)
+		self.devices.add_devices(added)
+		return ConfigDiff(added=added, removed=removed, changed=changed, settings=settings, pending=pending)
+
 	@staticmethod
 	def set_device_name(device_address: str, device_name: str) -> None:
 		instance = Config.get_instance()
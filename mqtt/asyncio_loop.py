@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import threading
+from typing import TYPE_CHECKING, Any
+
+import paho.mqtt.client as mqtt
+
+if TYPE_CHECKING:
+	from paho.mqtt.client import SocketLike
+
+logger = logging.getLogger("mqtt.asyncio_loop")
+
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+# loop_misc handles keepalive pings and timeouts
+MISC_INTERVAL = 1
+
+class AsyncioMqttLoop:
+	"""
+	Drives a paho client from the asyncio event loop instead of paho's network
+	thread: the socket is registered with add_reader/add_writer, keepalive runs
+	in a task, and paho callbacks, including the command handlers, run on the
+	loop thread. Reconnects back off from RECONNECT_MIN_DELAY to RECONNECT_MAX_DELAY,
+	also when the broker refuses the connection; only `connection_accepted`, called
+	from on_connect with rc 0, resets the delay.
+	"""
+	def __init__(self, loop: asyncio.AbstractEventLoop, client: mqtt.Client):
+		self.loop = loop
+		self.client = client
+		self._loop_thread = threading.get_ident()
+		self._task: asyncio.Task[None] | None = None
+		self._closed = asyncio.Event()
+		self._delay = RECONNECT_MIN_DELAY
+		client.on_socket_open = self._on_socket_open
+		client.on_socket_close = self._on_socket_close
+		client.on_socket_register_write = self._on_socket_register_write
+		client.on_socket_unregister_write = self._on_socket_unregister_write
+
+	def start(self, host: str, port: int, keepalive: int = 60) -> None:
+		# only stores the connection parameters, the connection is made by the task
+		self.client.connect_async(host, port, keepalive)
+		self._task = self.loop.create_task(self._run())
+
+	async def stop(self, timeout: float = 1.0) -> None:
+		if self._task is not None:
+			self._task.cancel()
+			self._task = None
+		if self.client.is_connected():
+			self._closed.clear()
+			self.client.disconnect()
+			try:
+				await asyncio.wait_for(self._closed.wait(), timeout)
+			except asyncio.TimeoutError:
+				logger.warning("MQTT connection did not close in %.1f seconds", timeout)
+
+	def connection_accepted(self) -> None:
+		"""The broker accepted the connection, the next reconnect is not delayed long"""
+		self._delay = RECONNECT_MIN_DELAY
+
+	async def _run(self) -> None:
+		while True:
+			try:
+				# the TCP connect blocks, so it runs in the default executor; the
+				# socket callbacks it triggers are passed back to the loop
+				await self.loop.run_in_executor(None, self.client.reconnect)
+			except (OSError, mqtt.WebsocketConnectionError) as e:
+				logger.warning("MQTT connection failed: %s, retrying in %d seconds", e, self._delay)
+				await self._back_off()
+				continue
+			# a refused CONNACK also ends up here, without resetting the delay
+			while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+				await asyncio.sleep(MISC_INTERVAL)
+			logger.info("MQTT connection lost, reconnecting in %d seconds", self._delay)
+			await self._back_off()
+
+	async def _back_off(self) -> None:
+		delay = self._delay
+		self._delay = min(delay * 2, RECONNECT_MAX_DELAY)
+		await asyncio.sleep(delay)
+
+	def _call_on_loop(self, callback: Any, *args: Any) -> None:
+		if threading.get_ident() == self._loop_thread:
+			callback(*args)
+		else:
+			self.loop.call_soon_threadsafe(callback, *args)
+
+	# paho may close a socket right after these callbacks, so they pass on its
+	# file descriptor rather than the socket object
+
+	def _on_socket_open(self, client: mqtt.Client, userdata: Any, sock: "SocketLike") -> None:
+		self._call_on_loop(self.loop.add_reader, sock.fileno(), self.client.loop_read)
+
+	def _on_socket_close(self, client: mqtt.Client, userdata: Any, sock: "SocketLike") -> None:
+		self._call_on_loop(self._remove_socket, sock.fileno())
+
+	def _remove_socket(self, fd: int) -> None:
+		self.loop.remove_reader(fd)
+		self.loop.remove_writer(fd)
+		self._closed.set()
+
+	def _on_socket_register_write(self, client: mqtt.Client, userdata: Any, sock: "SocketLike") -> None:
+		self._call_on_loop(self.loop.add_writer, sock.fileno(), self.client.loop_write)
+
+	def _on_socket_unregister_write(self, client: mqtt.Client, userdata: Any, sock: "SocketLike") -> None:
+		self._call_on_loop(self.loop.remove_writer, sock.fileno())
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+from typing import Iterable, Protocol
+
+import paho.mqtt.client as mqtt
+from config import Config, normalize_address
+from mqtt.config import mqttc
+from mqtt.send_event import send_event
+from mqtt.topic_registry import STATE_PAYLOADS, get_topic_registry
+from mqtt.types import HomeState
+from utils.cluster import (
+	UNKNOWN_RSSI,
+	ClusterView,
+	NodeObservations,
+	decode_observations,
+	encode_observations,
+	shard_owner,
+)
+
+logger = logging.getLogger("mqtt.cluster_node")
+
+# Observation changes are published together at most this often
+PUBLISH_INTERVAL = 2.0
+# Unchanged observations are re-published this often, so nodes know each other are alive
+HEARTBEAT_INTERVAL = 30.0
+NODE_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+# RSSI changes smaller than this are not worth a new observations message
+RSSI_DEADBAND = 3
+
+class ClusterClient(Protocol):
+	def publish(self, topic: str, payload: bytes | str, qos: int = 0, retain: bool = False) -> mqtt.MQTTMessageInfo: ...
+	def subscribe(self, topic: str, qos: int = 0) -> object: ...
+	def message_callback_add(self, sub: str, callback: mqtt.CallbackOnMessage) -> None: ...
+	def will_set(self, topic: str, payload: bytes | str | None = None, qos: int = 0, retain: bool = False) -> None: ...
+	def is_connected(self) -> bool: ...
+
+class ClusterNode:
+	"""
+	One node of a cluster of scanners sharing a broker. The node publishes the
+	devices it considers home and their RSSI as one retained message on
+	`<prefix>/<node id>/observations`, and follows the messages of the other
+	nodes. Only the aggregator publishes device tracker states, together with
+	the room of the loudest node, so nodes never publish conflicting states.
+	Targeted scans are sharded: a device scan button is handled by one node.
+	"""
+	def __init__(self, client: ClusterClient, node_id: str, room: str, topic_prefix: str, aggregator: bool):
+		if not node_id or any(character in node_id for character in "/+#"):
+			raise ValueError(f"Invalid cluster node id {node_id!r}")
+		self.client = client
+		self.node_id = node_id
+		self.room = room
+		self.topic_prefix = topic_prefix
+		self.aggregator = aggregator
+		self.view = ClusterView(NODE_TIMEOUT)
+		# devices this node considers home and their latest RSSI
+		self._home: dict[str, int] = {}
+		self._rssi: dict[str, int] = {}
+		# observations as last published
+		self._sent: dict[str, int] = {}
+		self._dirty = True
+		self._published_at = float("-inf")
+		# devices whose placement must be re-evaluated
+		self._pending: set[str] = set()
+		# published (state, room) per device
+		self._placements: dict[str, tuple[HomeState, str]] = {}
+		# placements wait until the retained observations arrived after subscribing
+		self._ready_at: float | None = None
+
+	@property
+	def observations_topic(self) -> str:
+		return f"{self.topic_prefix}/{self.node_id}/observations"
+
+	def attach(self) -> None:
+		"""Must be called before connecting: the broker clears the observations if the node drops off"""
+		self.client.will_set(self.observations_topic, b"", retain=True)
+
+	def subscribe(self) -> None:
+		topic_filter = f"{self.topic_prefix}/+/observations"
+		self.client.message_callback_add(topic_filter, self.on_message)
+		self.client.subscribe(topic_filter, 0)
+		self._dirty = True
+		self._pending.update(normalize_address(address) for address in Config.get_instance().devices.get_addresses())
+		self._ready_at = time.monotonic() + PUBLISH_INTERVAL
+		try:
+			asyncio.get_running_loop().call_later(PUBLISH_INTERVAL, lambda: self._apply_pending(time.monotonic()))
+		except RuntimeError:
+			pass
+
+	def on_local_state(self, address: str, state: HomeState) -> None:
+		"""State sink of this node's scanner"""
+		address = normalize_address(address)
+		if state == HomeState.home:
+			if address not in self._home:
+				self._home[address] = self._rssi.get(address, UNKNOWN_RSSI)
+				self._dirty = True
+		elif self._home.pop(address, None) is not None:
+			self._dirty = True
+
+	def on_sighting(self, address: str, rssi: int, seen_at: float) -> None:
+		address = normalize_address(address)
+		self._rssi[address] = rssi
+		if address in self._home:
+			self._home[address] = rssi
+			if abs(rssi - self._sent.get(address, UNKNOWN_RSSI)) >= RSSI_DEADBAND:
+				self._dirty = True
+
+	def on_message(self, client: mqtt.Client, userdata: None, msg: mqtt.MQTTMessage) -> None:
+		node_id = msg.topic[len(self.topic_prefix) + 1:].split("/", 1)[0]
+		if node_id == self.node_id:
+			return
+		if not msg.payload:
+			logger.info("Cluster node %s left", node_id)
+			self._pending |= self.view.remove(node_id)
+		else:
+			try:
+				observations = decode_observations(msg.payload)
+			except (ValueError, UnicodeDecodeError) as e:
+				logger.warning("Ignoring observations of cluster node %s: %s", node_id, e)
+				return
+			if node_id not in self.view.nodes():
+				logger.info("Cluster node %s joined from room %s", node_id, observations.room)
+			self._pending |= self.view.update(node_id, observations, time.monotonic())
+		self._apply_pending(time.monotonic())
+
+	def owns(self, address: str) -> bool:
+		"""Whether this node handles targeted scans of the device"""
+		nodes = set(self.view.nodes())
+		nodes.add(self.node_id)
+		return shard_owner(normalize_address(address), nodes) == self.node_id
+
+	def forget(self, addresses: Iterable[str]) -> None:
+		normalized = [normalize_address(address) for address in addresses]
+		for address in normalized:
+			self._rssi.pop(address, None)
+			self._placements.pop(address, None)
+			if self._home.pop(address, None) is not None:
+				self._dirty = True
+		self.view.forget(normalized)
+
+	def tick(self, now: float) -> None:
+		self._pending |= self.view.expire(now)
+		if self._dirty or now - self._published_at >= HEARTBEAT_INTERVAL:
+			self._publish(now)
+		# this node's own observations never go through the broker
+		self._pending |= self.view.update(self.node_id, NodeObservations(self.room, dict(self._home)), now)
+		self._apply_pending(now)
+
+	async def run(self) -> None:
+		while True:
+			self.tick(time.monotonic())
+			await asyncio.sleep(PUBLISH_INTERVAL)
+
+	def close(self) -> None:
+		"""Leave the cluster; the other nodes drop this node's observations right away"""
+		if self.client.is_connected():
+			self.client.publish(self.observations_topic, b"", retain=True)
+
+	def _publish(self, now: float) -> None:
+		if not self.client.is_connected():
+			return
+		info = self.client.publish(self.observations_topic, encode_observations(self.room, self._home), retain=True)
+		if info.rc != mqtt.MQTT_ERR_SUCCESS:
+			logger.warning("Failed to publish cluster observations: %s", info.rc)
+			return
+		self._sent = dict(self._home)
+		self._dirty = False
+		self._published_at = now
+
+	def _apply_pending(self, now: float) -> None:
+		if not self.aggregator:
+			self._pending.clear()
+			return
+		if self._ready_at is None or now < self._ready_at or not self._pending:
+			return
+		pending = self._pending
+		self._pending = set()
+		registry = get_topic_registry()
+		for address in sorted(pending):
+			topics = registry.get(address)
+			if topics is None:
+				continue
+			placement = self.view.resolve(address)
+			state = HomeState.home if placement.home else HomeState.not_home
+			room = placement.room if placement.room is not None else HomeState.not_home.value
+			previous = self._placements.get(address)
+			if previous is None or previous[0] != state:
+				send_event(topics.tracker_state, STATE_PAYLOADS[state], retain=True)
+			if previous is None or previous[1] != room:
+				logger.info("Device %s room: %s", topics.address, room)
+				send_event(topics.room_state, room, retain=True)
+			self._placements[address] = (state, room)
+
+_cluster_node: ClusterNode | None = None
+
+def get_cluster_node() -> ClusterNode | None:
+	"""The cluster node of this instance, or None when `cluster_node` is not configured"""
+	global _cluster_node
+	config = Config.get_instance()
+	if _cluster_node is None and config.cluster_node:
+		_cluster_node = ClusterNode(
+			mqttc,
+			config.cluster_node,
+			config.cluster_room or config.cluster_node,
+			config.cluster_topic,
+			config.cluster_aggregator,
+		)
+	return _cluster_node
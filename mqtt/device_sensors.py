@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Iterable
+
+from config import Config
+from mqtt.topic_registry import publish_sensor_state
+from utils.metrics import Counter, registry
+from utils.rssi_history import RssiHistory
+from utils.sensor_throttle import SensorReading, SensorThrottle
+
+logger = logging.getLogger("mqtt.device_sensors")
+
+# How often waiting readings and keep-alives are checked, in seconds
+TICK_INTERVAL = 1.0
+
+class DeviceSensors:
+	"""
+	Turns the sightings of the tracked devices into RSSI, distance and last seen
+	sensor states. With an RSSI history the smoothed RSSI is reported instead of
+	the raw value of each advertisement.
+	"""
+	def __init__(
+		self,
+		throttle: SensorThrottle,
+		history: RssiHistory | None = None,
+		publish: Callable[[str, SensorReading], None] = publish_sensor_state,
+	):
+		self.throttle = throttle
+		self.history = history
+		self.publish = publish
+
+	def on_sighting(self, address: str, rssi: int, seen_at: float) -> None:
+		ema = self.history.ema(address) if self.history is not None else None
+		reading = self.throttle.record(address, rssi if ema is None else ema, seen_at, time.monotonic())
+		if reading is not None:
+			self.publish(address, reading)
+
+	def tick(self, now: float) -> None:
+		for address, reading in self.throttle.due(now):
+			self.publish(address, reading)
+
+	async def run(self) -> None:
+		while True:
+			self.tick(time.monotonic())
+			await asyncio.sleep(TICK_INTERVAL)
+
+	def forget(self, addresses: Iterable[str]) -> None:
+		self.throttle.forget(list(addresses))
+
+_device_sensors: DeviceSensors | None = None
+
+def get_device_sensors() -> DeviceSensors | None:
+	"""The device sensors publisher, or None when `device_sensors` is disabled or in cluster mode"""
+	global _device_sensors
+	config = Config.get_instance()
+	if _device_sensors is None and config.device_sensors and not config.cluster_node:
+		_device_sensors = DeviceSensors(SensorThrottle(
+			config.sensor_interval,
+			config.sensor_max_interval,
+			config.sensor_rssi_deadband,
+			config.sensor_distance_deadband,
+			config.sensor_max_rate,
+			config.sensor_rssi_at_1m,
+			config.sensor_path_loss_exponent,
+		))
+	return _device_sensors
+
+for _stat in ("sent", "suppressed"):
+	registry.register(Counter(
+		f"device_sensor_publishes_{_stat}_total",
+		f"Device sensor readings {_stat} by the sensor throttle",
+		lambda stat=_stat: _device_sensors.throttle.stats()[stat] if _device_sensors is not None else 0,
+	))
@@ -5,3 +5,4 @@ class Components(enum.StrEnum):
 	DeviceTracker = "device_tracker"
 	Number = "number"
 	Button = "button"
+	Sensor = "sensor"
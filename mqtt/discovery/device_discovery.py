@@ -0,0 +1,66 @@
+from typing import Iterable, TypedDict
+
+from mqtt.discovery.device_payload import device_payload
+from mqtt.discovery.discovery_manager import DiscoveryMessage
+
+SERVICE_DISCOVERY_ID = "bt_scan_service"
+
+# Home Assistant's abbreviations of the discovery keys used by this service
+ABBREVIATIONS = {
+	"command_topic": "cmd_t",
+	"device_class": "dev_cla",
+	"entity_category": "ent_cat",
+	"payload_home": "pl_home",
+	"payload_not_home": "pl_not_home",
+	"platform": "p",
+	"source_type": "src_type",
+	"state_class": "stat_cla",
+	"state_topic": "stat_t",
+	"unique_id": "uniq_id",
+	"unit_of_measurement": "unit_of_meas",
+	"value_template": "val_tpl",
+}
+DEVICE_ABBREVIATIONS = {
+	"identifiers": "ids",
+	"manufacturer": "mf",
+	"model": "mdl",
+	"sw_version": "sw",
+}
+
+# Abbreviated keys: device, origin and components
+DeviceDiscoveryPayload = TypedDict("DeviceDiscoveryPayload", {
+	"dev": dict[str, object],
+	"o": dict[str, object],
+	# unique id -> entity config with its platform
+	"cmps": dict[str, dict[str, object]],
+})
+
+abbreviated_device_payload: dict[str, object] = {DEVICE_ABBREVIATIONS.get(key, key): value for key, value in device_payload.items()}
+
+origin_payload: dict[str, object] = {"name": "bt-scan", "sw": device_payload["sw_version"]}
+
+def get_device_discovery_topic(discovery_id: str):
+	return f"homeassistant/device/{discovery_id}/config"
+
+def get_tracked_device_discovery_id(device_address: str):
+	safeDeviceAddress = device_address.replace(":", "_")
+	return f"bt_scan_{safeDeviceAddress}"
+
+def consolidate_discovery(discovery_id: str, messages: Iterable[DiscoveryMessage]) -> tuple[str, DeviceDiscoveryPayload]:
+	"""
+	Fold per-entity discovery messages into one device-based discovery message,
+	with the shared device block once instead of in every entity and abbreviated
+	keys. The platform of each entity is taken from its
+	`homeassistant/<platform>/<id>/config` topic.
+	"""
+	components: dict[str, dict[str, object]] = {}
+	for topic, payload in messages:
+		component = {ABBREVIATIONS.get(key, key): value for key, value in payload.items() if key != "device"}
+		component["p"] = topic.split("/")[1]
+		components[str(payload["unique_id"])] = component
+	discovery_payload: DeviceDiscoveryPayload = {
+		"dev": abbreviated_device_payload,
+		"o": origin_payload,
+		"cmps": components,
+	}
+	return get_device_discovery_topic(discovery_id), discovery_payload
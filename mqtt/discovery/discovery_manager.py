@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Iterable, Mapping
+
+import paho.mqtt.client as mqtt
+from mqtt.config import mqttc
+
+logger = logging.getLogger("mqtt.discovery.discovery_manager")
+
+DiscoveryMessage = tuple[str, Mapping[str, object]]
+
+DISCOVERY_QOS = 1
+# Hands the entity of a per-entity discovery topic over to device-based discovery
+MIGRATE_PAYLOAD = json.dumps({"migrate_discovery": True})
+
+def _content_hash(payload: str) -> bytes:
+	return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest()
+
+class DiscoveryManager:
+	"""
+	Keeps the serialized discovery payload and its content hash per config topic.
+	Only payloads that changed or were never acknowledged by the broker are
+	published; `publish_all` resends everything, e.g. after Home Assistant restarts.
+	Topics passed to `migrate` are handed over to device-based discovery with the
+	next publish.
+	"""
+	def __init__(self, client: mqtt.Client):
+		self.client = client
+		self._payloads: dict[str, str] = {}
+		self._hashes: dict[str, bytes] = {}
+		self._acked: dict[str, bytes] = {}
+		self._in_flight: dict[int, tuple[str, bytes]] = {}
+		self._in_flight_topics: dict[str, bytes] = {}
+		self._migrating: list[str] = []
+		# the scan path and the paho thread both touch the tables, and paho may
+		# call on_publish from inside publish
+		self._lock = threading.RLock()
+
+	def update(self, messages: Iterable[DiscoveryMessage]) -> int:
+		"""Store the messages, returning how many of them changed"""
+		return self.update_serialized((topic, json.dumps(payload)) for topic, payload in messages)
+
+	def update_serialized(self, messages: Iterable[tuple[str, str]]) -> int:
+		"""Like `update`, for payloads that are already serialized"""
+		changed = 0
+		with self._lock:
+			for topic, serialized in messages:
+				content_hash = _content_hash(serialized)
+				if self._hashes.get(topic) == content_hash:
+					continue
+				self._payloads[topic] = serialized
+				self._hashes[topic] = content_hash
+				changed += 1
+		return changed
+
+	def remove(self, topics: Iterable[str]) -> None:
+		"""Forget the topics and clear them in Home Assistant with an empty payload"""
+		with self._lock:
+			for topic in topics:
+				if self._payloads.pop(topic, None) is None:
+					continue
+				self._hashes.pop(topic, None)
+				self._acked.pop(topic, None)
+				self._in_flight_topics.pop(topic, None)
+				if self.client.is_connected():
+					self.client.publish(topic, "", qos=DISCOVERY_QOS)
+
+	def migrate(self, topics: Iterable[str]) -> None:
+		"""
+		Home Assistant rejects device-based components while it still holds the same
+		unique ids from per-entity discovery. The next publish first sends the
+		migration payload to the per-entity `topics`, then the pending messages, and
+		then clears the per-entity topics, as Home Assistant documents it.
+		"""
+		with self._lock:
+			self._migrating.extend(topics)
+
+	def publish_pending(self) -> int:
+		with self._lock:
+			if not self.client.is_connected():
+				return 0
+			pending = [
+				topic for topic, content_hash in self._hashes.items()
+				if self._acked.get(topic) != content_hash
+				and self._in_flight_topics.get(topic) != content_hash
+			]
+			migrating = self._migrating
+			self._migrating = []
+			for topic in migrating:
+				self.client.publish(topic, MIGRATE_PAYLOAD, qos=DISCOVERY_QOS)
+			for topic in pending:
+				self._publish(topic)
+			for topic in migrating:
+				self.client.publish(topic, "", qos=DISCOVERY_QOS)
+		if migrating:
+			logger.info(f"Migrated {len(migrating)} per-entity discovery topics to device-based discovery")
+		if pending:
+			logger.info(f"Published {len(pending)} discovery messages")
+		return len(pending)
+
+	def publish_all(self) -> int:
+		with self._lock:
+			self._acked.clear()
+			self._in_flight.clear()
+			self._in_flight_topics.clear()
+		return self.publish_pending()
+
+	def on_publish(self, mid: int) -> None:
+		with self._lock:
+			in_flight = self._in_flight.pop(mid, None)
+			if in_flight is not None:
+				topic, content_hash = in_flight
+				self._acked[topic] = content_hash
+				if self._in_flight_topics.get(topic) == content_hash:
+					del self._in_flight_topics[topic]
+
+	def on_disconnect(self) -> None:
+		# unacknowledged messages are resent after reconnecting
+		with self._lock:
+			self._in_flight.clear()
+			self._in_flight_topics.clear()
+
+	def _publish(self, topic: str) -> None:
+		info = self.client.publish(topic, self._payloads[topic], qos=DISCOVERY_QOS)
+		if info.rc == mqtt.MQTT_ERR_SUCCESS:
+			self._in_flight[info.mid] = (topic, self._hashes[topic])
+			self._in_flight_topics[topic] = self._hashes[topic]
+		else:
+			logger.warning(f"Failed to publish discovery message to {topic}: {info.rc}")
+
+discovery_manager = DiscoveryManager(mqttc)
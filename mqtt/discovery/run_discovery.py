@@ -1,25 +1,68 @@
+import logging
+from typing import Iterable
 
+import paho.mqtt.client as mqtt
+from components.profile_button import get_profile_button_discovery_message
+from components.scan_all_button import get_scan_all_button_discovery_message
+from components.scan_timeout_number import get_timeout_discovery_message
+from config import Config, Device
+from mqtt.discovery.device_discovery import SERVICE_DISCOVERY_ID, consolidate_discovery
+from mqtt.discovery.discovery_manager import DiscoveryMessage, discovery_manager
+from mqtt.topic_registry import DeviceTopics, get_device_discovery_messages, get_topic_registry
 
-from components.device_tracker import publish_discovery_message_for_device_tracker
-from components.scan_all_button import publish_discovery_message_for_scan_all_button
-from components.scan_device_button import publish_discovery_message_for_scan_button
-from components.scan_timeout_number import publish_discovery_message_for_timeout
-import threading
-from config import DevicesList
-
-def run_discovery(devices: DevicesList):
-	publish_discovery_message_for_timeout()
-	publish_discovery_message_for_scan_all_button()
-
-	for device in devices:
-		publish_discovery_message_for_device_tracker(device)
-		publish_discovery_message_for_scan_button(device)
-
-def run_discovery_every_hour(devices: DevicesList):
-    # Your function here
-    run_discovery(devices)
-    
-    # Schedule next execution
-    timer = threading.Timer(3600, run_discovery_every_hour, args=[devices])
-    timer.daemon = True  # Dies when main thread dies
-    timer.start()
+logger = logging.getLogger("mqtt.discovery.run_discovery")
+
+homeassistant_status_topic = "homeassistant/status"
+
+def get_service_entity_discovery_messages() -> list[DiscoveryMessage]:
+	return [
+		get_timeout_discovery_message(),
+		get_scan_all_button_discovery_message(),
+		get_profile_button_discovery_message(),
+	]
+
+def get_service_discovery_messages() -> list[DiscoveryMessage]:
+	messages = get_service_entity_discovery_messages()
+	if Config.get_instance().device_discovery:
+		return [consolidate_discovery(SERVICE_DISCOVERY_ID, messages)]
+	return messages
+
+def get_entity_discovery_topics() -> list[str]:
+	"""Per-entity discovery topics of the service and every device, replaced by device-based discovery"""
+	registry = get_topic_registry()
+	messages = get_service_entity_discovery_messages()
+	for device in Config.get_instance().devices:
+		messages.extend(get_device_discovery_messages(device, registry.room_sensors, registry.device_sensors))
+	return [topic for topic, _ in messages]
+
+def run_discovery():
+	"""Publish the discovery messages that changed or were never acknowledged"""
+	if Config.get_instance().device_discovery:
+		# Home Assistant may still hold the entities from per-entity discovery
+		discovery_manager.migrate(get_entity_discovery_topics())
+	discovery_manager.update(get_service_discovery_messages())
+	discovery_manager.update_serialized(message for topics in get_topic_registry() for message in topics.discovery)
+	discovery_manager.publish_pending()
+
+def update_device_discovery(device: Device):
+	"""Re-publish the discovery messages of one device, e.g. after its name was learned"""
+	if discovery_manager.update_serialized(get_topic_registry().update_device(device).discovery):
+		discovery_manager.publish_pending()
+
+def add_devices_discovery(added: Iterable[DeviceTopics]):
+	"""Publish the discovery messages of devices added to the registry at runtime"""
+	if discovery_manager.update_serialized(message for topics in added for message in topics.discovery):
+		discovery_manager.publish_pending()
+
+def remove_devices_discovery(removed: Iterable[DeviceTopics]):
+	"""Remove the entities of devices that are no longer configured from Home Assistant"""
+	discovery_manager.remove(topic for topics in removed for topic, _ in topics.discovery)
+
+def on_homeassistant_status(client: mqtt.Client, userdata: None, msg: mqtt.MQTTMessage) -> None:
+	try:
+		status = msg.payload.decode("utf-8")
+		logger.info(f"Home Assistant status: {status}")
+		if status == "online":
+			discovery_manager.publish_all()
+	except Exception as e:
+		logger.error(f"Error processing Home Assistant status: {e}")
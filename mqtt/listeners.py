@@ -1,19 +1,79 @@
+import logging
+from typing import Callable
+
+import paho.mqtt.client as mqtt
+from components.profile_button import on_profile_button_press, profile_button_command_topic
 from components.scan_all_button import on_scan_all_button_press, scan_all_button_command_topic
-from components.scan_device_button import get_scan_button_command_topic, on_scan_button_press
+from components.scan_device_button import on_scan_button_press
 from components.scan_timeout_number import get_timeout_command_topic, on_timeout_change
-from config import Config
+from mqtt.discovery.components import Components
+from mqtt.discovery.run_discovery import homeassistant_status_topic, on_homeassistant_status
+from mqtt.cluster_node import get_cluster_node
 from mqtt.config import mqttc
+from mqtt.topic_registry import TopicRegistry, get_topic_registry
+
+logger = logging.getLogger("mqtt.listeners")
+
+CommandHandler = Callable[[mqtt.MQTTMessage], None]
+
+# One wildcard filter per component type instead of one subscription per device
+command_topic_filters = [
+	f"homeassistant/{Components.Button.value}/+/command",
+	f"homeassistant/{Components.Number.value}/+/command",
+]
+
+class CommandRouter:
+	"""
+	Maps command topics to their handler. Device scan buttons are looked up in the
+	topic registry, which already holds the command topic of every device.
+	"""
+	def __init__(self, registry: TopicRegistry):
+		self.registry = registry
+		self._routes: dict[str, CommandHandler] = {}
+
+	def add_route(self, topic: str, handler: CommandHandler) -> None:
+		self._routes[topic] = handler
+
+	def __len__(self) -> int:
+		return len(self._routes) + len(self.registry)
+
+	def dispatch(self, client: mqtt.Client, userdata: None, msg: mqtt.MQTTMessage) -> None:
+		handler = self._routes.get(msg.topic)
+		if handler is not None:
+			handler(msg)
+			return
+		topics = self.registry.by_command_topic(msg.topic)
+		if topics is None:
+			# the wildcard also matches command topics of other integrations
+			logger.debug("Ignoring command on %s", msg.topic)
+			return
+		cluster_node = get_cluster_node()
+		if cluster_node is not None and not cluster_node.owns(topics.address):
+			logger.info("Device %s is scanned by another cluster node", topics.address)
+			return
+		on_scan_button_press(msg, topics.address)
+
+command_router: CommandRouter | None = None
+
+def get_command_router() -> CommandRouter:
+	global command_router
+	if command_router is None:
+		command_router = CommandRouter(get_topic_registry())
+		command_router.add_route(get_timeout_command_topic(), on_timeout_change)
+		command_router.add_route(scan_all_button_command_topic, on_scan_all_button_press)
+		command_router.add_route(profile_button_command_topic, on_profile_button_press)
+	return command_router
+
+def subscribe_commands(client: mqtt.Client, router: CommandRouter) -> None:
+	client.message_callback_add(homeassistant_status_topic, on_homeassistant_status)
+	for topic_filter in command_topic_filters:
+		client.message_callback_add(topic_filter, router.dispatch)
+
+	# a single SUBSCRIBE packet for every filter
+	client.subscribe([(topic, 0) for topic in [homeassistant_status_topic, *command_topic_filters]])
 
 def init_listeners() -> None:
-	timeout_topic = get_timeout_command_topic()
-	mqttc.subscribe(timeout_topic)
-	mqttc.message_callback_add(timeout_topic, on_timeout_change)
-
-	scan_all_button_topic = scan_all_button_command_topic
-	mqttc.subscribe(scan_all_button_topic)
-	mqttc.message_callback_add(scan_all_button_topic, on_scan_all_button_press)
-
-	for device_address in Config.get_instance().devices.get_addresses():
-		scan_button_topic = get_scan_button_command_topic(device_address)
-		mqttc.subscribe(scan_button_topic)
-		mqttc.message_callback_add(scan_button_topic, on_scan_button_press)
\ No newline at end of file
+	subscribe_commands(mqttc, get_command_router())
+	cluster_node = get_cluster_node()
+	if cluster_node is not None:
+		cluster_node.subscribe()
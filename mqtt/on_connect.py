@@ -1,8 +1,8 @@
 import paho.mqtt.client as mqtt
 import logging
-from mqtt.discovery.run_discovery import run_discovery_every_hour
-from config import Config
+from mqtt.discovery.discovery_manager import discovery_manager
 from mqtt.listeners import init_listeners
+from mqtt.outbox import outbox
 
 logger = logging.getLogger("mqtt.on_connect")
 
@@ -10,7 +10,8 @@ def on_connect(client: mqtt.Client, userdata: None, flags: dict[str, str], rc: i
 	logger.info(f"Connected with result code {rc}")
 		
 	if rc == 0:
-		run_discovery_every_hour(Config.get_instance().devices)
+		outbox.on_connected()
+		discovery_manager.publish_pending()
 		init_listeners()
 		client.subscribe("$SYS/#")
 	else:
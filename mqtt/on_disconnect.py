@@ -1,7 +1,11 @@
 import logging
 import paho.mqtt.client as mqtt
+from mqtt.discovery.discovery_manager import discovery_manager
+from mqtt.outbox import outbox
 
 logger = logging.getLogger("mqtt.on_disconnect")
 
 def on_disconnect(client: mqtt.Client, userdata: None, rc: int) -> None:
-	logger.info(f"Disconnected from MQTT broker with result code {rc}")
\ No newline at end of file
+	logger.info(f"Disconnected from MQTT broker with result code {rc}")
+	outbox.on_disconnected()
+	discovery_manager.on_disconnect()
\ No newline at end of file
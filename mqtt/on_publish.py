@@ -0,0 +1,5 @@
+import paho.mqtt.client as mqtt
+from mqtt.discovery.discovery_manager import discovery_manager
+
+def on_publish(client: mqtt.Client, userdata: None, mid: int) -> None:
+	discovery_manager.on_publish(mid)
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Protocol
+
+import paho.mqtt.client as mqtt
+from mqtt.config import mqttc
+from utils.metrics import Gauge, registry
+
+logger = logging.getLogger("mqtt.outbox")
+
+class PublishClient(Protocol):
+	def publish(self, topic: str, payload: str | bytes, qos: int = 0, retain: bool = False) -> mqtt.MQTTMessageInfo: ...
+
+class Outbox:
+	"""
+	Bounded buffer between the publishers and the paho client.
+	While the broker is unreachable messages are coalesced per topic, so only the
+	latest payload of each topic is kept. Once `max_size` topics are pending,
+	further messages are appended to a spool file. Everything is published in
+	one burst when the connection comes back.
+	"""
+	def __init__(self, client: PublishClient, max_size: int = 1000, spool_path: str = "outbox.spool", qos: int = 0):
+		self.client = client
+		self.max_size = max_size
+		self.spool_path = spool_path
+		self.qos = qos
+		self._pending: OrderedDict[str, tuple[str | bytes, bool]] = OrderedDict()
+		self._spooled = 0
+		self._connected = False
+		self._lock = threading.Lock()
+
+	def configure(self, max_size: int, spool_path: str, qos: int) -> None:
+		with self._lock:
+			self.max_size = max_size
+			self.spool_path = spool_path
+			self.qos = qos
+			self._spooled = self._count_spooled()
+			if self._spooled:
+				logger.info(f"Found {self._spooled} spooled messages from a previous run")
+
+	def publish(self, topic: str, payload: str | bytes, retain: bool = False) -> None:
+		with self._lock:
+			if self._connected and not self._pending and self._spooled == 0:
+				info = self.client.publish(topic, payload, qos=self.qos, retain=retain)
+				if info.rc == mqtt.MQTT_ERR_SUCCESS:
+					return
+				logger.warning(f"Publish to {topic} failed with code {info.rc}, queueing")
+				self._connected = False
+			self._enqueue(topic, payload, retain)
+
+	def on_connected(self) -> None:
+		with self._lock:
+			messages = self._read_spool()
+			for topic, message in self._pending.items():
+				# in-memory messages are never older than spooled ones
+				messages.pop(topic, None)
+				messages[topic] = message
+			self._pending.clear()
+
+			if messages:
+				logger.info(f"Draining {len(messages)} queued messages")
+			queued = list(messages.items())
+			for index, (topic, (payload, retain)) in enumerate(queued):
+				info = self.client.publish(topic, payload, qos=self.qos, retain=retain)
+				if info.rc != mqtt.MQTT_ERR_SUCCESS:
+					# the connection dropped mid-drain, keep the rest for the next connection
+					logger.warning(f"Publish to {topic} failed with code {info.rc}, requeueing {len(queued) - index} messages")
+					for topic, (payload, retain) in queued[index:]:
+						self._enqueue(topic, payload, retain)
+					return
+			self._connected = True
+
+	def on_disconnected(self) -> None:
+		with self._lock:
+			self._connected = False
+
+	def depth(self) -> int:
+		return len(self._pending) + self._spooled
+
+	def _enqueue(self, topic: str, payload: str | bytes, retain: bool) -> None:
+		if topic in self._pending:
+			self._pending[topic] = (payload, retain)
+			self._pending.move_to_end(topic)
+		elif len(self._pending) < self.max_size:
+			self._pending[topic] = (payload, retain)
+		else:
+			self._spool(topic, payload, retain)
+
+	def _spool(self, topic: str, payload: str | bytes, retain: bool) -> None:
+		if isinstance(payload, bytes):
+			# pre-encoded payloads are UTF-8 text, e.g. device tracker states
+			payload = payload.decode("utf-8")
+		try:
+			with open(self.spool_path, "a", encoding="utf-8") as f:
+				f.write(json.dumps({"topic": topic, "payload": payload, "retain": retain}) + "\n")
+			self._spooled += 1
+		except OSError as e:
+			logger.error(f"Failed to spool message for {topic}: {e}")
+
+	def _read_spool(self) -> "OrderedDict[str, tuple[str | bytes, bool]]":
+		messages: OrderedDict[str, tuple[str | bytes, bool]] = OrderedDict()
+		if self._spooled == 0:
+			return messages
+		try:
+			with open(self.spool_path, "r", encoding="utf-8") as f:
+				for line in f:
+					try:
+						entry = json.loads(line)
+					except json.JSONDecodeError:
+						logger.warning("Skipping corrupt spool entry")
+						continue
+					messages.pop(entry["topic"], None)
+					messages[entry["topic"]] = (entry["payload"], entry["retain"])
+			os.remove(self.spool_path)
+		except OSError as e:
+			logger.error(f"Failed to read spool file: {e}")
+		self._spooled = 0
+		return messages
+
+	def _count_spooled(self) -> int:
+		try:
+			with open(self.spool_path, "r", encoding="utf-8") as f:
+				return sum(1 for _ in f)
+		except FileNotFoundError:
+			return 0
+		except OSError as e:
+			logger.error(f"Failed to read spool file: {e}")
+			return 0
+
+outbox = Outbox(mqttc)
+
+registry.register(Gauge("mqtt_outbox_depth", "Messages waiting in the outbox for a broker connection", outbox.depth))
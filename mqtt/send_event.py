@@ -1,23 +1,29 @@
 import enum, json
 import logging
+import time
 from typing import TypedDict
 from bleak.backends.device import BLEDevice
-from mqtt.config import mqttc
+from mqtt.outbox import outbox
+from utils.metrics import publish_duration
 
 logger = logging.getLogger("mqtt.send_event")
 
 class SentEvent(enum.StrEnum): 
 	DEVICE_UPDATE = "device_update"
 
-def send_event(eventType: str, data: object | str) -> None:
-	logger.info(f"Sending event: {eventType} {data}")
+def send_event(eventType: str, data: object | str, retain: bool = False) -> None:
+	# formatted only when the record is emitted
+	logger.info("Sending event: %s %s", eventType, data)
+	started_at = time.perf_counter()
 	if isinstance(data, dict):
 		logger.debug("It's a dict object")
-		mqttc.publish(eventType, json.dumps(data))
-	elif isinstance(data, str):
-		mqttc.publish(eventType, data)
+		outbox.publish(eventType, json.dumps(data), retain=retain)
+	elif isinstance(data, (str, bytes)):
+		outbox.publish(eventType, data, retain=retain)
 	else:
 		logger.warning('Unknown data while sending event')
+		return
+	publish_duration.observe(time.perf_counter() - started_at)
 
 class DeviceStatusUpdateData(TypedDict):
 	address: str
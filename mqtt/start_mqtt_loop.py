@@ -1,19 +1,34 @@
+import asyncio
+
+import paho.mqtt.client as mqtt
+from mqtt.asyncio_loop import AsyncioMqttLoop
 from mqtt.on_connect import on_connect
 from mqtt.config import mqttc
 from mqtt.on_disconnect import on_disconnect
+from mqtt.on_publish import on_publish
+
+_mqtt_loop: AsyncioMqttLoop | None = None
 
+def _on_connect(client: mqtt.Client, userdata: None, flags: dict[str, str], rc: int):
+	if rc == 0 and _mqtt_loop is not None:
+		_mqtt_loop.connection_accepted()
+	on_connect(client, userdata, flags, rc)
 
 def start_mqtt_loop(mqtt_host: str, mqtt_port: int, mqtt_username: str, mqtt_password: str):
-	"""Start the MQTT client loop in a non-blocking way"""
-	mqttc.on_connect = on_connect
+	"""Connect the MQTT client and drive it from the running asyncio loop"""
+	global _mqtt_loop
+	mqttc.on_connect = _on_connect
 	mqttc.on_disconnect = on_disconnect
+	mqttc.on_publish = on_publish
 
 	mqttc.username_pw_set(mqtt_username, mqtt_password)
 
-	mqttc.connect(mqtt_host, mqtt_port, 60)
-
-	mqttc.loop_start()
+	_mqtt_loop = AsyncioMqttLoop(asyncio.get_running_loop(), mqttc)
+	_mqtt_loop.start(mqtt_host, mqtt_port, 60)
 
-def stop_mqtt_loop():
-	"""Stop the MQTT client loop"""
-	mqttc.loop_stop()
+async def stop_mqtt_loop():
+	"""Disconnect cleanly and stop driving the MQTT client"""
+	global _mqtt_loop
+	if _mqtt_loop is not None:
+		await _mqtt_loop.stop()
+		_mqtt_loop = None
@@ -0,0 +1,163 @@
+import json
+import sys
+from typing import Iterable, Iterator
+
+from components.device_sensors import (
+	format_device_sensors_state,
+	get_device_sensor_discovery_messages,
+	get_device_sensors_state_topic,
+)
+from components.device_tracker import get_device_tracker_discovery_message, get_device_tracker_state_topic
+from components.room_sensor import get_room_sensor_discovery_message, get_room_sensor_state_topic
+from components.scan_device_button import get_scan_button_command_topic, get_scan_button_discovery_message
+from config import Config, Device, normalize_address
+from mqtt.discovery.device_discovery import consolidate_discovery, get_tracked_device_discovery_id
+from mqtt.discovery.discovery_manager import DiscoveryMessage
+from mqtt.send_event import send_event
+from mqtt.types import HomeState
+from utils.sensor_throttle import SensorReading
+
+# Discovery config topic and its JSON payload
+SerializedDiscovery = tuple[str, str]
+# Device tracker state payloads, encoded once for every publish
+STATE_PAYLOADS: dict[HomeState, bytes] = {state: state.value.encode("utf-8") for state in HomeState}
+
+def get_device_discovery_messages(
+	device: Device,
+	room_sensor: bool = False,
+	device_sensors: bool = False,
+) -> list[DiscoveryMessage]:
+	messages: list[DiscoveryMessage] = [
+		get_device_tracker_discovery_message(device),
+		get_scan_button_discovery_message(device),
+	]
+	if room_sensor:
+		messages.append(get_room_sensor_discovery_message(device))
+	if device_sensors:
+		messages.extend(get_device_sensor_discovery_messages(device))
+	return messages
+
+def serialize_discovery(messages: Iterable[DiscoveryMessage]) -> list[SerializedDiscovery]:
+	return [(sys.intern(topic), json.dumps(payload)) for topic, payload in messages]
+
+class DeviceTopics:
+	"""Interned topics and serialized discovery messages of one device"""
+	__slots__ = ("address", "tracker_state", "button_command", "room_state", "sensors_state", "discovery")
+
+	def __init__(self, device: Device, discovery: list[SerializedDiscovery]):
+		self.address = device.address
+		self.tracker_state = sys.intern(get_device_tracker_state_topic(device.address))
+		self.button_command = sys.intern(get_scan_button_command_topic(device.address))
+		self.room_state = sys.intern(get_room_sensor_state_topic(device.address))
+		self.sensors_state = sys.intern(get_device_sensors_state_topic(device.address))
+		self.discovery = discovery
+
+class TopicRegistry:
+	"""
+	Topics and serialized discovery messages of every configured device, built when
+	the config is loaded and rebuilt per device only when it is added, removed or
+	renamed, so publishing a state or dispatching a command formats no strings and
+	serializes no JSON, and state payloads are the pre-encoded STATE_PAYLOADS.
+	Lookups by the configured address hit the table directly, other spellings of
+	an address are normalized first. With `device_discovery` the entities of a
+	device are announced in one device-based discovery message.
+	"""
+	def __init__(
+		self,
+		devices: Iterable[Device],
+		room_sensors: bool = False,
+		device_sensors: bool = False,
+		device_discovery: bool = False,
+	):
+		self.room_sensors = room_sensors
+		self.device_sensors = device_sensors
+		self.device_discovery = device_discovery
+		self._by_address: dict[str, DeviceTopics] = {}
+		self._by_normalized: dict[str, DeviceTopics] = {}
+		self._by_command: dict[str, DeviceTopics] = {}
+		self.add_devices(devices)
+
+	def add_devices(self, devices: Iterable[Device]) -> list[DeviceTopics]:
+		added: list[DeviceTopics] = []
+		for device in devices:
+			topics = DeviceTopics(device, serialize_discovery(self._discovery_messages(device)))
+			self._by_address[device.address] = topics
+			self._by_normalized[normalize_address(device.address)] = topics
+			self._by_command[topics.button_command] = topics
+			added.append(topics)
+		return added
+
+	def update_device(self, device: Device) -> DeviceTopics:
+		"""Rebuild the discovery messages of a device, e.g. after its name was learned"""
+		return self.add_devices([device])[0]
+
+	def remove_devices(self, addresses: Iterable[str]) -> list[DeviceTopics]:
+		removed: list[DeviceTopics] = []
+		for address in addresses:
+			topics = self._by_normalized.pop(normalize_address(address), None)
+			if topics is None:
+				continue
+			self._by_address.pop(topics.address, None)
+			self._by_command.pop(topics.button_command, None)
+			removed.append(topics)
+		return removed
+
+	def _discovery_messages(self, device: Device) -> list[DiscoveryMessage]:
+		messages = get_device_discovery_messages(device, self.room_sensors, self.device_sensors)
+		if self.device_discovery:
+			return [consolidate_discovery(get_tracked_device_discovery_id(device.address), messages)]
+		return messages
+
+	def get(self, address: str) -> DeviceTopics | None:
+		topics = self._by_address.get(address)
+		if topics is None:
+			topics = self._by_normalized.get(normalize_address(address))
+		return topics
+
+	def by_command_topic(self, topic: str) -> DeviceTopics | None:
+		return self._by_command.get(topic)
+
+	def state_topic(self, address: str) -> str:
+		topics = self.get(address)
+		return topics.tracker_state if topics is not None else get_device_tracker_state_topic(address)
+
+	def __len__(self) -> int:
+		return len(self._by_address)
+
+	def __iter__(self) -> Iterator[DeviceTopics]:
+		return iter(self._by_address.values())
+
+_topic_registry: TopicRegistry | None = None
+
+def get_topic_registry() -> TopicRegistry:
+	global _topic_registry
+	if _topic_registry is None:
+		config = Config.get_instance()
+		# the cluster aggregator publishes rooms, single instances can publish signal sensors
+		_topic_registry = TopicRegistry(
+			config.devices,
+			room_sensors=bool(config.cluster_node),
+			device_sensors=config.device_sensors and not config.cluster_node,
+			device_discovery=config.device_discovery,
+		)
+	return _topic_registry
+
+def publish_state(address: str, state: HomeState) -> None:
+	"""State sink publishing to the device tracker topic kept in the registry"""
+	send_event(get_topic_registry().state_topic(address), STATE_PAYLOADS[state], retain=True)
+
+def clear_device_states(removed: Iterable[DeviceTopics]) -> None:
+	"""Clear the retained state topics of devices that are no longer configured"""
+	registry = get_topic_registry()
+	for topics in removed:
+		send_event(topics.tracker_state, "", retain=True)
+		if registry.room_sensors:
+			send_event(topics.room_state, "", retain=True)
+		if registry.device_sensors:
+			send_event(topics.sensors_state, "", retain=True)
+
+def publish_sensor_state(address: str, reading: SensorReading) -> None:
+	"""Publish the RSSI, distance and last seen sensors of a device"""
+	topics = get_topic_registry().get(address)
+	if topics is not None:
+		send_event(topics.sensors_state, format_device_sensors_state(reading), retain=True)
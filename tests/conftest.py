@@ -0,0 +1,44 @@
+from typing import Any, Callable, Iterator
+
+import pytest
+
+from config import Config
+
+ConfigData = Callable[..., dict[str, Any]]
+
+
+@pytest.fixture
+def address() -> str:
+	"""The tracked device of the single-device tests"""
+	return "AA:BB:CC:DD:EE:FF"
+
+
+@pytest.fixture
+def config_data(address: str) -> ConfigData:
+	"""Builds a minimal config.json document tracking `address`, with `settings` on top"""
+	def make(**settings: Any) -> dict[str, Any]:
+		return {
+			"devices_list": [address],
+			"automatic_scan": 60,
+			"mqtt_host": "localhost",
+			"mqtt_port": 1883,
+			"mqtt_username": "",
+			"mqtt_password": "",
+			**settings,
+		}
+	return make
+
+
+@pytest.fixture
+def make_config(config_data: ConfigData) -> Iterator[Callable[..., Config]]:
+	"""Initializes the Config singleton from `config_data(**settings)`, reset after the test"""
+	def make(**settings: Any) -> Config:
+		Config._instance = None  # pyright: ignore[reportPrivateUsage]
+		return Config.init(config_data(**settings))
+	yield make
+	Config._instance = None  # pyright: ignore[reportPrivateUsage]
+
+
+@pytest.fixture
+def config(make_config: Callable[..., Config]) -> Config:
+	return make_config()
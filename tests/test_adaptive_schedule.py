@@ -0,0 +1,52 @@
+import pytest
+
+from utils.adaptive_schedule import AdaptiveSchedule
+
+
+@pytest.fixture
+def schedule(address: str) -> AdaptiveSchedule:
+	schedule = AdaptiveSchedule(base_interval=60, min_interval=15, max_interval=3600, min_timeout=2, max_timeout=20)
+	schedule.track([address], 0.0)
+	return schedule
+
+
+def timeout(schedule: AdaptiveSchedule, address: str) -> float:
+	history = schedule.get(address)
+	assert history is not None
+	return schedule.timeout(history)
+
+
+def test_unknown_detection_time_uses_max_timeout(schedule: AdaptiveSchedule, address: str):
+	assert timeout(schedule, address) == 20
+
+
+def test_timeout_follows_detection_time(schedule: AdaptiveSchedule, address: str):
+	schedule.record_result(address, True, 10.0, detection_time=1.0)
+	assert timeout(schedule, address) == 3
+
+
+def test_timeout_doubles_after_misses_and_resets_on_find(schedule: AdaptiveSchedule, address: str):
+	schedule.record_result(address, True, 10.0, detection_time=1.0)
+	schedule.record_result(address, False, 20.0)
+	assert timeout(schedule, address) == 6
+	schedule.record_result(address, False, 30.0, unconfirmed=True)
+	assert timeout(schedule, address) == 12
+	schedule.record_result(address, False, 40.0)
+	assert timeout(schedule, address) == 20
+	schedule.record_result(address, True, 50.0, detection_time=1.0)
+	assert timeout(schedule, address) == 3
+
+
+def test_miss_kept_home_by_hysteresis_widens_timeout(schedule: AdaptiveSchedule, address: str):
+	schedule.record_result(address, True, 10.0, detection_time=1.0)
+	# the scan missed the device, the exit hysteresis still reports it home
+	schedule.record_result(address, True, 20.0, unconfirmed=True)
+	schedule.record_result(address, True, 35.0, unconfirmed=True)
+	assert timeout(schedule, address) == 12
+
+
+def test_unconfirmed_result_is_checked_at_min_interval(schedule: AdaptiveSchedule, address: str):
+	schedule.record_result(address, True, 10.0, detection_time=1.0)
+	schedule.record_result(address, False, 20.0, unconfirmed=True)
+	assert schedule.next_deadline() == 35.0
+	assert schedule.pop_due(35.0) == [(address, 6)]
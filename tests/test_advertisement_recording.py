@@ -0,0 +1,56 @@
+import struct
+from pathlib import Path
+
+import pytest
+
+from utils.advertisement_recording import AdvertisementRecorder, RecordedAdvertisement, read_recording
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> str:
+	return str(tmp_path / "session.btadv")
+
+
+def test_round_trip(path: str, address: str):
+	recorder = AdvertisementRecorder(path)
+	recorder.record(address.lower(), -60, "Phone")
+	recorder.record(address, -200, "Phone")
+	recorder.close()
+	recorded = list(read_recording(path))
+	assert [(advertisement.address, advertisement.rssi, advertisement.name) for advertisement in recorded] == [
+		(address, -60, "Phone"),
+		(address, -128, "Phone"),
+	]
+
+
+def test_offsets_past_49_days(path: str, address: str):
+	recorder = AdvertisementRecorder(path)
+	recorder._started_at -= 60 * 86400  # pyright: ignore[reportPrivateUsage]
+	recorder.record(address, -60, None)
+	recorder.close()
+	[advertisement] = read_recording(path)
+	assert advertisement.offset >= 60 * 86400
+
+
+def test_addresses_that_are_not_macs_are_skipped(path: str, address: str):
+	recorder = AdvertisementRecorder(path)
+	recorder.record("9C3A8E4B-1F2D-4E5A-8B6C-7D8E9FA0B1C2", -60, None)
+	recorder.record("not an address", -60, None)
+	recorder.record(address, -60, None)
+	recorder.close()
+	assert (recorder.recorded, recorder.skipped) == (1, 2)
+	assert [advertisement.address for advertisement in read_recording(path)] == [address]
+
+
+def test_recording_stops_after_a_write_error(path: str, address: str):
+	recorder = AdvertisementRecorder(path)
+	recorder._file.close()  # pyright: ignore[reportPrivateUsage, reportOptionalMemberAccess]
+	recorder.record(address, -60, None)
+	recorder.record(address, -60, None)
+	assert recorder.recorded == 0
+
+
+def test_reads_first_format(path: str, address: str):
+	with open(path, "wb") as f:
+		f.write(b"BTADV1\n" + struct.pack("<I6sbB", 1500, bytes.fromhex(address.replace(":", "")), -70, 0))
+	assert list(read_recording(path)) == [RecordedAdvertisement(1.5, address, -70, None)]
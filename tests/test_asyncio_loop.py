@@ -0,0 +1,62 @@
+import asyncio
+from typing import Callable
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from mqtt.asyncio_loop import RECONNECT_MIN_DELAY, AsyncioMqttLoop
+
+
+class FlakyBrokerClient:
+	"""
+	The TCP connect always succeeds, but the broker refuses every CONNACK and
+	closes the socket, except for the connect numbered `accepted_connect`, which
+	is accepted and then lost.
+	"""
+
+	def __init__(self, accepted_connect: int):
+		self.accepted_connect = accepted_connect
+		self.connects = 0
+		self.on_accepted: Callable[[], None] = lambda: None
+
+	def connect_async(self, host: str, port: int, keepalive: int) -> None:
+		pass
+
+	def reconnect(self) -> None:
+		self.connects += 1
+		if self.connects == self.accepted_connect:
+			self.on_accepted()
+
+	def loop_misc(self) -> int:
+		return mqtt.MQTT_ERR_NO_CONN
+
+	def is_connected(self) -> bool:
+		return False
+
+
+def test_refused_connections_back_off(monkeypatch: pytest.MonkeyPatch):
+	delays: list[float] = []
+	real_sleep = asyncio.sleep
+
+	async def sleep(delay: float) -> None:
+		delays.append(delay)
+		await real_sleep(0)
+
+	async def backoffs(count: int) -> None:
+		while len(delays) < count:
+			await real_sleep(0.001)
+
+	async def run() -> None:
+		client = FlakyBrokerClient(accepted_connect=5)
+		mqtt_loop = AsyncioMqttLoop(asyncio.get_running_loop(), client)  # pyright: ignore[reportArgumentType]
+		client.on_accepted = mqtt_loop.connection_accepted
+		monkeypatch.setattr(asyncio, "sleep", sleep)
+		mqtt_loop.start("localhost", 1883)
+		try:
+			await asyncio.wait_for(backoffs(6), 5)
+		finally:
+			monkeypatch.undo()
+			await mqtt_loop.stop()
+
+	asyncio.run(run())
+	assert delays[:6] == [RECONNECT_MIN_DELAY, 2, 4, 8, RECONNECT_MIN_DELAY, 2]
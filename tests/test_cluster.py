@@ -0,0 +1,83 @@
+import pytest
+
+from utils.cluster import (
+	UNKNOWN_RSSI,
+	ClusterView,
+	DevicePlacement,
+	NodeObservations,
+	decode_observations,
+	encode_observations,
+	shard_owner,
+)
+
+FIRST = "AA:AA:AA:AA:AA:01"
+SECOND = "AA:AA:AA:AA:AA:02"
+
+
+@pytest.fixture
+def view() -> ClusterView:
+	return ClusterView(node_timeout=90, switch_margin=4)
+
+
+def test_observations_round_trip():
+	payload = encode_observations("Kitchen", {FIRST: -60, SECOND.lower(): -200, "not-a-mac": -50})
+	assert len(payload) == 2 + len("Kitchen") + 2 * 7
+	assert decode_observations(payload) == NodeObservations("Kitchen", {FIRST: -60, SECOND: UNKNOWN_RSSI})
+
+
+@pytest.mark.parametrize("payload", [b"\x01", b"\x02\x00", encode_observations("Hall", {FIRST: -60})[:-1]])
+def test_invalid_observations_are_rejected(payload: bytes):
+	with pytest.raises(ValueError):
+		decode_observations(payload)
+
+
+def test_device_is_placed_at_the_loudest_node(view: ClusterView):
+	view.update("a", NodeObservations("Kitchen", {FIRST: -80}), 0.0)
+	view.update("b", NodeObservations("Hall", {FIRST: -60}), 0.0)
+	assert view.resolve(FIRST) == DevicePlacement(True, "Hall")
+	assert view.resolve(SECOND) == DevicePlacement(False, None)
+
+
+def test_equal_rssi_goes_to_the_lowest_node_id(view: ClusterView):
+	view.update("b", NodeObservations("Hall", {FIRST: -60}), 0.0)
+	view.update("a", NodeObservations("Kitchen", {FIRST: -60}), 0.0)
+	assert view.resolve(FIRST).room == "Kitchen"
+
+
+def test_room_switches_only_beyond_the_margin(view: ClusterView):
+	view.update("a", NodeObservations("Kitchen", {FIRST: -60}), 0.0)
+	view.update("b", NodeObservations("Hall", {FIRST: -70}), 0.0)
+	assert view.resolve(FIRST).room == "Kitchen"
+	view.update("b", NodeObservations("Hall", {FIRST: -57}), 1.0)
+	assert view.resolve(FIRST).room == "Kitchen"
+	view.update("b", NodeObservations("Hall", {FIRST: -56}), 2.0)
+	assert view.resolve(FIRST).room == "Hall"
+
+
+def test_update_returns_the_changed_devices(view: ClusterView):
+	assert view.update("a", NodeObservations("Kitchen", {FIRST: -60, SECOND: -70}), 0.0) == {FIRST, SECOND}
+	assert view.update("a", NodeObservations("Kitchen", {FIRST: -60}), 1.0) == {SECOND}
+	assert view.update("a", NodeObservations("Hall", {FIRST: -60}), 2.0) == {FIRST}
+
+
+def test_silent_node_expires_with_its_observations(view: ClusterView):
+	view.update("a", NodeObservations("Kitchen", {FIRST: -60}), 0.0)
+	view.update("b", NodeObservations("Hall", {SECOND: -60}), 50.0)
+	assert view.expire(89.0) == set()
+	assert view.expire(90.0) == {FIRST}
+	assert view.nodes() == ["b"]
+	assert view.resolve(FIRST) == DevicePlacement(False, None)
+	assert view.resolve(SECOND) == DevicePlacement(True, "Hall")
+
+
+def test_shard_owner_is_stable():
+	nodes = ["a", "b", "c", "d"]
+	addresses = [f"AA:AA:AA:AA:{index // 256:02X}:{index % 256:02X}" for index in range(200)]
+	owners = {address: shard_owner(address, nodes) for address in addresses}
+	assert owners == {address: shard_owner(address, reversed(nodes)) for address in addresses}
+	assert set(owners.values()) == set(nodes)
+	# a node leaving only moves the devices it owned
+	remaining = [node for node in nodes if node != "c"]
+	for address, owner in owners.items():
+		if owner != "c":
+			assert shard_owner(address, remaining) == owner
@@ -0,0 +1,41 @@
+from typing import Any, Callable
+
+from config import Config
+
+ConfigData = Callable[..., dict[str, Any]]
+
+
+def test_live_setting_is_applied(config: Config, config_data: ConfigData):
+	diff = config.reload(config_data(scan_timeout=30))
+	assert diff.settings == {"scan_timeout": (60, 30)}
+	assert not diff.pending
+	assert config.scan_timeout == 30
+
+
+def test_restart_required_setting_stays_pending(config: Config, config_data: ConfigData):
+	diff = config.reload(config_data(automatic_scan=0, mqtt_host="broker"))
+	assert not diff.settings
+	assert diff.pending == {"automatic_scan": (60, 0), "mqtt_host": ("localhost", "broker")}
+	assert config.automatic_scan == 60
+	assert config.mqtt_host == "localhost"
+	# still pending on the next reload, until the file matches the running value again
+	diff = config.reload(config_data(automatic_scan=0, mqtt_host="broker", scan_timeout=30))
+	assert diff.settings == {"scan_timeout": (60, 30)}
+	assert set(diff.pending) == {"automatic_scan", "mqtt_host"}
+	diff = config.reload(config_data(scan_timeout=30))
+	assert not diff
+
+
+def test_runtime_value_kept_when_file_unchanged(config: Config, config_data: ConfigData):
+	config.scan_timeout = 15
+	diff = config.reload(config_data(away_timeout=10))
+	assert not diff.settings
+	assert config.scan_timeout == 15
+
+
+def test_devices_added_and_removed(config: Config, config_data: ConfigData, address: str):
+	other = "11:22:33:44:55:66"
+	diff = config.reload(config_data(devices_list=[other]))
+	assert [device.address for device in diff.added] == [other]
+	assert [device.address for device in diff.removed] == [address]
+	assert config.devices.get_addresses() == [other]
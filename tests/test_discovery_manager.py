@@ -0,0 +1,64 @@
+import json
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from mqtt.discovery.discovery_manager import MIGRATE_PAYLOAD, DiscoveryManager
+
+DEVICE_TOPIC = "homeassistant/device/bt_scan_AA_BB_CC_DD_EE_FF/config"
+ENTITY_TOPICS = [
+	"homeassistant/device_tracker/bt_scan_AA_BB_CC_DD_EE_FF/config",
+	"homeassistant/button/bt_scan_AA_BB_CC_DD_EE_FF/config",
+]
+
+
+class FakeInfo:
+	def __init__(self, mid: int):
+		self.rc = mqtt.MQTT_ERR_SUCCESS
+		self.mid = mid
+
+
+class FakeClient:
+	def __init__(self):
+		self.published: list[tuple[str, str]] = []
+
+	def is_connected(self) -> bool:
+		return True
+
+	def publish(self, topic: str, payload: str, qos: int = 0) -> FakeInfo:
+		self.published.append((topic, payload))
+		return FakeInfo(len(self.published))
+
+
+@pytest.fixture
+def client() -> FakeClient:
+	return FakeClient()
+
+
+@pytest.fixture
+def manager(client: FakeClient) -> DiscoveryManager:
+	return DiscoveryManager(client)  # pyright: ignore[reportArgumentType]
+
+
+def test_only_changed_messages_are_published(manager: DiscoveryManager, client: FakeClient):
+	assert manager.update([(DEVICE_TOPIC, {"cmps": {}})]) == 1
+	assert manager.publish_pending() == 1
+	manager.on_publish(1)
+	assert manager.update([(DEVICE_TOPIC, {"cmps": {}})]) == 0
+	assert manager.publish_pending() == 0
+	assert client.published == [(DEVICE_TOPIC, json.dumps({"cmps": {}}))]
+
+
+def test_per_entity_topics_are_migrated_around_the_device_message(manager: DiscoveryManager, client: FakeClient):
+	manager.update([(DEVICE_TOPIC, {"cmps": {}})])
+	manager.migrate(ENTITY_TOPICS)
+	manager.publish_pending()
+	assert client.published == [
+		*((topic, MIGRATE_PAYLOAD) for topic in ENTITY_TOPICS),
+		(DEVICE_TOPIC, json.dumps({"cmps": {}})),
+		*((topic, "") for topic in ENTITY_TOPICS),
+	]
+	# migrated once
+	client.published.clear()
+	manager.publish_all()
+	assert client.published == [(DEVICE_TOPIC, json.dumps({"cmps": {}}))]
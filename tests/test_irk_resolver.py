@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("cryptography")
+
+from utils.irk_resolver import IrkResolver, aes_ecb, is_resolvable_private_address, parse_irk
+
+IRK = "000102030405060708090A0B0C0D0E0F"
+
+
+def private_address(irk: bytes, prand: bytes) -> str:
+	encryptor = aes_ecb(irk).encryptor()
+	address_hash = (encryptor.update(bytes(13) + prand) + encryptor.finalize())[13:]
+	return (prand + address_hash).hex(":").upper()
+
+
+def test_private_address_resolves_to_its_device(address: str):
+	resolver = IrkResolver({address: parse_irk(IRK)})
+	private = private_address(parse_irk(IRK), bytes([0x52, 0x11, 0x22]))
+	other = private_address(bytes(16), bytes([0x52, 0x11, 0x22]))
+	assert is_resolvable_private_address(private)
+	assert resolver.resolve_batch([private, other]) == {private: address, other: None}
+	assert resolver.cached(private) == (True, address)
+	assert resolver.cached(other) == (True, None)
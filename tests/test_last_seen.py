@@ -0,0 +1,76 @@
+import pytest
+
+from utils.last_seen import MERGE_WINDOW, LastSeenTable
+
+
+@pytest.fixture
+def table(address: str) -> LastSeenTable:
+	table = LastSeenTable(away_timeout=60)
+	table.track([address], 0.0)
+	return table
+
+
+def test_first_sighting_marks_present(table: LastSeenTable, address: str):
+	assert table.seen(address, -50, 1.0, "hci0")
+	assert not table.seen(address, -50, 2.0, "hci0")
+
+
+def test_untracked_address_is_ignored(table: LastSeenTable):
+	assert not table.seen("11:22:33:44:55:66", -50, 1.0, "hci0")
+	assert table.get("11:22:33:44:55:66") is None
+
+
+def test_weaker_sighting_from_other_adapter_is_merged(table: LastSeenTable, address: str):
+	table.seen(address, -40, 1.0, "hci0")
+	table.seen(address, -80, 1.5, "hci1")
+	entry = table.get(address)
+	assert entry is not None
+	assert (entry.rssi, entry.source, entry.last_seen) == (-40, "hci0", 1.5)
+
+
+def test_strong_sighting_expires_after_merge_window(table: LastSeenTable, address: str):
+	table.seen(address, -40, 1.0, "hci0")
+	# ten seconds of weaker sightings from another adapter, several per window
+	now = 1.0
+	while now < 11.0:
+		now += 0.25
+		table.seen(address, -80, now, "hci1")
+	entry = table.get(address)
+	assert entry is not None
+	assert (entry.rssi, entry.source, entry.last_seen) == (-80, "hci1", now)
+
+
+def test_strong_sighting_is_kept_for_the_whole_window(table: LastSeenTable, address: str):
+	table.seen(address, -40, 1.0, "hci0")
+	table.seen(address, -80, 1.0 + MERGE_WINDOW / 2, "hci1")
+	table.seen(address, -80, 1.0 + MERGE_WINDOW * 0.9, "hci1")
+	entry = table.get(address)
+	assert entry is not None
+	assert entry.rssi == -40
+	table.seen(address, -80, 1.0 + MERGE_WINDOW, "hci1")
+	assert entry.rssi == -80
+
+
+def test_same_adapter_always_updates(table: LastSeenTable, address: str):
+	table.seen(address, -40, 1.0, "hci0")
+	table.seen(address, -80, 1.1, "hci0")
+	entry = table.get(address)
+	assert entry is not None
+	assert entry.rssi == -80
+
+
+def test_pop_expired_reports_away_once(table: LastSeenTable, address: str):
+	table.seen(address, -50, 1.0, "hci0")
+	assert table.pop_expired(60.0) == []
+	# the deadline moved with the sighting
+	assert table.next_deadline() == 61.0
+	assert table.pop_expired(61.0) == [address]
+	assert table.pop_expired(200.0) == []
+	assert table.seen(address, -50, 201.0, "hci0")
+
+
+def test_restore_resumes_last_seen(address: str):
+	table = LastSeenTable(away_timeout=60)
+	table.track([address], 100.0)
+	table.restore([(address, 90.0, -60, True)])
+	assert table.pop_expired(150.0) == [address]
@@ -0,0 +1,36 @@
+from utils.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_counter_renders_its_type():
+	registry = MetricsRegistry()
+	counter = registry.register(Counter("events_total", "Events"))
+	counter.inc()
+	counter.inc(2)
+	assert registry.render().decode().splitlines() == [
+		"# HELP events_total Events",
+		"# TYPE events_total counter",
+		"events_total 3.0",
+	]
+
+
+def test_counter_and_gauge_read_their_source():
+	totals = {"sent": 0}
+	registry = MetricsRegistry()
+	registry.register(Counter("sent_total", "Sent", lambda: totals["sent"]))
+	registry.register(Gauge("depth", "Depth", lambda: 5))
+	totals["sent"] = 7
+	lines = registry.render().decode().splitlines()
+	assert "sent_total 7" in lines
+	assert "# TYPE depth gauge" in lines
+	assert "depth 5" in lines
+
+
+def test_histogram_buckets_are_cumulative():
+	histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+	for value in (0.05, 0.5, 5.0):
+		histogram.observe(value)
+	lines = histogram.render()
+	assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+	assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+	assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+	assert histogram.snapshot() == (3, 5.55)
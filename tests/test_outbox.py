@@ -0,0 +1,96 @@
+from pathlib import Path
+from typing import Callable
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from mqtt.outbox import Outbox
+
+
+class FakeInfo:
+	def __init__(self, rc: int):
+		self.rc = rc
+
+
+class FakeClient:
+	def __init__(self):
+		self.published: list[tuple[str, str, bool]] = []
+		# publishes left before the connection drops, None for never
+		self.remaining: int | None = None
+
+	def publish(self, topic: str, payload: str, qos: int = 0, retain: bool = False) -> FakeInfo:
+		if self.remaining is not None:
+			if self.remaining == 0:
+				return FakeInfo(mqtt.MQTT_ERR_NO_CONN)
+			self.remaining -= 1
+		self.published.append((topic, payload, retain))
+		return FakeInfo(mqtt.MQTT_ERR_SUCCESS)
+
+
+MakeOutbox = Callable[[int], Outbox]
+
+
+@pytest.fixture
+def client() -> FakeClient:
+	return FakeClient()
+
+
+@pytest.fixture
+def make_outbox(client: FakeClient, tmp_path: Path) -> MakeOutbox:
+	"""Builds an outbox of `max_size` messages publishing to `client`"""
+	def make(max_size: int) -> Outbox:
+		return Outbox(client, max_size=max_size, spool_path=str(tmp_path / "outbox.spool"))  # pyright: ignore[reportArgumentType]
+	return make
+
+
+def test_messages_are_coalesced_while_disconnected(make_outbox: MakeOutbox, client: FakeClient):
+	outbox = make_outbox(10)
+	outbox.publish("a", "1")
+	outbox.publish("a", "2", retain=True)
+	outbox.publish("b", "3")
+	assert outbox.depth() == 2
+	outbox.on_connected()
+	assert client.published == [("a", "2", True), ("b", "3", False)]
+	assert outbox.depth() == 0
+
+
+def test_overflow_is_spooled_and_drained(make_outbox: MakeOutbox, client: FakeClient, tmp_path: Path):
+	outbox = make_outbox(1)
+	outbox.publish("a", "1")
+	outbox.publish("b", "2")
+	outbox.publish("c", "3")
+	assert outbox.depth() == 3
+	outbox.on_connected()
+	assert [topic for topic, _, _ in client.published] == ["b", "c", "a"]
+	assert not (tmp_path / "outbox.spool").exists()
+
+
+def test_connection_drop_mid_drain_keeps_the_rest(make_outbox: MakeOutbox, client: FakeClient):
+	outbox = make_outbox(2)
+	for topic in "abcd":
+		outbox.publish(topic, topic)
+	client.remaining = 1
+	outbox.on_connected()
+	assert len(client.published) == 1
+	assert outbox.depth() == 3
+	# still disconnected, new messages queue behind the backlog
+	outbox.publish("e", "e")
+	assert len(client.published) == 1
+	client.remaining = None
+	outbox.on_connected()
+	assert sorted(topic for topic, _, _ in client.published) == list("abcde")
+	assert outbox.depth() == 0
+
+
+def test_connected_publish_goes_straight_out(make_outbox: MakeOutbox, client: FakeClient):
+	outbox = make_outbox(10)
+	outbox.on_connected()
+	outbox.publish("a", "1")
+	assert client.published == [("a", "1", False)]
+
+
+def test_encoded_payloads_survive_the_spool(make_outbox: MakeOutbox, client: FakeClient):
+	outbox = make_outbox(0)
+	outbox.publish("a", b"home", retain=True)
+	outbox.on_connected()
+	assert client.published == [("a", "home", True)]
@@ -0,0 +1,131 @@
+import json
+from typing import NotRequired, TypedDict, cast
+
+import pytest
+
+from config import Device
+from mqtt.types import HomeState
+from utils.presence_api import PresenceIndex, presence_routes
+
+FIRST = "AA:AA:AA:AA:AA:01"
+SECOND = "AA:AA:AA:AA:AA:02"
+
+
+def make_index(change_log_size: int) -> PresenceIndex:
+	index = PresenceIndex(change_log_size=change_log_size)
+	index.track([Device(FIRST, "Phone"), Device(SECOND)])
+	return index
+
+
+@pytest.fixture
+def index() -> PresenceIndex:
+	return make_index(100)
+
+
+class DeviceDocument(TypedDict):
+	address: str
+	name: str | None
+	state: str | None
+	changed_at: float | None
+	last_seen: float | None
+	rssi: int | None
+	seq: int
+
+
+class PresenceDocument(TypedDict):
+	seq: int
+	reset: NotRequired[bool]
+	removed: NotRequired[list[str]]
+	devices: list[DeviceDocument]
+
+
+def parse(body: bytes) -> PresenceDocument:
+	return cast(PresenceDocument, json.loads(body))
+
+
+def changes(index: PresenceIndex, since: int, now: float = 0.0) -> PresenceDocument:
+	return parse(index.changes(since, now))
+
+
+def device_document(index: PresenceIndex, address: str, now: float) -> DeviceDocument:
+	body = index.device(address, now)
+	assert body is not None
+	return cast(DeviceDocument, json.loads(body))
+
+
+def addresses(document: PresenceDocument) -> list[str]:
+	return [device["address"] for device in document["devices"]]
+
+
+def test_changes_after_a_sequence_number(index: PresenceIndex):
+	seq = index.seq
+	index.record_state(SECOND, HomeState.home)
+	document = changes(index, seq)
+	assert document["seq"] == seq + 1
+	assert document.get("reset") is False
+	assert addresses(document) == [SECOND]
+	assert addresses(changes(index, index.seq)) == []
+
+
+def test_latest_change_per_device_in_sequence_order(index: PresenceIndex):
+	seq = index.seq
+	index.record_state(FIRST, HomeState.home)
+	index.record_state(SECOND, HomeState.home)
+	index.record_state(FIRST, HomeState.not_home)
+	document = changes(index, seq)
+	assert addresses(document) == [SECOND, FIRST]
+	assert document["devices"][1]["state"] == "not_home"
+
+
+def test_unchanged_state_is_not_a_change(index: PresenceIndex):
+	index.record_state(FIRST, HomeState.home)
+	seq = index.seq
+	index.record_state(FIRST, HomeState.home)
+	assert index.seq == seq
+
+
+def test_removed_devices_are_listed(index: PresenceIndex):
+	seq = index.seq
+	index.forget([SECOND.lower()])
+	document = changes(index, seq)
+	assert document.get("removed") == [SECOND]
+	assert addresses(document) == []
+	assert len(index) == 1
+
+
+def test_stale_client_gets_a_reset():
+	index = make_index(change_log_size=2)
+	seq = index.seq
+	for _ in range(3):
+		index.record_state(FIRST, HomeState.home)
+		index.record_state(FIRST, HomeState.not_home)
+	document = changes(index, seq)
+	assert document.get("reset") is True
+	assert addresses(document) == [FIRST, SECOND]
+
+
+def test_responses_are_cached_until_a_change(index: PresenceIndex):
+	first = index.changes(0, 0.0)
+	assert index.changes(0, 0.0) is first
+	index.record_state(FIRST, HomeState.home)
+	assert index.changes(0, 0.0) is not first
+
+
+def test_last_seen_refreshes_once_per_resolution(index: PresenceIndex):
+	index.record_sighting(FIRST, -60, 1000.0)
+	index.changes(0, 10.0)
+	index.record_sighting(FIRST, -70, 1001.0)
+	assert device_document(index, FIRST, 10.5)["rssi"] == -60
+	assert device_document(index, FIRST, 11.0)["rssi"] == -70
+
+
+def test_routes(index: PresenceIndex):
+	routes = presence_routes(index)
+	assert routes["/presence/device"]("address=aa:aa:aa:aa:aa:01") is not None
+	assert routes["/presence/device"]("address=11:22:33:44:55:66") is None
+	assert routes["/presence/changes"]("since=x") is None
+	response = routes["/presence"]("")
+	assert response is not None
+	content_type, body = response
+	assert content_type == "application/json"
+	assert addresses(parse(body)) == [FIRST, SECOND]
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import pytest
+
+from mqtt.types import HomeState
+from utils.presence_history import SEGMENT_SECONDS, HistoryReader, PresenceHistory
+
+# the queries need the optional numpy package
+pytest.importorskip("numpy")
+
+DAY = 20000 * SEGMENT_SECONDS
+
+
+def test_dwell_time_and_transitions(tmp_path: Path, address: str):
+	history = PresenceHistory(str(tmp_path))
+	history.record_state(address, HomeState.home, DAY + 3600)
+	history.record_state(address, HomeState.not_home, DAY + 3 * 3600)
+	history.close()
+	reader = HistoryReader(str(tmp_path))
+	assert reader.dwell_time(address, DAY, DAY + 4 * 3600) == 2 * 3600
+	assert reader.transitions(address, DAY, DAY + 4 * 3600) == [(DAY + 3600, HomeState.home), (DAY + 3 * 3600, HomeState.not_home)]
+	occupancy = reader.hourly_occupancy(DAY, DAY + 4 * 3600)
+	assert occupancy.matrix[0].tolist() == [0.0, 1.0, 1.0, 0.0]
+
+
+def test_states_carry_over_a_restart(tmp_path: Path, address: str):
+	history = PresenceHistory(str(tmp_path))
+	history.record_state(address, HomeState.home, DAY + 3600)
+	history.close()
+	# restarted, the device stays home and only sightings are logged
+	history = PresenceHistory(str(tmp_path))
+	history.record_sighting(address, -60, DAY + SEGMENT_SECONDS + 3600)
+	history.close()
+	reader = HistoryReader(str(tmp_path))
+	next_day = DAY + SEGMENT_SECONDS
+	assert reader.dwell_time(address, next_day, next_day + 7200) == 7200
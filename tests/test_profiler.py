@@ -0,0 +1,35 @@
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from utils import profiler
+from utils.profiler import ProfileSession
+
+
+class BusyProfile:
+	"""Fails like cProfile.Profile.enable while another profiler is active"""
+
+	def enable(self) -> None:
+		raise ValueError("Another profiling tool is already active")
+
+
+class BusyProfileModule:
+	Profile = BusyProfile
+
+
+def test_session_removes_tracemalloc_when_the_profiler_does_not_start(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+	monkeypatch.setattr(profiler, "cProfile", BusyProfileModule)
+	session = ProfileSession("cprofile", 1, str(tmp_path))
+	with pytest.raises(ValueError):
+		session.start()
+	assert not tracemalloc.is_tracing()
+
+
+def test_sampling_session_writes_its_result(tmp_path: Path):
+	session = ProfileSession("sampling", 1, str(tmp_path))
+	session.start()
+	result, path = session.finish()
+	assert result["mode"] == "sampling"
+	assert Path(path).exists()
+	assert not tracemalloc.is_tracing()
@@ -0,0 +1,49 @@
+from utils.rssi_history import PresenceFilter, RssiHistory
+
+
+def test_history_keeps_the_last_samples(address: str):
+	history = RssiHistory(size=2)
+	history.track([address])
+	for now, rssi in enumerate((-60, -70, -80)):
+		history.add(address, rssi, float(now))
+	assert history.samples(address) == [(1.0, -70), (2.0, -80)]
+	assert history.add("11:22:33:44:55:66", -60, 0.0) is None
+
+
+def test_ema_smooths_samples(address: str):
+	history = RssiHistory(ema_weight=0.5)
+	history.track([address])
+	history.add(address, -60, 0.0)
+	history.add(address, -80, 1.0)
+	assert history.ema(address) == -70.0
+	history.add_smoothed(address, -90, -65.0, 2.0)
+	assert history.ema(address) == -65.0
+
+
+def test_enter_and_exit_thresholds(address: str):
+	presence = PresenceFilter(RssiHistory(ema_weight=1.0), enter_rssi=-70, exit_rssi=-85)
+	presence.track([address])
+	assert not presence.sighting(address, -80, 0.0)
+	presence.set_reported(address, True)
+	assert presence.sighting(address, -80, 1.0)
+	assert not presence.sighting(address, -90, 2.0)
+
+
+def test_exit_threshold_applies_on_its_own(address: str):
+	presence = PresenceFilter(RssiHistory(ema_weight=1.0), exit_rssi=-85)
+	presence.track([address])
+	assert presence.sighting(address, -95, 0.0)
+	presence.set_reported(address, True)
+	assert presence.sighting(address, -80, 1.0)
+	assert not presence.sighting(address, -90, 2.0)
+
+
+def test_exit_needs_consecutive_misses(address: str):
+	presence = PresenceFilter(RssiHistory(), exit_scans=2)
+	presence.track([address])
+	assert presence.scan_result(address, True)
+	assert presence.scan_result(address, False)
+	assert presence.pending(address)
+	assert presence.scan_result(address, True)
+	assert presence.scan_result(address, False)
+	assert not presence.scan_result(address, False)
@@ -0,0 +1,106 @@
+import asyncio
+from typing import Callable, Iterator
+
+import pytest
+from bleak.backends.device import BLEDevice
+
+from benchmarks.bench_adapter_fan_in import make_advertisement
+from components import device_tracker
+from config import Config
+from mqtt.types import HomeState
+from utils.scan import BluetoothScanner, ScanContext
+from utils.scan_scheduler import ScanPriority, ScanRequest, ScanScheduler, scan_scheduler
+from utils.scanner_backend import DetectionCallback, ScannerBackend
+
+FIRST = "AA:AA:AA:AA:AA:01"
+SECOND = "AA:AA:AA:AA:AA:02"
+THIRD = "AA:AA:AA:AA:AA:03"
+
+
+def test_requests_coalesce():
+	scheduler = ScanScheduler()
+	scheduler.request([FIRST], 10, ScanPriority.automatic)
+	scheduler.request([FIRST], 5, ScanPriority.manual)
+	assert scheduler.take() == [ScanRequest(FIRST, 10, ScanPriority.manual)]
+	assert scheduler.take() == []
+
+
+def test_manual_requests_are_served_first():
+	scheduler = ScanScheduler()
+	scheduler.request([FIRST, SECOND], 10, ScanPriority.automatic)
+	scheduler.request([THIRD], 60, ScanPriority.manual)
+	assert scheduler.take() == [ScanRequest(THIRD, 60, ScanPriority.manual)]
+	assert [request.address for request in scheduler.take()] == [FIRST, SECOND]
+
+
+def test_take_below_min_priority_leaves_requests_pending():
+	scheduler = ScanScheduler()
+	scheduler.request([FIRST], 10, ScanPriority.automatic)
+	assert scheduler.take(ScanPriority.manual) == []
+	assert scheduler.take() == [ScanRequest(FIRST, 10, ScanPriority.automatic)]
+
+
+def test_manual_request_preempts_automatic_targets():
+	context = ScanContext(not_found_devices=set(), started_at=0.0)
+	context.add_requests([ScanRequest(FIRST, 10, ScanPriority.automatic), ScanRequest(SECOND, 10, ScanPriority.automatic)], 0.0)
+	manual = [ScanRequest(SECOND, 60, ScanPriority.manual)]
+	preempted = context.preempt(manual)
+	context.add_requests(manual, 4.0)
+	assert preempted == [ScanRequest(FIRST, 10, ScanPriority.automatic)]
+	assert context.not_found_devices == {SECOND}
+	assert context.priority == ScanPriority.manual
+	assert context.next_deadline() == 64.0
+
+
+class PressDuringScanBackend(ScannerBackend):
+	"""Presses the scan button for SECOND during the first scan, and sees FIRST during the next one"""
+
+	def __init__(self, adapter: str | None, detection_callback: DetectionCallback):
+		super().__init__(adapter or "default", detection_callback)
+		self.scans = 0
+
+	async def start(self) -> None:
+		self.scans += 1
+		loop = asyncio.get_running_loop()
+		if self.scans == 1:
+			loop.call_soon(scan_scheduler.request, [SECOND], 0.2, ScanPriority.manual)
+		else:
+			loop.call_soon(self.dispatch, BLEDevice(FIRST, None, None), make_advertisement(-60))
+
+	async def stop(self) -> None:
+		pass
+
+
+@pytest.fixture
+def published(make_config: Callable[..., Config], monkeypatch: pytest.MonkeyPatch) -> Iterator[list[tuple[str, HomeState]]]:
+	make_config(devices_list=[FIRST, SECOND], automatic_scan=0)
+	states: list[tuple[str, HomeState]] = []
+	monkeypatch.setattr(device_tracker, "_state_cache", None)
+	# restores the current sink after the test
+	monkeypatch.setattr(device_tracker, "_state_sink", device_tracker._state_sink)  # pyright: ignore[reportPrivateUsage]
+	device_tracker.set_state_sink(lambda address, state: states.append((address, state)))
+	scan_scheduler.clear()
+	yield states
+	scan_scheduler.clear()
+
+
+def test_preempted_targets_are_scanned_right_after_the_manual_scan(published: list[tuple[str, HomeState]]):
+	async def run() -> ScannerBackend:
+		scanner = BluetoothScanner(PressDuringScanBackend)
+		shutdown = asyncio.Event()
+		scan_scheduler.request([FIRST], 5, ScanPriority.automatic)
+		task = asyncio.create_task(scanner.scan_loop(shutdown))
+		try:
+			for _ in range(100):
+				if (FIRST, HomeState.home) in published:
+					break
+				await asyncio.sleep(0.02)
+		finally:
+			shutdown.set()
+			await task
+		return scanner.backends[0]
+
+	backend = asyncio.run(run())
+	assert isinstance(backend, PressDuringScanBackend)
+	assert backend.scans == 2
+	assert published == [(SECOND, HomeState.not_home), (FIRST, HomeState.home)]
@@ -0,0 +1,72 @@
+import pytest
+
+from utils.sensor_throttle import SensorReading, SensorThrottle, estimate_distance
+
+
+@pytest.fixture
+def throttle() -> SensorThrottle:
+	return SensorThrottle(min_interval=30, max_interval=300, rssi_deadband=3, distance_deadband=0.5, max_rate=0)
+
+
+def test_distance_model():
+	assert estimate_distance(-59, -59, 2.0) == 1.0
+	assert estimate_distance(-79, -59, 2.0) == 10.0
+
+
+def test_first_reading_is_published_right_away(throttle: SensorThrottle, address: str):
+	assert throttle.record(address, -60, 1000.0, 0.0) == SensorReading(-60, 1.12, 1000.0)
+
+
+def test_readings_inside_the_deadband_are_suppressed(throttle: SensorThrottle, address: str):
+	throttle.record(address, -60, 1000.0, 0.0)
+	assert throttle.record(address, -61, 1001.0, 50.0) is None
+	assert throttle.due(100.0) == []
+	assert throttle.stats() == {"sent": 1, "suppressed": 1, "waiting": 0}
+
+
+def test_changed_reading_waits_for_min_interval(throttle: SensorThrottle, address: str):
+	throttle.record(address, -60, 1000.0, 0.0)
+	assert throttle.record(address, -70, 1010.0, 10.0) is None
+	# the latest reading is published once the interval elapsed
+	throttle.record(address, -72, 1020.0, 20.0)
+	assert throttle.due(29.0) == []
+	assert throttle.due(30.0) == [(address, SensorReading(-72, 4.47, 1020.0))]
+	assert throttle.record(address, -80, 1040.0, 40.0) is None
+
+
+def test_changed_reading_after_min_interval_is_published_on_the_leading_edge(throttle: SensorThrottle, address: str):
+	throttle.record(address, -60, 1000.0, 0.0)
+	assert throttle.record(address, -70, 1040.0, 40.0) is not None
+
+
+def test_reading_back_in_the_deadband_is_dropped_while_waiting(throttle: SensorThrottle, address: str):
+	throttle.record(address, -60, 1000.0, 0.0)
+	throttle.record(address, -70, 1010.0, 10.0)
+	throttle.record(address, -61, 1020.0, 20.0)
+	assert throttle.due(30.0) == []
+
+
+def test_unchanged_reading_is_kept_alive(throttle: SensorThrottle, address: str):
+	throttle.record(address, -60, 1000.0, 0.0)
+	throttle.record(address, -60, 1200.0, 200.0)
+	assert throttle.due(299.0) == []
+	assert throttle.due(300.0) == [(address, SensorReading(-60, 1.12, 1200.0))]
+
+
+def test_rate_limit_over_all_devices():
+	throttle = SensorThrottle(min_interval=30, max_interval=300, rssi_deadband=3, distance_deadband=0.5, max_rate=2)
+	addresses = [f"AA:BB:CC:DD:EE:{index:02X}" for index in range(5)]
+	published = [throttle.record(address, -60, 1000.0, 100.0) for address in addresses]
+	assert sum(reading is not None for reading in published) == 2
+	assert len(throttle.due(100.5)) == 1
+	assert len(throttle.due(101.0)) == 1
+	assert len(throttle.due(102.0)) == 1
+	assert throttle.stats()["waiting"] == 0
+
+
+def test_forget_drops_waiting_readings(throttle: SensorThrottle, address: str):
+	throttle.record(address, -60, 1000.0, 0.0)
+	throttle.record(address, -70, 1010.0, 10.0)
+	throttle.forget([address])
+	assert throttle.due(1000.0) == []
+	assert throttle.latest(address) is None
@@ -0,0 +1,111 @@
+import ctypes
+import multiprocessing
+import time
+
+import pytest
+
+from utils.sighting_pipeline import PipelineEvent, PresenceWorker, RingLock, SightingRing, WorkerSettings, pack_address
+
+
+@pytest.fixture
+def ring() -> SightingRing:
+	return SightingRing(bytearray(SightingRing.size(4)), 4)
+
+
+@pytest.fixture
+def packed(address: str) -> bytes:
+	return pack_address(address)
+
+
+def test_records_come_out_in_order(ring: SightingRing, packed: bytes):
+	assert ring.push(packed, -60, 0, 1.0)
+	assert ring.push(packed, -61, 1, 2.0)
+	assert list(ring.pop_all()) == [(packed, -60, 0, 1.0), (packed, -61, 1, 2.0)]
+	assert list(ring.pop_all()) == []
+
+
+def test_wraps_around(ring: SightingRing, packed: bytes):
+	for round in range(5):
+		for index in range(3):
+			assert ring.push(packed, -index, 0, float(round))
+		assert [rssi for _, rssi, _, _ in ring.pop_all()] == [0, -1, -2]
+	assert ring.stats()["processed"] == 15
+
+
+def test_full_ring_drops_new_records(ring: SightingRing, packed: bytes):
+	for index in range(4):
+		assert ring.push(packed, -index, 0, 0.0)
+	assert not ring.push(packed, -99, 0, 0.0)
+	assert ring.stats() == {"enqueued": 4, "processed": 0, "dropped": 1, "decisions": 0, "depth": 4}
+	assert [rssi for _, rssi, _, _ in ring.pop_all()] == [0, -1, -2, -3]
+	assert ring.push(packed, -5, 0, 0.0)
+
+
+def test_rssi_is_clamped(ring: SightingRing, packed: bytes):
+	ring.push(packed, -300, 0, 0.0)
+	ring.push(packed, 300, 0, 0.0)
+	assert [rssi for _, rssi, _, _ in ring.pop_all()] == [-128, 127]
+
+
+def test_capacity_must_be_a_power_of_two():
+	with pytest.raises(ValueError):
+		SightingRing(bytearray(SightingRing.size(3)), 3)
+
+
+def test_busy_lock_defers_the_write_count(ring: SightingRing, packed: bytes):
+	ring.push(packed, -59, 0, 0.0)
+	assert len(list(ring.pop_all())) == 1
+	ring._lock.acquire()  # pyright: ignore[reportPrivateUsage]
+	assert ring.push(packed, -60, 0, 1.0)
+	ring._lock.release()  # pyright: ignore[reportPrivateUsage]
+	assert list(ring.pop_all()) == []
+	ring.push(packed, -61, 0, 2.0)
+	assert [rssi for _, rssi, _, _ in ring.pop_all()] == [-60, -61]
+
+
+def _produce(buffer: "ctypes.Array[ctypes.c_ubyte]", capacity: int, lock: RingLock, packed: bytes, count: int) -> None:
+	ring = SightingRing(buffer, capacity, lock)
+	sent = 0
+	while sent < count:
+		if ring.push(packed, -(sent % 100), sent % 4, float(sent)):
+			sent += 1
+
+
+def test_records_cross_processes_intact(packed: bytes):
+	context = multiprocessing.get_context("spawn")
+	capacity = 64
+	count = 20_000
+	buffer = context.RawArray("B", SightingRing.size(capacity))
+	lock = context.Lock()
+	ring = SightingRing(buffer, capacity, lock)
+	producer = context.Process(target=_produce, args=(buffer, capacity, lock, packed, count))
+	producer.start()
+	received = 0
+	deadline = time.monotonic() + 30
+	while received < count and time.monotonic() < deadline:
+		for address, rssi, adapter, at in ring.pop_all():
+			assert (address, rssi, adapter, at) == (packed, -(received % 100), received % 4, float(received))
+			received += 1
+	producer.join(timeout=5)
+	assert received == count
+
+
+def test_worker_forwards_smoothed_rssi(address: str, packed: bytes):
+	worker = PresenceWorker(WorkerSettings(
+		addresses=[address],
+		adapters=["hci0"],
+		away_timeout=60,
+		enter_rssi=None,
+		exit_rssi=None,
+		rssi_history_size=16,
+		restored=[],
+		log_level=0,
+	))
+	events: list[PipelineEvent] = []
+	now = time.monotonic()
+	worker.process(iter([(packed, -60, 0, now + 1), (packed, -80, 0, now + 3)]), events)
+	assert [(kind, rssi) for kind, _, rssi, _, _ in events] == [("sighting", -60), ("home", -60), ("sighting", -80)]
+	assert events[0][3] == -60.0
+	assert events[2][3] == -66.0
+	worker.expire(now + 63, events)
+	assert events[-1][:3] == ("not_home", address, None)
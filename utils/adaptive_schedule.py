@@ -0,0 +1,150 @@
+import heapq
+from collections import deque
+from dataclasses import dataclass, field
+
+# A device with this many state changes within FLAPPING_WINDOW is considered flapping
+FLAPPING_TRANSITIONS = 3
+FLAPPING_WINDOW = 3600
+# For this long after a state change the device is checked at the minimum interval
+RECENT_CHANGE_WINDOW = 600
+# The check interval doubles for every BACKOFF_PERIOD a device keeps its state
+BACKOFF_PERIOD = 3600
+# Scan timeouts are this multiple of the smoothed time it took to detect the device
+TIMEOUT_FACTOR = 3
+DETECTION_EMA_WEIGHT = 0.3
+# The scan timeout doubles with every consecutive miss, up to the maximum timeout
+MAX_TIMEOUT_DOUBLINGS = 16
+
+
+@dataclass
+class DeviceHistory:
+	next_check: float
+	present: bool | None = None
+	stable_since: float = 0.0
+	transitions: deque[float] = field(default_factory=lambda: deque(maxlen=FLAPPING_TRANSITIONS))
+	detection_ema: float | None = None
+	# consecutive checks that did not find the device
+	misses: int = 0
+
+
+class AdaptiveSchedule:
+	"""
+	Per-device next-check deadlines derived from presence history. Devices that
+	keep their state for hours are checked less and less often, devices that just
+	changed state or flap are checked at `min_interval`. Each check gets a scan
+	timeout derived from how long the device usually takes to be detected,
+	doubled after every miss so a device that started advertising less often is
+	still found.
+	"""
+
+	def __init__(
+		self,
+		base_interval: float,
+		min_interval: float,
+		max_interval: float,
+		min_timeout: float,
+		max_timeout: float,
+	):
+		self.base_interval = base_interval
+		self.min_interval = min_interval
+		self.max_interval = max_interval
+		self.min_timeout = min_timeout
+		self.max_timeout = max_timeout
+		self._devices: dict[str, DeviceHistory] = {}
+		# (next_check, address); entries whose time no longer matches the device are stale
+		self._heap: list[tuple[float, str]] = []
+
+	def track(self, addresses: list[str], now: float) -> None:
+		for address in addresses:
+			if address not in self._devices:
+				self._devices[address] = DeviceHistory(next_check=now, stable_since=now)
+				heapq.heappush(self._heap, (now, address))
+
+	def restore(self, address: str, present: bool | None, next_check: float) -> None:
+		"""Resume a tracked device from a saved state and deadline"""
+		history = self._devices.get(address)
+		if history is None:
+			return
+		history.present = present
+		self._reschedule(address, history, next_check)
+
+	def untrack(self, addresses: list[str]) -> None:
+		for address in addresses:
+			self._devices.pop(address, None)
+
+	def get(self, address: str) -> DeviceHistory | None:
+		return self._devices.get(address)
+
+	def interval(self, history: DeviceHistory, now: float) -> float:
+		transitions = history.transitions
+		flapping = len(transitions) == FLAPPING_TRANSITIONS and now - transitions[0] < FLAPPING_WINDOW
+		recently_changed = bool(transitions) and now - transitions[-1] < RECENT_CHANGE_WINDOW
+		if flapping or recently_changed:
+			return self.min_interval
+		backoff = 2 ** min(int((now - history.stable_since) / BACKOFF_PERIOD), 16)
+		return max(self.min_interval, min(self.base_interval * backoff, self.max_interval))
+
+	def timeout(self, history: DeviceHistory) -> float:
+		if history.detection_ema is None:
+			return self.max_timeout
+		timeout = max(self.min_timeout, history.detection_ema * TIMEOUT_FACTOR)
+		return min(timeout * 2 ** history.misses, self.max_timeout)
+
+	def record_result(
+		self,
+		address: str,
+		found: bool,
+		now: float,
+		detection_time: float | None = None,
+		unconfirmed: bool = False,
+	) -> None:
+		"""
+		Record the reported state of a device. `detection_time` is given when the
+		scan detected the device, also when the reported state did not change yet;
+		without it the check was a miss. `unconfirmed` results disagree with the
+		reported state without changing it yet, so the device is checked again at
+		`min_interval`.
+		"""
+		history = self._devices.get(address)
+		if history is None:
+			return
+		if detection_time is None:
+			history.misses = min(history.misses + 1, MAX_TIMEOUT_DOUBLINGS)
+		else:
+			history.misses = 0
+			if history.detection_ema is None:
+				history.detection_ema = detection_time
+			else:
+				history.detection_ema += DETECTION_EMA_WEIGHT * (detection_time - history.detection_ema)
+		if history.present is not None and history.present != found:
+			history.transitions.append(now)
+			history.stable_since = now
+		history.present = found
+		interval = self.min_interval if unconfirmed else self.interval(history, now)
+		self._reschedule(address, history, now + interval)
+
+	def pop_due(self, now: float) -> list[tuple[str, float]]:
+		"""Devices to check now, with their scan timeout"""
+		due: list[tuple[str, float]] = []
+		while self._heap and self._heap[0][0] <= now:
+			next_check, address = heapq.heappop(self._heap)
+			history = self._devices.get(address)
+			if history is None or history.next_check != next_check:
+				continue
+			due.append((address, self.timeout(history)))
+			# provisional, replaced once the result is recorded
+			self._reschedule(address, history, now + self.interval(history, now))
+		return due
+
+	def next_deadline(self) -> float | None:
+		while self._heap:
+			next_check, address = self._heap[0]
+			history = self._devices.get(address)
+			if history is not None and history.next_check == next_check:
+				return next_check
+			heapq.heappop(self._heap)
+		return None
+
+	def _reschedule(self, address: str, history: DeviceHistory, next_check: float) -> None:
+		history.next_check = next_check
+		heapq.heappush(self._heap, (next_check, address))
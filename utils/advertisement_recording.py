@@ -0,0 +1,98 @@
+import logging
+import struct
+import time
+from typing import BinaryIO, Iterator, NamedTuple
+
+logger = logging.getLogger("utils.advertisement_recording")
+
+MAGIC = b"BTADV2\n"
+# milliseconds since the start of the recording, MAC, RSSI, length of the name that follows
+_RECORD = struct.Struct("<Q6sbB")
+# the first format, whose 32-bit offsets end after 49.7 days; still readable
+_MAGIC_V1 = b"BTADV1\n"
+_RECORD_V1 = struct.Struct("<I6sbB")
+
+class RecordedAdvertisement(NamedTuple):
+	offset: float
+	address: str
+	rssi: int
+	name: str | None
+
+def _pack_address(address: str) -> bytes:
+	return bytes.fromhex(address.replace(":", "").replace("-", "").replace("_", ""))
+
+def _unpack_address(packed: bytes) -> str:
+	return packed.hex(":").upper()
+
+class AdvertisementRecorder:
+	"""
+	Writes advertisements to a compact binary file: 16 bytes per advertisement,
+	plus the device name the first time it is seen or whenever it changes.
+	Recording runs in the detection callback, so it never raises: advertisements
+	from addresses that are not MACs are skipped, and a write error stops the
+	recording.
+	"""
+	def __init__(self, path: str):
+		self.path = path
+		self._file: BinaryIO | None = open(path, "wb")
+		self._file.write(MAGIC)
+		self._started_at = time.monotonic()
+		self._names: dict[str, str] = {}
+		self.recorded = 0
+		self.skipped = 0
+
+	def record(self, address: str, rssi: int, name: str | None) -> None:
+		if self._file is None:
+			return
+		try:
+			packed_address = _pack_address(address)
+		except ValueError:
+			packed_address = b""
+		if len(packed_address) != 6:
+			if not self.skipped:
+				logger.warning("Not recording advertisements from %s and other addresses that are not MACs", address)
+			self.skipped += 1
+			return
+		offset_ms = int((time.monotonic() - self._started_at) * 1000)
+		encoded_name = b""
+		if name is not None and self._names.get(address) != name:
+			self._names[address] = name
+			encoded_name = name.encode("utf-8")[:255]
+		rssi = max(-128, min(127, rssi))
+		try:
+			self._file.write(_RECORD.pack(offset_ms, packed_address, rssi, len(encoded_name)) + encoded_name)
+		except (OSError, ValueError) as e:
+			logger.error("Stopping the advertisement recording, %s could not be written: %s", self.path, e)
+			self.close()
+			return
+		self.recorded += 1
+
+	def close(self) -> None:
+		if self._file is None:
+			return
+		try:
+			self._file.close()
+		except OSError as e:
+			logger.error("Error closing %s: %s", self.path, e)
+		self._file = None
+		logger.info("Recorded %d advertisements to %s, skipped %d", self.recorded, self.path, self.skipped)
+
+def read_recording(path: str) -> Iterator[RecordedAdvertisement]:
+	names: dict[str, str] = {}
+	with open(path, "rb") as f:
+		magic = f.read(len(MAGIC))
+		if magic == MAGIC:
+			record = _RECORD
+		elif magic == _MAGIC_V1:
+			record = _RECORD_V1
+		else:
+			raise ValueError(f"{path} is not an advertisement recording")
+		while True:
+			header = f.read(record.size)
+			if len(header) < record.size:
+				return
+			offset_ms, packed_address, rssi, name_length = record.unpack(header)
+			address = _unpack_address(packed_address)
+			if name_length:
+				names[address] = f.read(name_length).decode("utf-8", errors="replace")
+			yield RecordedAdvertisement(offset_ms / 1000, address, rssi, names.get(address))
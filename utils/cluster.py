@@ -0,0 +1,129 @@
+"""
+Cluster mode: every node shares which devices its radio hears and how loud,
+and the nodes derive one presence state and the room of the loudest node per
+device from the shared observations.
+"""
+import hashlib
+import struct
+from typing import Iterable, NamedTuple
+
+FORMAT_VERSION = 1
+# format version, room name length, followed by the UTF-8 room name
+_HEADER = struct.Struct("<BB")
+# MAC address and RSSI of every device the node considers present
+_OBSERVATION = struct.Struct("<6sb")
+# RSSI of a device that is present without a counted sighting, e.g. a restored state
+UNKNOWN_RSSI = -128
+# Another node only takes a device over when it hears it at least this many dB louder
+ROOM_SWITCH_MARGIN = 4
+
+class NodeObservations(NamedTuple):
+	room: str
+	# normalized address -> RSSI of the present devices
+	devices: dict[str, int]
+
+def encode_observations(room: str, devices: dict[str, int]) -> bytes:
+	"""Pack the observations into 7 bytes per device; addresses that are not MACs are skipped"""
+	room_bytes = room.encode("utf-8")[:255]
+	parts = [_HEADER.pack(FORMAT_VERSION, len(room_bytes)), room_bytes]
+	for address, rssi in devices.items():
+		try:
+			raw = bytes.fromhex(address.replace(":", ""))
+		except ValueError:
+			continue
+		if len(raw) == 6:
+			parts.append(_OBSERVATION.pack(raw, max(UNKNOWN_RSSI, min(127, rssi))))
+	return b"".join(parts)
+
+def decode_observations(payload: bytes) -> NodeObservations:
+	if len(payload) < _HEADER.size:
+		raise ValueError("Observations payload is too short")
+	version, room_length = _HEADER.unpack_from(payload)
+	if version != FORMAT_VERSION:
+		raise ValueError(f"Unsupported observations format {version}")
+	offset = _HEADER.size + room_length
+	if (len(payload) - offset) % _OBSERVATION.size:
+		raise ValueError("Observations payload is truncated")
+	room = payload[_HEADER.size:offset].decode("utf-8")
+	devices = {raw.hex(":").upper(): rssi for raw, rssi in _OBSERVATION.iter_unpack(payload[offset:])}
+	return NodeObservations(room, devices)
+
+def shard_owner(address: str, nodes: Iterable[str]) -> str:
+	"""
+	Rendezvous hashing: every node computes the same owner from the same node
+	set, and a node joining or leaving only moves the devices it owns or takes.
+	"""
+	return max(
+		nodes,
+		key=lambda node: (hashlib.blake2b(f"{node}/{address}".encode("utf-8"), digest_size=8).digest(), node),
+	)
+
+class DevicePlacement(NamedTuple):
+	home: bool
+	room: str | None
+
+class ClusterView:
+	"""
+	Latest observations of every node. A device is home while any live node
+	reports it, and is placed in the room of the node hearing it loudest; equal
+	RSSI goes to the lowest node id. The current room is kept until another node
+	hears the device `switch_margin` dB louder, so placements depend on the
+	order of the updates and only one aggregator per cluster is supported. A
+	node that sent nothing for `node_timeout` seconds is dropped with its
+	observations.
+	"""
+	def __init__(self, node_timeout: float, switch_margin: int = ROOM_SWITCH_MARGIN):
+		self.node_timeout = node_timeout
+		self.switch_margin = switch_margin
+		self._nodes: dict[str, tuple[NodeObservations, float]] = {}
+		# node the device is currently placed at
+		self._holders: dict[str, str] = {}
+
+	def update(self, node_id: str, observations: NodeObservations, now: float) -> set[str]:
+		"""Replace the observations of a node and return the devices whose placement may have changed"""
+		previous = self._nodes.get(node_id)
+		self._nodes[node_id] = (observations, now)
+		if previous is None:
+			return set(observations.devices)
+		old = previous[0]
+		if old.room != observations.room:
+			return set(old.devices) | set(observations.devices)
+		return {
+			address for address in old.devices.keys() | observations.devices.keys()
+			if old.devices.get(address) != observations.devices.get(address)
+		}
+
+	def remove(self, node_id: str) -> set[str]:
+		entry = self._nodes.pop(node_id, None)
+		return set(entry[0].devices) if entry is not None else set()
+
+	def expire(self, now: float) -> set[str]:
+		changed: set[str] = set()
+		for node_id in [node_id for node_id, (_, seen_at) in self._nodes.items() if seen_at + self.node_timeout <= now]:
+			changed |= self.remove(node_id)
+		return changed
+
+	def nodes(self) -> list[str]:
+		return sorted(self._nodes)
+
+	def forget(self, addresses: Iterable[str]) -> None:
+		for address in addresses:
+			self._holders.pop(address, None)
+
+	def resolve(self, address: str) -> DevicePlacement:
+		candidates = [
+			(rssi, node_id, observations.room)
+			for node_id, (observations, _) in self._nodes.items()
+			if (rssi := observations.devices.get(address)) is not None
+		]
+		if not candidates:
+			self._holders.pop(address, None)
+			return DevicePlacement(False, None)
+		best = min(candidates, key=lambda candidate: (-candidate[0], candidate[1]))
+		holder = self._holders.get(address)
+		current = next((candidate for candidate in candidates if candidate[1] == holder), None)
+		# stay in the current room unless another node hears the device clearly louder
+		if current is not None and current[0] + self.switch_margin > best[0]:
+			best = current
+		self._holders[address] = best[1]
+		return DevicePlacement(True, best[2])
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+from typing import Callable
+
+from config import Config, ConfigDiff
+from utils.read_config import CONFIG_PATH, read_config
+
+logger = logging.getLogger("utils.config_watcher")
+
+class ConfigWatcher:
+	"""
+	Checks the modification time and size of the config file every `interval`
+	seconds and reloads the Config when they change, passing the resulting diff
+	to `on_change`. An unreadable or invalid file leaves the running config as is.
+	"""
+	def __init__(self, on_change: Callable[[ConfigDiff], None], interval: float, path: str = CONFIG_PATH):
+		self.on_change = on_change
+		self.interval = interval
+		self.path = path
+		self._signature = self._stat()
+
+	def _stat(self) -> tuple[int, int] | None:
+		try:
+			stat = os.stat(self.path)
+		except OSError:
+			return None
+		return stat.st_mtime_ns, stat.st_size
+
+	async def run(self) -> None:
+		while True:
+			await asyncio.sleep(self.interval)
+			self.check()
+
+	def check(self) -> ConfigDiff | None:
+		signature = self._stat()
+		if signature is None or signature == self._signature:
+			return None
+		self._signature = signature
+
+		raw_config = read_config(self.path)
+		if raw_config is None:
+			logger.error("Keeping the running config, %s could not be read", self.path)
+			return None
+		try:
+			diff = Config.get_instance().reload(raw_config)
+		except (KeyError, TypeError, ValueError) as e:
+			logger.error("Keeping the running config, %s is invalid: %s", self.path, e)
+			return None
+		if not diff:
+			return diff
+
+		logger.info(
+			"Config reloaded: %d devices added, %d removed, %d changed, settings changed: %s",
+			len(diff.added),
+			len(diff.removed),
+			len(diff.changed),
+			sorted(diff.settings) or "none",
+		)
+		if diff.pending:
+			logger.warning("Changes to %s take effect after a restart", ", ".join(sorted(diff.pending)))
+		try:
+			self.on_change(diff)
+		except Exception as e:
+			logger.error("Error applying config changes: %s", e)
+		return diff
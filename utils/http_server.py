@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("utils.http_server")
+
+# A route returns the content type and the response body
+Route = Callable[[str], tuple[str, bytes] | None]
+
+_REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 400: "Bad Request"}
+# Seconds a kept-alive connection may stay idle between requests
+IDLE_TIMEOUT = 30
+# Seconds to receive the rest of a request once it started
+REQUEST_TIMEOUT = 5
+
+def _make_handler(routes: dict[str, Route]) -> Callable[[asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]]:
+	async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		try:
+			keep_alive = True
+			while keep_alive:
+				request_line = await asyncio.wait_for(reader.readline(), timeout=IDLE_TIMEOUT)
+				if not request_line:
+					break
+				# drain headers, the request body is never used
+				connection = ""
+				while True:
+					line = await asyncio.wait_for(reader.readline(), timeout=REQUEST_TIMEOUT)
+					if line in (b"\r\n", b"\n", b""):
+						break
+					name, _, value = line.decode("latin-1").partition(":")
+					if name.strip().lower() == "connection":
+						connection = value.strip().lower()
+
+				parts = request_line.decode("latin-1").split()
+				# HTTP/1.1 connections stay open unless the client asks otherwise, HTTP/1.0 ones only if it asks
+				if len(parts) == 3 and parts[2] == "HTTP/1.1":
+					keep_alive = connection != "close"
+				else:
+					keep_alive = connection == "keep-alive"
+				if len(parts) < 2:
+					keep_alive = False
+					_write_response(writer, 400, "text/plain", b"bad request\n", keep_alive)
+				elif parts[0] != "GET":
+					_write_response(writer, 405, "text/plain", b"method not allowed\n", keep_alive)
+				else:
+					path, _, query = parts[1].partition("?")
+					route = routes.get(path)
+					response = route(query) if route is not None else None
+					if response is None:
+						_write_response(writer, 404, "text/plain", b"not found\n", keep_alive)
+					else:
+						_write_response(writer, 200, response[0], response[1], keep_alive)
+				await writer.drain()
+		except Exception as e:
+			logger.debug("Error handling HTTP request: %s", e)
+		finally:
+			writer.close()
+	return handle
+
+async def start_http_server(host: str, port: int, routes: dict[str, Route]) -> asyncio.Server:
+	"""
+	Minimal read-only HTTP server with keep-alive. `routes` maps a path to a handler
+	that receives the query string and returns `None` for a missing resource.
+	"""
+	server = await asyncio.start_server(_make_handler(routes), host, port)
+	logger.info("HTTP server listening on %s:%d", host, port)
+	return server
+
+async def start_unix_http_server(path: str, routes: dict[str, Route]) -> asyncio.Server:
+	"""The same server on a Unix domain socket"""
+	server = await asyncio.start_unix_server(_make_handler(routes), path)
+	logger.info("HTTP server listening on %s", path)
+	return server
+
+def _write_response(writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes, keep_alive: bool) -> None:
+	head = (
+		f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+		f"Content-Type: {content_type}\r\n"
+		f"Content-Length: {len(body)}\r\n"
+		f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+	)
+	# the body is often a cached response, written as is instead of copied into one buffer
+	writer.writelines((head.encode("latin-1"), body))
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Mapping
+
+if TYPE_CHECKING:
+	from cryptography.hazmat.primitives.ciphers import Cipher, modes
+
+logger = logging.getLogger("utils.irk_resolver")
+
+# Resolved and unresolvable private addresses remembered between advertisements
+DEFAULT_CACHE_SIZE = 4096
+# ah() only uses the last 3 bytes of each 16 byte AES block
+_HASH_OFFSET = 13
+_BLOCK_SIZE = 16
+
+def is_available() -> bool:
+	return importlib.util.find_spec("cryptography") is not None
+
+def aes_ecb(key: bytes) -> Cipher[modes.ECB]:
+	"""AES-ECB with `key`. cryptography is an optional dependency, only needed to resolve private addresses"""
+	try:
+		from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+	except ImportError:
+		raise RuntimeError("Resolving private addresses requires the cryptography package") from None
+	return Cipher(algorithms.AES(key), modes.ECB())
+
+def parse_irk(irk: str) -> bytes:
+	"""An IRK written as 32 hex digits, most significant byte first"""
+	key = bytes.fromhex(irk.replace(":", "").replace(" ", ""))
+	if len(key) != 16:
+		raise ValueError(f"Invalid IRK {irk}: expected 16 bytes")
+	return key
+
+def is_resolvable_private_address(address: str) -> bool:
+	# the two most significant bits of a resolvable private address are 0b01
+	try:
+		return int(address[:2], 16) >> 6 == 0b01
+	except ValueError:
+		return False
+
+def _pack_address(address: str) -> bytes:
+	return bytes.fromhex(address.replace(":", "").replace("-", "").replace("_", ""))
+
+def _matching_blocks(ciphertext: bytes, expected: tuple[bytes, bytes, bytes]) -> list[int]:
+	"""Indexes of the blocks whose ah() output equals the expected address hash"""
+	count = len(expected[0])
+	# XOR every hash byte column with the expected one at once; a block matches
+	# where all three columns are zero
+	difference = 0
+	for column, wanted in enumerate(expected):
+		computed = ciphertext[_HASH_OFFSET + column::_BLOCK_SIZE]
+		difference |= int.from_bytes(computed, "big") ^ int.from_bytes(wanted, "big")
+	columns = difference.to_bytes(count, "big")
+	matches: list[int] = []
+	index = columns.find(0)
+	while index != -1:
+		matches.append(index)
+		index = columns.find(0, index + 1)
+	return matches
+
+class IrkResolver:
+	"""
+	Maps resolvable private addresses to configured devices by checking them
+	against every device's IRK with the Bluetooth ah() function. Results, including
+	addresses no IRK resolves, are kept in an LRU cache. New addresses are queued
+	and resolved together: each IRK encrypts the whole batch in one AES-ECB call,
+	instead of one AES operation per address and IRK on every advertisement.
+	"""
+	def __init__(self, irks: Mapping[str, bytes], cache_size: int = DEFAULT_CACHE_SIZE):
+		self.cache_size = cache_size
+		self._ciphers = [(address, aes_ecb(irk)) for address, irk in irks.items()]
+		self._cache: OrderedDict[str, str | None] = OrderedDict()
+		self._pending: dict[str, None] = {}
+		self.resolved = 0
+		self.unresolvable = 0
+
+	def __len__(self) -> int:
+		return len(self._ciphers)
+
+	def cached(self, address: str) -> tuple[bool, str | None]:
+		"""(known, device address) for an address resolved before"""
+		if address not in self._cache:
+			return False, None
+		self._cache.move_to_end(address)
+		return True, self._cache[address]
+
+	def queue(self, address: str) -> bool:
+		"""Queue an address for the next batch. Returns True for the first queued address."""
+		first = not self._pending
+		self._pending[address] = None
+		return first
+
+	def resolve_pending(self) -> dict[str, str | None]:
+		"""Resolve the queued addresses in one batch"""
+		addresses = list(self._pending)
+		self._pending.clear()
+		return self.resolve_batch(addresses)
+
+	def resolve(self, address: str) -> str | None:
+		known, device = self.cached(address)
+		if known:
+			return device
+		return self.resolve_batch([address])[address]
+
+	def resolve_batch(self, addresses: list[str]) -> dict[str, str | None]:
+		results: dict[str, str | None] = dict.fromkeys(addresses)
+		if addresses and self._ciphers:
+			packed = [_pack_address(address) for address in addresses]
+			# plaintext of ah() is the 24 bit prand padded to 128 bits
+			plaintext = b"".join(bytes(_HASH_OFFSET) + rpa[:3] for rpa in packed)
+			expected = (
+				bytes(rpa[3] for rpa in packed),
+				bytes(rpa[4] for rpa in packed),
+				bytes(rpa[5] for rpa in packed),
+			)
+			for device, cipher in self._ciphers:
+				encryptor = cipher.encryptor()
+				ciphertext = encryptor.update(plaintext) + encryptor.finalize()
+				for index in _matching_blocks(ciphertext, expected):
+					results[addresses[index]] = device
+
+		for address, device in results.items():
+			if device is None:
+				self.unresolvable += 1
+			else:
+				self.resolved += 1
+			self._cache[address] = device
+			self._cache.move_to_end(address)
+		while len(self._cache) > self.cache_size:
+			self._cache.popitem(last=False)
+		return results
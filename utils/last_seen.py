@@ -0,0 +1,112 @@
+import heapq
+from dataclasses import dataclass
+
+# Sightings of the same device from different adapters within this window are
+# merged, keeping the strongest RSSI. The window starts at the strongest sighting,
+# so a weaker adapter takes over once it has passed.
+MERGE_WINDOW = 1.0
+
+
+@dataclass
+class LastSeenEntry:
+	last_seen: float
+	rssi: int | None
+	present: bool | None
+	source: str | None = None
+	# when the kept RSSI was seen, the start of its merge window
+	best_at: float = float("-inf")
+
+
+class LastSeenTable:
+	"""
+	Last-seen timestamp and RSSI per tracked address, used by the continuous scan mode.
+	A device is reported away once it has not been seen for `away_timeout` seconds.
+	Deadlines live in a heap with at most one entry per address; entries that went
+	stale because the device was seen again are re-armed when they are popped.
+	"""
+
+	def __init__(self, away_timeout: float):
+		self.away_timeout = away_timeout
+		self._entries: dict[str, LastSeenEntry] = {}
+		self._deadlines: list[tuple[float, str]] = []
+
+	def track(self, addresses: list[str], now: float) -> None:
+		for address in addresses:
+			if address in self._entries:
+				continue
+			self._entries[address] = LastSeenEntry(last_seen=now, rssi=None, present=None)
+			heapq.heappush(self._deadlines, (now + self.away_timeout, address))
+
+	def restore(self, sightings: list[tuple[str, float, int | None, bool | None]]) -> None:
+		"""Resume tracked devices from saved (address, last_seen, rssi, present) sightings"""
+		for address, last_seen, rssi, present in sightings:
+			entry = self._entries.get(address)
+			if entry is not None:
+				entry.last_seen = last_seen
+				entry.rssi = rssi
+				entry.present = present
+				entry.best_at = last_seen
+		self._deadlines = [
+			(entry.last_seen + self.away_timeout, address)
+			for address, entry in self._entries.items()
+			if entry.present is not False
+		]
+		heapq.heapify(self._deadlines)
+
+	def untrack(self, addresses: list[str]) -> None:
+		# their heap entries are dropped when popped
+		for address in addresses:
+			self._entries.pop(address, None)
+
+	def __contains__(self, address: str) -> bool:
+		return address in self._entries
+
+	def get(self, address: str) -> LastSeenEntry | None:
+		return self._entries.get(address)
+
+	def seen(self, address: str, rssi: int | None, now: float, source: str | None = None) -> bool:
+		"""Record a sighting. Returns True when the device was not already present."""
+		entry = self._entries.get(address)
+		if entry is None:
+			return False
+		weaker_duplicate = (
+			source != entry.source
+			and now - entry.best_at < MERGE_WINDOW
+			and rssi is not None
+			and entry.rssi is not None
+			and rssi < entry.rssi
+		)
+		if not weaker_duplicate:
+			entry.rssi = rssi
+			entry.source = source
+			entry.best_at = now
+		entry.last_seen = now
+		if entry.present:
+			return False
+		if entry.present is False:
+			# away devices have no pending deadline
+			heapq.heappush(self._deadlines, (now + self.away_timeout, address))
+		entry.present = True
+		return True
+
+	def pop_expired(self, now: float) -> list[str]:
+		"""Return the addresses that just went away, re-arming deadlines of devices seen since."""
+		expired: list[str] = []
+		while self._deadlines and self._deadlines[0][0] <= now:
+			_, address = heapq.heappop(self._deadlines)
+			entry = self._entries.get(address)
+			if entry is None:
+				continue
+			deadline = entry.last_seen + self.away_timeout
+			if deadline > now:
+				heapq.heappush(self._deadlines, (deadline, address))
+				continue
+			if entry.present is not False:
+				entry.present = False
+				expired.append(address)
+		return expired
+
+	def next_deadline(self) -> float | None:
+		if not self._deadlines:
+			return None
+		return self._deadlines[0][0]
@@ -0,0 +1,183 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from typing import Callable, TypeVar
+
+logger = logging.getLogger("utils.metrics")
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+DETECTION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+class Counter:
+	"""A monotonic total, counted here or read from `source` at render time"""
+	def __init__(self, name: str, help: str, source: Callable[[], float] | None = None):
+		self.name = name
+		self.help = help
+		self.value = 0.0
+		self.source = source
+
+	def inc(self, amount: float = 1) -> None:
+		self.value += amount
+
+	def render(self) -> list[str]:
+		value = self.source() if self.source is not None else self.value
+		return [
+			f"# HELP {self.name} {self.help}",
+			f"# TYPE {self.name} counter",
+			f"{self.name} {value}",
+		]
+
+class Gauge:
+	"""A gauge holding a value, or reading it from `source` at render time"""
+	def __init__(self, name: str, help: str, source: Callable[[], float] | None = None):
+		self.name = name
+		self.help = help
+		self.value = 0.0
+		self.source = source
+
+	def set(self, value: float) -> None:
+		self.value = value
+
+	def render(self) -> list[str]:
+		value = self.source() if self.source is not None else self.value
+		return [
+			f"# HELP {self.name} {self.help}",
+			f"# TYPE {self.name} gauge",
+			f"{self.name} {value}",
+		]
+
+class Histogram:
+	def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+		self.name = name
+		self.help = help
+		self.buckets = buckets
+		self._counts = [0] * (len(buckets) + 1)
+		self._sum = 0.0
+		# observations come from both the event loop and the paho thread
+		self._lock = threading.Lock()
+
+	def observe(self, value: float) -> None:
+		index = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			self._counts[index] += 1
+			self._sum += value
+
+	def snapshot(self) -> tuple[int, float]:
+		"""Number and sum of the observations so far"""
+		with self._lock:
+			return sum(self._counts), self._sum
+
+	def render(self) -> list[str]:
+		with self._lock:
+			counts = list(self._counts)
+			total = self._sum
+		lines = [
+			f"# HELP {self.name} {self.help}",
+			f"# TYPE {self.name} histogram",
+		]
+		cumulative = 0
+		for bound, count in zip(self.buckets, counts):
+			cumulative += count
+			lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+		cumulative += counts[-1]
+		lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+		lines.append(f"{self.name}_sum {total}")
+		lines.append(f"{self.name}_count {cumulative}")
+		return lines
+
+Metric = Counter | Gauge | Histogram
+M = TypeVar("M", Counter, Gauge, Histogram)
+
+class MetricsRegistry:
+	def __init__(self):
+		self._metrics: list[Metric] = []
+
+	def register(self, metric: M) -> M:
+		self._metrics.append(metric)
+		return metric
+
+	def render(self) -> bytes:
+		lines: list[str] = []
+		for metric in self._metrics:
+			lines.extend(metric.render())
+		return ("\n".join(lines) + "\n").encode("utf-8")
+
+class DutyCycle:
+	"""Fraction of time the scanner has been running since the process started"""
+	def __init__(self):
+		self._started_at = time.monotonic()
+		self._on_since: float | None = None
+		self._on_total = 0.0
+
+	def scanner_started(self) -> None:
+		if self._on_since is None:
+			self._on_since = time.monotonic()
+
+	def scanner_stopped(self) -> None:
+		if self._on_since is not None:
+			self._on_total += time.monotonic() - self._on_since
+			self._on_since = None
+
+	def ratio(self) -> float:
+		now = time.monotonic()
+		on_total = self._on_total
+		if self._on_since is not None:
+			on_total += now - self._on_since
+		elapsed = now - self._started_at
+		return on_total / elapsed if elapsed > 0 else 0.0
+
+class StartupClock:
+	"""Time from startup until every configured device had a known state"""
+	def __init__(self):
+		self.started_at = time.monotonic()
+		self.first_states_after: float | None = None
+
+	def all_states_known(self) -> None:
+		if self.first_states_after is None:
+			self.first_states_after = time.monotonic() - self.started_at
+			logger.info("All device states known %.3f seconds after startup", self.first_states_after)
+
+	def value(self) -> float:
+		return self.first_states_after if self.first_states_after is not None else float("nan")
+
+registry = MetricsRegistry()
+
+detection_latency = registry.register(Histogram(
+	"bt_detection_latency_seconds", "Time from scan start until a tracked device was found", DETECTION_BUCKETS
+))
+detection_callback_duration = registry.register(Histogram(
+	"bt_detection_callback_seconds", "Time spent inside the detection callback"
+))
+scanner_start_duration = registry.register(Histogram(
+	"bt_scanner_start_seconds", "Time taken to start the scanner"
+))
+scanner_stop_duration = registry.register(Histogram(
+	"bt_scanner_stop_seconds", "Time taken to stop the scanner"
+))
+scan_duty_cycle = DutyCycle()
+registry.register(Gauge(
+	"bt_scan_duty_cycle_ratio", "Fraction of time the scanner has been running", scan_duty_cycle.ratio
+))
+startup_clock = StartupClock()
+registry.register(Gauge(
+	"presence_first_states_seconds",
+	"Time from startup until every configured device had a known state",
+	startup_clock.value,
+))
+publish_duration = registry.register(Histogram(
+	"mqtt_publish_seconds", "Time taken by send_event to hand a message to the outbox or client"
+))
+loop_lag = registry.register(Histogram(
+	"asyncio_loop_lag_seconds", "Delay between the scheduled and actual wake-up of a periodic task"
+))
+
+async def monitor_loop_lag(interval: float = 0.5) -> None:
+	while True:
+		expected = time.monotonic() + interval
+		await asyncio.sleep(interval)
+		loop_lag.observe(max(time.monotonic() - expected, 0))
+
+def metrics_route(query: str) -> tuple[str, bytes]:
+	return "text/plain; version=0.0.4", registry.render()
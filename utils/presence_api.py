@@ -0,0 +1,221 @@
+import bisect
+import json
+import time
+from typing import Iterable
+from urllib.parse import parse_qs
+
+from config import Device, normalize_address
+from mqtt.types import HomeState
+from utils.http_server import Route
+from utils.presence_snapshot import SnapshotEntry
+
+CONTENT_TYPE = "application/json"
+# State changes kept for the changes feed; older `since` values get the full list
+CHANGE_LOG_SIZE = 10_000
+# Last seen times and RSSI in the responses are refreshed at most this often, in seconds
+LAST_SEEN_RESOLUTION = 1.0
+# Distinct `since` values whose changes responses are cached
+CHANGES_CACHE_SIZE = 64
+
+class PresenceEntry:
+	__slots__ = ("address", "name", "state", "changed_at", "last_seen", "rssi", "seq", "fragment")
+
+	def __init__(self, address: str, name: str | None):
+		self.address = address
+		self.name = name
+		self.state: str | None = None
+		# wall-clock times
+		self.changed_at: float | None = None
+		self.last_seen: float | None = None
+		self.rssi: int | None = None
+		self.seq = 0
+		# the entry serialized as a JSON object, None when it must be rebuilt
+		self.fragment: bytes | None = None
+
+	def serialize(self) -> bytes:
+		if self.fragment is None:
+			self.fragment = json.dumps({
+				"address": self.address,
+				"name": self.name,
+				"state": self.state,
+				"changed_at": self.changed_at,
+				"last_seen": self.last_seen,
+				"rssi": self.rssi,
+				"seq": self.seq,
+			}).encode("utf-8")
+		return self.fragment
+
+class PresenceIndex:
+	"""
+	Presence of every configured device for the local query API, fed by the state
+	cache and the sighting listeners. Responses are serialized when first asked
+	for and kept until a device changes state, so polling clients cost a dict
+	lookup. Every state or name change gets the next sequence number; the changes
+	feed returns the devices changed after a client's last sequence number. Last
+	seen times move with every advertisement, so they only invalidate the cached
+	responses once per LAST_SEEN_RESOLUTION seconds.
+	"""
+	def __init__(self, change_log_size: int = CHANGE_LOG_SIZE, last_seen_resolution: float = LAST_SEEN_RESOLUTION):
+		self.change_log_size = change_log_size
+		self.last_seen_resolution = last_seen_resolution
+		self.seq = 0
+		self._entries: dict[str, PresenceEntry] = {}
+		# (seq, address) per change, oldest first
+		self._changes: list[tuple[int, str]] = []
+		# devices whose last seen time moved since their fragment was built
+		self._stale: set[str] = set()
+		self._refreshed_at = float("-inf")
+		self._snapshot: bytes | None = None
+		self._changes_responses: dict[int, bytes] = {}
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def track(self, devices: Iterable[Device]) -> None:
+		for device in devices:
+			address = normalize_address(device.address)
+			if address not in self._entries:
+				self._entries[address] = PresenceEntry(device.address, device.name)
+				self._changed(address)
+
+	def forget(self, addresses: Iterable[str]) -> None:
+		for address in addresses:
+			address = normalize_address(address)
+			if self._entries.pop(address, None) is not None:
+				self._stale.discard(address)
+				self._changed(address)
+
+	def restore(self, restored: dict[str, SnapshotEntry]) -> None:
+		"""Seed last seen times and RSSI from the presence snapshot"""
+		for address, saved in restored.items():
+			entry = self._entries.get(normalize_address(address))
+			if entry is not None:
+				entry.last_seen = saved.last_seen
+				entry.rssi = saved.rssi
+				entry.fragment = None
+		self._invalidate()
+
+	def record_state(self, address: str, state: HomeState) -> None:
+		address = normalize_address(address)
+		entry = self._entries.get(address)
+		if entry is None or entry.state == state.value:
+			return
+		entry.state = state.value
+		entry.changed_at = time.time()
+		self._changed(address)
+
+	def record_name(self, device: Device) -> None:
+		address = normalize_address(device.address)
+		entry = self._entries.get(address)
+		if entry is not None and entry.name != device.name:
+			entry.name = device.name
+			self._changed(address)
+
+	def record_sighting(self, address: str, rssi: int, seen_at: float) -> None:
+		address = normalize_address(address)
+		entry = self._entries.get(address)
+		if entry is not None:
+			entry.last_seen = seen_at
+			entry.rssi = rssi
+			self._stale.add(address)
+
+	def snapshot(self, now: float) -> bytes:
+		self._refresh(now)
+		if self._snapshot is None:
+			self._snapshot = self._document(self._entries.values(), reset=None)
+		return self._snapshot
+
+	def device(self, address: str, now: float) -> bytes | None:
+		self._refresh(now)
+		entry = self._entries.get(normalize_address(address))
+		return entry.serialize() if entry is not None else None
+
+	def changes(self, since: int, now: float) -> bytes:
+		"""Devices changed after `since`; with `reset` true the feed no longer reaches back that far and lists all devices"""
+		self._refresh(now)
+		since = min(since, self.seq)
+		response = self._changes_responses.get(since)
+		if response is not None:
+			return response
+		if self._changes and self._changes[0][0] > since + 1:
+			# changes after `since` were already dropped from the log
+			response = self._document(self._entries.values(), reset=True)
+		else:
+			start = bisect.bisect_right(self._changes, since, key=lambda change: change[0])
+			# latest change per device, in sequence order
+			changed = list(dict.fromkeys(address for _, address in reversed(self._changes[start:])))
+			changed.reverse()
+			entries = [self._entries.get(address) for address in changed]
+			removed = [address for address, entry in zip(changed, entries) if entry is None]
+			response = self._document([entry for entry in entries if entry is not None], reset=False, removed=removed)
+		if len(self._changes_responses) >= CHANGES_CACHE_SIZE:
+			self._changes_responses.clear()
+		self._changes_responses[since] = response
+		return response
+
+	def _document(self, entries: Iterable[PresenceEntry], reset: bool | None, removed: list[str] | None = None) -> bytes:
+		head = f'{{"seq": {self.seq}, '
+		if reset is not None:
+			head += f'"reset": {json.dumps(reset)}, '
+		if removed:
+			head += f'"removed": {json.dumps(removed)}, '
+		return b"".join((head.encode("utf-8"), b'"devices": [', b", ".join(entry.serialize() for entry in entries), b"]}"))
+
+	def _changed(self, address: str) -> None:
+		self.seq += 1
+		entry = self._entries.get(address)
+		if entry is not None:
+			entry.seq = self.seq
+			entry.fragment = None
+		self._changes.append((self.seq, address))
+		if len(self._changes) > 2 * self.change_log_size:
+			del self._changes[:-self.change_log_size]
+		self._invalidate()
+
+	def _invalidate(self) -> None:
+		self._snapshot = None
+		self._changes_responses.clear()
+
+	def _refresh(self, now: float) -> None:
+		if not self._stale or now - self._refreshed_at < self.last_seen_resolution:
+			return
+		for address in self._stale:
+			entry = self._entries.get(address)
+			if entry is not None:
+				entry.fragment = None
+		self._stale.clear()
+		self._refreshed_at = now
+		self._invalidate()
+
+def _query_value(query: str, name: str) -> str | None:
+	values = parse_qs(query).get(name)
+	return values[0] if values else None
+
+def presence_routes(index: PresenceIndex) -> dict[str, Route]:
+	"""
+	/presence: every device
+	/presence/device?address=AA:BB:CC:DD:EE:FF: one device
+	/presence/changes?since=<seq>: devices changed after a sequence number
+	"""
+	def snapshot_route(query: str) -> tuple[str, bytes]:
+		return CONTENT_TYPE, index.snapshot(time.monotonic())
+
+	def device_route(query: str) -> tuple[str, bytes] | None:
+		address = _query_value(query, "address")
+		if address is None:
+			return None
+		response = index.device(address, time.monotonic())
+		return (CONTENT_TYPE, response) if response is not None else None
+
+	def changes_route(query: str) -> tuple[str, bytes] | None:
+		try:
+			since = int(_query_value(query, "since") or 0)
+		except ValueError:
+			return None
+		return CONTENT_TYPE, index.changes(since, time.monotonic())
+
+	return {
+		"/presence": snapshot_route,
+		"/presence/device": device_route,
+		"/presence/changes": changes_route,
+	}
@@ -0,0 +1,295 @@
+"""
+Append-only presence history: sightings and home/not_home transitions in fixed
+width binary records, one segment file per UTC day, with NumPy queries over
+memory-mapped segments.
+
+Query from the command line, run from the repository root:
+	python -m utils.presence_history history dwell AA:BB:CC:DD:EE:FF --days 7
+	python -m utils.presence_history history transitions AA:BB:CC:DD:EE:FF --days 1
+	python -m utils.presence_history history occupancy --days 1
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import re
+import struct
+import time
+from typing import IO, TYPE_CHECKING, NamedTuple
+
+from mqtt.types import HomeState
+
+if TYPE_CHECKING:
+	import numpy as np
+	from numpy.typing import NDArray
+
+logger = logging.getLogger("utils.presence_history")
+
+MAGIC = b"BTHIST1\n"
+# the header is padded so records stay 16 byte aligned
+HEADER_SIZE = 16
+# wall-clock time, device id, RSSI, record kind
+_RECORD = struct.Struct("<dIbB2x")
+KIND_SIGHTING = 0
+KIND_HOME = 1
+KIND_NOT_HOME = 2
+SEGMENT_SECONDS = 86400
+# At most one sighting per device is logged within this many seconds
+SIGHTING_INTERVAL = 60
+# One address per line, the line number is the device id
+DEVICES_FILE = "devices.txt"
+
+_STATE_KINDS = {HomeState.home: KIND_HOME, HomeState.not_home: KIND_NOT_HOME}
+
+def segment_path(directory: str, day: int) -> str:
+	return os.path.join(directory, time.strftime("%Y-%m-%d.bin", time.gmtime(day * SEGMENT_SECONDS)))
+
+def _numpy():
+	"""NumPy is an optional dependency, only needed for queries"""
+	try:
+		import numpy
+	except ImportError:
+		raise RuntimeError("Querying the presence history requires the numpy package") from None
+	return numpy
+
+def read_last_states(directory: str) -> dict[int, int]:
+	"""Last state record kind of every device in the newest segment"""
+	segments = sorted(name for name in os.listdir(directory) if re.fullmatch(r"\d{4}-\d{2}-\d{2}\.bin", name))
+	if not segments:
+		return {}
+	with open(os.path.join(directory, segments[-1]), "rb") as f:
+		data = f.read()
+	states: dict[int, int] = {}
+	# a record cut short by a crash is ignored
+	end = HEADER_SIZE + (len(data) - HEADER_SIZE) // _RECORD.size * _RECORD.size
+	for _, device_id, _, kind in _RECORD.iter_unpack(data[HEADER_SIZE:end]):
+		if kind != KIND_SIGHTING:
+			states[device_id] = kind
+	return states
+
+def read_device_ids(directory: str) -> dict[str, int]:
+	try:
+		with open(os.path.join(directory, DEVICES_FILE), "r", encoding="utf-8") as f:
+			return {line.strip(): index for index, line in enumerate(f) if line.strip()}
+	except FileNotFoundError:
+		return {}
+
+class PresenceHistory:
+	"""
+	Writes the history log. Each new day segment starts with the current state of
+	every device, so a query never has to read earlier days to know a state. The
+	states are carried over from the newest segment on start.
+	"""
+	def __init__(self, directory: str):
+		os.makedirs(directory, exist_ok=True)
+		self.directory = directory
+		self._ids = read_device_ids(directory)
+		self._states = read_last_states(directory)
+		self._last_sighting: dict[int, float] = {}
+		self._file: IO[bytes] | None = None
+		self._day: int | None = None
+
+	def device_id(self, address: str) -> int:
+		device_id = self._ids.get(address)
+		if device_id is None:
+			device_id = len(self._ids)
+			with open(os.path.join(self.directory, DEVICES_FILE), "a", encoding="utf-8") as f:
+				f.write(address + "\n")
+			self._ids[address] = device_id
+		return device_id
+
+	def record_state(self, address: str, state: HomeState, at: float) -> None:
+		device_id = self.device_id(address)
+		kind = _STATE_KINDS[state]
+		self._append(at, device_id, 0, kind)
+		self._states[device_id] = kind
+		# transitions are rare, make them visible to readers right away
+		self.flush()
+
+	def record_sighting(self, address: str, rssi: int, at: float) -> None:
+		device_id = self.device_id(address)
+		last = self._last_sighting.get(device_id)
+		if last is not None and at - last < SIGHTING_INTERVAL:
+			return
+		self._last_sighting[device_id] = at
+		self._append(at, device_id, max(-128, min(127, rssi)), KIND_SIGHTING)
+
+	def _append(self, at: float, device_id: int, rssi: int, kind: int) -> None:
+		day = int(at // SEGMENT_SECONDS)
+		if self._file is None or day != self._day:
+			self._file = self._open_segment(day)
+		self._file.write(_RECORD.pack(at, device_id, rssi, kind))
+
+	def _open_segment(self, day: int) -> IO[bytes]:
+		self.close()
+		path = segment_path(self.directory, day)
+		new = not os.path.exists(path) or os.path.getsize(path) == 0
+		file = open(path, "ab")
+		self._day = day
+		if new:
+			file.write(MAGIC.ljust(HEADER_SIZE, b"\0"))
+			day_start = float(day * SEGMENT_SECONDS)
+			for device_id, kind in self._states.items():
+				file.write(_RECORD.pack(day_start, device_id, 0, kind))
+		return file
+
+	def flush(self) -> None:
+		if self._file is not None:
+			self._file.flush()
+
+	def close(self) -> None:
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+			self._day = None
+
+class HourlyOccupancy(NamedTuple):
+	addresses: list[str]
+	# start time of each hour
+	hours: NDArray[np.float64]
+	# fraction of each hour every device was home, one row per address
+	matrix: NDArray[np.float64]
+
+class HistoryReader:
+	"""Queries over the memory-mapped segments. Needs NumPy."""
+	def __init__(self, directory: str):
+		np = _numpy()
+		self.directory = directory
+		self.dtype = np.dtype([("time", "<f8"), ("device", "<u4"), ("rssi", "i1"), ("kind", "u1"), ("pad", "V2")])
+
+	def device_ids(self) -> dict[str, int]:
+		return read_device_ids(self.directory)
+
+	def records(self, start: float, end: float, states_only: bool = False) -> NDArray[np.void]:
+		"""Records of the segments overlapping [start, end], from the start of the first day"""
+		np = _numpy()
+		segments: list[NDArray[np.void]] = []
+		for day in range(int(start // SEGMENT_SECONDS), int(end // SEGMENT_SECONDS) + 1):
+			path = segment_path(self.directory, day)
+			if not os.path.exists(path):
+				continue
+			# a record cut short by a crash is ignored
+			count = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+			if count <= 0:
+				continue
+			segment = np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+			if states_only:
+				segment = segment[segment["kind"] != KIND_SIGHTING]
+			segments.append(segment)
+		if not segments:
+			return np.zeros(0, dtype=self.dtype)
+		records = np.concatenate(segments)
+		return records[records["time"] <= end]
+
+	def _states(self, start: float, end: float, device_ids: list[int]) -> tuple[NDArray[np.int64], NDArray[np.float64], NDArray[np.float64]]:
+		"""(device index, clipped time, home) of the state records, sorted by device and time"""
+		np = _numpy()
+		records = self.records(start, end, states_only=True)
+		index_of = np.full(max(device_ids, default=0) + 1, -1, dtype=np.int64)
+		index_of[device_ids] = np.arange(len(device_ids))
+		known = records["device"] < len(index_of)
+		records = records[known]
+		devices = index_of[records["device"]]
+		selected = devices >= 0
+		devices = devices[selected]
+		times = np.clip(records["time"][selected], start, end)
+		home = (records["kind"][selected] == KIND_HOME).astype(np.float64)
+		order = np.lexsort((times, devices))
+		return devices[order], times[order], home[order]
+
+	def _home_time(self, start: float, end: float, device_ids: list[int], edges: NDArray[np.float64]) -> NDArray[np.float64]:
+		"""Seconds each device was home between `start` and every edge, one row per device"""
+		np = _numpy()
+		devices, times, home = self._states(start, end, device_ids)
+		result = np.zeros((len(device_ids), len(edges)))
+		if len(times) == 0:
+			return result
+
+		# every state holds until the next record of the same device, or until `end`
+		last = np.append(devices[1:] != devices[:-1], True)
+		next_times = np.append(times[1:], end)
+		next_times[last] = end
+		home_seconds = home * (next_times - times)
+		before = np.cumsum(home_seconds) - home_seconds
+		first = np.concatenate(([True], devices[1:] != devices[:-1]))
+		base = np.zeros(len(device_ids))
+		base[devices[first]] = before[first]
+
+		# one sorted key over all devices, so every edge of every device is found
+		# with a single searchsorted
+		span = end - start + 1
+		keys = devices * span + (times - start)
+		clipped_edges = np.clip(edges, start, end)
+		queries = np.arange(len(device_ids))[:, None] * span + (clipped_edges - start)[None, :]
+		found = np.searchsorted(keys, queries.ravel(), side="right") - 1
+		found = found.reshape(queries.shape)
+		valid = (found >= 0) & (devices[np.maximum(found, 0)] == np.arange(len(device_ids))[:, None])
+		found = np.maximum(found, 0)
+		partial = home[found] * (clipped_edges[None, :] - times[found])
+		result = np.where(valid, before[found] - base[:, None] + partial, 0.0)
+		return result
+
+	def dwell_time(self, address: str, start: float, end: float) -> float:
+		"""Seconds the device was home between `start` and `end`"""
+		device_id = self.device_ids().get(address)
+		if device_id is None:
+			return 0.0
+		np = _numpy()
+		home_time = self._home_time(start, end, [device_id], np.array([start, end], dtype=np.float64))
+		return float(home_time[0, 1] - home_time[0, 0])
+
+	def transitions(self, address: str, start: float, end: float) -> list[tuple[float, HomeState]]:
+		device_id = self.device_ids().get(address)
+		if device_id is None:
+			return []
+		records = self.records(start, end, states_only=True)
+		records = records[records["device"] == device_id]
+		np = _numpy()
+		kinds = records["kind"]
+		changed = np.concatenate(([True], kinds[1:] != kinds[:-1]))
+		changes = records[changed & (records["time"] >= start)]
+		return [
+			(float(at), HomeState.home if kind == KIND_HOME else HomeState.not_home)
+			for at, kind in zip(changes["time"], changes["kind"])
+		]
+
+	def hourly_occupancy(self, start: float, end: float, addresses: list[str] | None = None) -> HourlyOccupancy:
+		ids = self.device_ids()
+		if addresses is None:
+			addresses = list(ids)
+		addresses = [address for address in addresses if address in ids]
+		np = _numpy()
+		first_hour = start // 3600 * 3600
+		edges = np.arange(first_hour, end + 3600, 3600, dtype=np.float64)
+		if len(edges) < 2:
+			edges = np.array([first_hour, first_hour + 3600], dtype=np.float64)
+		home_time = self._home_time(start, end, [ids[address] for address in addresses], edges)
+		return HourlyOccupancy(addresses, edges[:-1], np.diff(home_time, axis=1) / 3600)
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Query the presence history")
+	parser.add_argument("directory")
+	parser.add_argument("query", choices=["dwell", "transitions", "occupancy"])
+	parser.add_argument("address", nargs="?")
+	parser.add_argument("--days", type=float, default=1)
+	args = parser.parse_args()
+
+	reader = HistoryReader(args.directory)
+	end = time.time()
+	start = end - args.days * SEGMENT_SECONDS
+	if args.query == "occupancy":
+		occupancy = reader.hourly_occupancy(start, end, [args.address] if args.address else None)
+		for address, row in zip(occupancy.addresses, occupancy.matrix):
+			print(address, " ".join(f"{value:.2f}" for value in row))
+		return
+	if args.address is None:
+		parser.error(f"{args.query} needs an address")
+	if args.query == "dwell":
+		print(f"{reader.dwell_time(args.address, start, end) / 3600:.2f} hours home")
+	else:
+		for at, state in reader.transitions(args.address, start, end):
+			print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(at)), state.value)
+
+if __name__ == "__main__":
+	main()
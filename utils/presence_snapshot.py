@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import sqlite3
+from typing import Iterable, NamedTuple
+
+logger = logging.getLogger("utils.presence_snapshot")
+
+# Changes are written together this many seconds after the first one
+FLUSH_DELAY = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+	address TEXT PRIMARY KEY,
+	state TEXT,
+	last_seen REAL,
+	rssi INTEGER,
+	name TEXT,
+	next_check REAL
+) WITHOUT ROWID
+"""
+
+class SnapshotEntry(NamedTuple):
+	address: str
+	state: str | None
+	# wall-clock times, so they stay meaningful across restarts
+	last_seen: float | None
+	rssi: int | None
+	name: str | None
+	next_check: float | None
+
+class PresenceSnapshot:
+	"""
+	Last state, last-seen time, RSSI, learned name and next scheduled check of
+	every device in a SQLite database, restored on startup. Changes are collected
+	per device and column and written as upserts of the changed columns only, in
+	one transaction at most every FLUSH_DELAY seconds.
+	"""
+	def __init__(self, path: str):
+		self.path = path
+		self._db = sqlite3.connect(path)
+		self._db.execute("PRAGMA journal_mode=WAL")
+		self._db.execute("PRAGMA synchronous=NORMAL")
+		self._db.execute(_SCHEMA)
+		self._dirty: dict[str, dict[str, object]] = {}
+		self._flush_handle: asyncio.TimerHandle | None = None
+		self.written = 0
+
+	def load(self) -> dict[str, SnapshotEntry]:
+		rows = self._db.execute(
+			"SELECT address, state, last_seen, rssi, name, next_check FROM devices"
+		).fetchall()
+		return {row[0]: SnapshotEntry(*row) for row in rows}
+
+	def record_state(self, address: str, state: str) -> None:
+		self._update(address, state=state)
+
+	def record_sighting(self, address: str, rssi: int, seen_at: float) -> None:
+		self._update(address, last_seen=seen_at, rssi=rssi)
+
+	def record_name(self, address: str, name: str | None) -> None:
+		self._update(address, name=name)
+
+	def record_next_check(self, address: str, next_check: float) -> None:
+		self._update(address, next_check=next_check)
+
+	def remove(self, addresses: Iterable[str]) -> None:
+		addresses = list(addresses)
+		for address in addresses:
+			self._dirty.pop(address, None)
+		with self._db:
+			self._db.executemany("DELETE FROM devices WHERE address = ?", [(address,) for address in addresses])
+
+	def _update(self, address: str, **columns: object) -> None:
+		self._dirty.setdefault(address, {}).update(columns)
+		if self._flush_handle is not None:
+			return
+		try:
+			loop = asyncio.get_running_loop()
+		except RuntimeError:
+			self.flush()
+			return
+		self._flush_handle = loop.call_later(FLUSH_DELAY, self.flush)
+
+	def flush(self) -> None:
+		if self._flush_handle is not None:
+			self._flush_handle.cancel()
+			self._flush_handle = None
+		if not self._dirty:
+			return
+		dirty = self._dirty
+		self._dirty = {}
+
+		# one statement per set of changed columns
+		batches: dict[tuple[str, ...], list[tuple[object, ...]]] = {}
+		for address, columns in dirty.items():
+			names = tuple(sorted(columns))
+			batches.setdefault(names, []).append((address, *(columns[name] for name in names)))
+		try:
+			with self._db:
+				for names, rows in batches.items():
+					self._db.executemany(
+						f"INSERT INTO devices (address, {', '.join(names)}) "
+						f"VALUES (?{', ?' * len(names)}) "
+						f"ON CONFLICT(address) DO UPDATE SET "
+						f"{', '.join(f'{name} = excluded.{name}' for name in names)}",
+						rows,
+					)
+			self.written += len(dirty)
+		except sqlite3.Error as e:
+			logger.error("Failed to write the presence snapshot: %s", e)
+
+	def close(self) -> None:
+		self.flush()
+		self._db.close()
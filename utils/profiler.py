@@ -0,0 +1,231 @@
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, cast
+
+logger = logging.getLogger("utils.profiler")
+
+MODES = ("cprofile", "sampling")
+# Sampling profiler interval, in seconds
+SAMPLE_INTERVAL = 0.005
+# Entries kept in the hotspot and allocation lists
+TOP_ENTRIES = 25
+MAX_SECONDS = 600
+
+ProfileResult = dict[str, Any]
+
+def _function_name(filename: str, line: int, name: str) -> str:
+	return f"{filename}:{line}({name})"
+
+class StackSampler:
+	"""
+	Samples the stack of one thread from a background thread every `interval`
+	seconds. Cheaper than cProfile, which traces every call, at the cost of
+	statistical counts instead of exact ones.
+	"""
+	def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+		self.thread_id = thread_id
+		self.interval = interval
+		self.samples = 0
+		# function -> samples with the function on top of the stack / anywhere on the stack
+		self._own: dict[str, int] = {}
+		self._total: dict[str, int] = {}
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+	def start(self) -> None:
+		self._thread.start()
+
+	def stop(self) -> None:
+		self._stop.set()
+		self._thread.join()
+
+	def _run(self) -> None:
+		while not self._stop.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)  # pyright: ignore[reportPrivateUsage]
+			if frame is None:
+				continue
+			self.samples += 1
+			seen: set[str] = set()
+			top = True
+			while frame is not None:
+				code = frame.f_code
+				function = _function_name(code.co_filename, code.co_firstlineno, code.co_name)
+				if top:
+					self._own[function] = self._own.get(function, 0) + 1
+					top = False
+				if function not in seen:
+					seen.add(function)
+					self._total[function] = self._total.get(function, 0) + 1
+				frame = frame.f_back
+
+	def hotspots(self, limit: int = TOP_ENTRIES) -> list[dict[str, Any]]:
+		samples = max(self.samples, 1)
+		ordered = sorted(self._own.items(), key=lambda item: item[1], reverse=True)[:limit]
+		return [
+			{
+				"function": function,
+				"own_samples": own,
+				"own_percent": round(own / samples * 100, 2),
+				"total_percent": round(self._total[function] / samples * 100, 2),
+			}
+			for function, own in ordered
+		]
+
+class ProfileSession:
+	"""
+	A time-boxed profile of the event loop thread, with cProfile or the stack
+	sampler, and a tracemalloc comparison between the start and the end. Nothing
+	is installed before `start`, and everything is removed again by `finish`.
+	"""
+	def __init__(self, mode: str, seconds: float, output_dir: str):
+		if mode not in MODES:
+			raise ValueError(f"Unknown profile mode {mode}, expected one of {', '.join(MODES)}")
+		if not 0 < seconds <= MAX_SECONDS:
+			raise ValueError(f"Profile duration must be between 0 and {MAX_SECONDS} seconds")
+		self.mode = mode
+		self.seconds = seconds
+		self.output_dir = output_dir
+		self.started_at = 0.0
+		self._profile: cProfile.Profile | None = None
+		self._sampler: StackSampler | None = None
+		self._started_tracemalloc = False
+		self._start_snapshot: tracemalloc.Snapshot | None = None
+
+	def start(self) -> None:
+		"""Must be called on the thread to profile"""
+		self.started_at = time.time()
+		if not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self._started_tracemalloc = True
+		try:
+			self._start_snapshot = tracemalloc.take_snapshot()
+			if self.mode == "cprofile":
+				profile = cProfile.Profile()
+				# raises while another profiler is active
+				profile.enable()
+				self._profile = profile
+			else:
+				sampler = StackSampler(threading.get_ident())
+				sampler.start()
+				self._sampler = sampler
+		except BaseException:
+			# nothing may stay installed when the profile does not start
+			self._stop_tracemalloc()
+			self._start_snapshot = None
+			raise
+
+	def finish(self) -> tuple[ProfileResult, str]:
+		"""Stop profiling, write the results to `output_dir` and return them with the file path"""
+		elapsed = time.time() - self.started_at
+		result: ProfileResult = {
+			"mode": self.mode,
+			"started_at": self.started_at,
+			"seconds": round(elapsed, 3),
+			"pid": os.getpid(),
+		}
+		stem = os.path.join(self.output_dir, time.strftime("profile-%Y%m%d-%H%M%S", time.localtime(self.started_at)))
+		os.makedirs(self.output_dir, exist_ok=True)
+
+		if self._profile is not None:
+			self._profile.disable()
+			stats = pstats.Stats(self._profile)
+			# the raw stats open in snakeviz or `python -m pstats`
+			stats.dump_stats(f"{stem}.pstats")
+			result["hotspots"] = self._cprofile_hotspots(stats)
+			self._profile = None
+		if self._sampler is not None:
+			self._sampler.stop()
+			result["samples"] = self._sampler.samples
+			result["hotspots"] = self._sampler.hotspots()
+			self._sampler = None
+
+		end_snapshot = tracemalloc.take_snapshot()
+		traced, peak = tracemalloc.get_traced_memory()
+		self._stop_tracemalloc()
+		result["traced_memory"] = {"current": traced, "peak": peak}
+		result["allocations"] = self._allocation_growth(end_snapshot)
+		self._start_snapshot = None
+		with open(f"{stem}.json", "w", encoding="utf-8") as f:
+			json.dump(result, f, indent=2)
+		return result, f"{stem}.json"
+
+	def _stop_tracemalloc(self) -> None:
+		if self._started_tracemalloc:
+			tracemalloc.stop()
+			self._started_tracemalloc = False
+
+	def _cprofile_hotspots(self, stats: pstats.Stats) -> list[dict[str, Any]]:
+		# pstats keeps the raw table undeclared: function -> (primitive calls, calls, own, cumulative, callers)
+		entries = cast(
+			dict[tuple[str, int, str], tuple[int, int, float, float, Any]],
+			stats.stats,  # pyright: ignore[reportAttributeAccessIssue, reportUnknownMemberType]
+		)
+		ordered = sorted(entries.items(), key=lambda item: item[1][2], reverse=True)[:TOP_ENTRIES]
+		return [
+			{
+				"function": _function_name(*function),
+				"calls": calls,
+				"own_seconds": round(own_time, 6),
+				"cumulative_seconds": round(cumulative_time, 6),
+			}
+			for function, (_, calls, own_time, cumulative_time, _) in ordered
+		]
+
+	def _allocation_growth(self, end_snapshot: tracemalloc.Snapshot) -> list[dict[str, Any]]:
+		if self._start_snapshot is None:
+			return []
+		# allocations of the profiling itself are not interesting
+		ignored = [
+			tracemalloc.Filter(False, path)
+			for path in (tracemalloc.__file__, cProfile.__file__, pstats.__file__, __file__, "<frozen importlib._bootstrap*>")
+		]
+		differences = end_snapshot.filter_traces(ignored).compare_to(self._start_snapshot.filter_traces(ignored), "lineno")
+		return [
+			{
+				"site": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+				"size_diff": difference.size_diff,
+				"count_diff": difference.count_diff,
+				"size": difference.size,
+			}
+			for difference in differences[:TOP_ENTRIES]
+		]
+
+_session: ProfileSession | None = None
+
+def start_profile(
+	loop: asyncio.AbstractEventLoop,
+	mode: str,
+	seconds: float,
+	output_dir: str,
+	on_result: Callable[[ProfileResult, str], None],
+) -> bool:
+	"""
+	Profile the loop thread for `seconds`, then pass the results and the file they
+	were written to to `on_result`. Returns False if a profile is already running.
+	"""
+	global _session
+	if _session is not None:
+		return False
+	session = ProfileSession(mode, seconds, output_dir)
+	session.start()
+	_session = session
+
+	def finish() -> None:
+		global _session
+		_session = None
+		try:
+			result, path = session.finish()
+			on_result(result, path)
+		except Exception as e:
+			logger.error("Error finishing the profile: %s", e)
+
+	loop.call_later(seconds, finish)
+	return True
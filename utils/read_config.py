@@ -3,9 +3,11 @@ import logging
 
 logger = logging.getLogger("utils.read_config")
 
-def read_config():
+CONFIG_PATH = "config.json"
+
+def read_config(path: str = CONFIG_PATH):
 	try:
-		with open("config.json", "r", encoding="utf-8") as f:
+		with open(path, "r", encoding="utf-8") as f:
 			config = json.load(f)
 			# delte mqtt_password from config
 			sanitized_config = config.copy()
@@ -0,0 +1,185 @@
+import array
+from typing import Iterable
+
+# Device slots are allocated in blocks so the arrays rarely grow
+BLOCK_SIZE = 256
+EMA_WEIGHT = 0.3
+RSSI_MIN = -128
+RSSI_MAX = 127
+
+
+class RssiHistory:
+	"""
+	The last `size` RSSI samples and their timestamps per device, kept in flat
+	preallocated arrays instead of per-sample objects: one ring of `size` entries
+	per device slot, one byte per RSSI and eight per timestamp. 10,000 devices
+	with 16 samples each take about 1.5 MB.
+	"""
+
+	def __init__(self, size: int = 16, ema_weight: float = EMA_WEIGHT):
+		if not 0 < size < 65536:
+			raise ValueError("RSSI history size must be between 1 and 65535")
+		self.size = size
+		self.ema_weight = ema_weight
+		self._slots: dict[str, int] = {}
+		self._free: list[int] = []
+		self._capacity = 0
+		self._rssi = array.array("b")
+		self._times = array.array("d")
+		# ring position of the next sample and number of valid samples per slot
+		self._next = array.array("H")
+		self._count = array.array("H")
+		self._ema = array.array("d")
+
+	def track(self, addresses: Iterable[str]) -> None:
+		for address in addresses:
+			if address in self._slots:
+				continue
+			if not self._free:
+				self._grow()
+			slot = self._free.pop()
+			self._next[slot] = 0
+			self._count[slot] = 0
+			self._slots[address] = slot
+
+	def untrack(self, addresses: Iterable[str]) -> None:
+		for address in addresses:
+			slot = self._slots.pop(address, None)
+			if slot is not None:
+				self._free.append(slot)
+
+	def __contains__(self, address: str) -> bool:
+		return address in self._slots
+
+	def __len__(self) -> int:
+		return len(self._slots)
+
+	def add(self, address: str, rssi: int, now: float) -> float | None:
+		"""Store a sample, returning the updated EMA, or None for untracked devices"""
+		slot = self._slots.get(address)
+		if slot is None:
+			return None
+		position = self._next[slot]
+		index = slot * self.size + position
+		self._rssi[index] = max(RSSI_MIN, min(RSSI_MAX, rssi))
+		self._times[index] = now
+		self._next[slot] = (position + 1) % self.size
+		count = self._count[slot]
+		if count == 0:
+			ema = float(rssi)
+		else:
+			ema = self._ema[slot] + self.ema_weight * (rssi - self._ema[slot])
+		self._ema[slot] = ema
+		if count < self.size:
+			self._count[slot] = count + 1
+		return ema
+
+	def add_smoothed(self, address: str, rssi: int, ema: float, now: float) -> None:
+		"""Store a sample whose EMA was computed elsewhere, e.g. by the presence worker of the pipeline mode"""
+		if self.add(address, rssi, now) is not None:
+			self._ema[self._slots[address]] = ema
+
+	def ema(self, address: str) -> float | None:
+		slot = self._slots.get(address)
+		if slot is None or self._count[slot] == 0:
+			return None
+		return self._ema[slot]
+
+	def samples(self, address: str) -> list[tuple[float, int]]:
+		"""(timestamp, rssi) pairs of a device, oldest first"""
+		slot = self._slots.get(address)
+		if slot is None:
+			return []
+		start = slot * self.size
+		count = self._count[slot]
+		first = (self._next[slot] - count) % self.size
+		return [
+			(self._times[start + (first + i) % self.size], self._rssi[start + (first + i) % self.size])
+			for i in range(count)
+		]
+
+	def _grow(self) -> None:
+		new_capacity = self._capacity + BLOCK_SIZE
+		for values, length in (
+			(self._rssi, BLOCK_SIZE * self.size),
+			(self._times, BLOCK_SIZE * self.size),
+			(self._next, BLOCK_SIZE),
+			(self._count, BLOCK_SIZE),
+			(self._ema, BLOCK_SIZE),
+		):
+			values.frombytes(bytes(length * values.itemsize))
+		# hand out the lowest slots first
+		self._free.extend(range(new_capacity - 1, self._capacity - 1, -1))
+		self._capacity = new_capacity
+
+
+class PresenceFilter:
+	"""
+	Enter/exit hysteresis on top of an RssiHistory. A sighting only counts while
+	the smoothed RSSI is at least `enter_rssi`, or `exit_rssi` once the device is
+	home; an unset threshold lets every sighting count. The reported state only changes after `enter_scans` consecutive
+	scans that found the device or `exit_scans` consecutive scans that missed it.
+	"""
+
+	def __init__(
+		self,
+		history: RssiHistory,
+		enter_rssi: int | None = None,
+		exit_rssi: int | None = None,
+		enter_scans: int = 1,
+		exit_scans: int = 1,
+	):
+		self.history = history
+		self.enter_rssi = enter_rssi
+		self.exit_rssi = enter_rssi if exit_rssi is None else exit_rssi
+		self.enter_scans = max(1, enter_scans)
+		self.exit_scans = max(1, exit_scans)
+		self._reported: dict[str, bool] = {}
+		# consecutive scan results that disagree with the reported state
+		self._streak: dict[str, int] = {}
+
+	def track(self, addresses: Iterable[str]) -> None:
+		self.history.track(addresses)
+
+	def untrack(self, addresses: Iterable[str]) -> None:
+		addresses = list(addresses)
+		self.history.untrack(addresses)
+		for address in addresses:
+			self._reported.pop(address, None)
+			self._streak.pop(address, None)
+
+	def reported(self, address: str) -> bool | None:
+		return self._reported.get(address)
+
+	def set_reported(self, address: str, present: bool) -> None:
+		"""Set the reported state of a device that is not decided by scan results"""
+		self._reported[address] = present
+		self._streak.pop(address, None)
+
+	def pending(self, address: str) -> bool:
+		"""Whether the device is on its way to a state change"""
+		return self._streak.get(address, 0) > 0
+
+	def sighting(self, address: str, rssi: int, now: float) -> bool:
+		"""Record a sighting. Returns whether it is strong enough to count as seen."""
+		ema = self.history.add(address, rssi, now)
+		if ema is None:
+			return False
+		threshold = self.exit_rssi if self._reported.get(address) else self.enter_rssi
+		return threshold is None or ema >= threshold
+
+	def scan_result(self, address: str, found: bool) -> bool:
+		"""Record whether a scan found the device. Returns the state to report."""
+		reported = self._reported.get(address)
+		if reported is None or reported == found:
+			# the first result is reported as is
+			self._reported[address] = found
+			self._streak.pop(address, None)
+			return found
+		streak = self._streak.get(address, 0) + 1
+		if streak >= (self.enter_scans if found else self.exit_scans):
+			self._reported[address] = found
+			self._streak.pop(address, None)
+			return found
+		self._streak[address] = streak
+		return reported
@@ -2,101 +2,519 @@ import asyncio
 import logging
 import pprint
 import time
-from dataclasses import dataclass
-from typing import Any, Optional
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
 
-from bleak import BleakScanner
-from bleak.args.bluez import BlueZDiscoveryFilters
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
-from components.device_tracker import sendDeviceHomeEvent, sendDeviceNotHomeEvent
-from config import Config
+from components.device_tracker import (
+    get_state_cache,
+    log_publish_stats,
+    refresh_device_states,
+    sendDeviceHomeEvent,
+    sendDeviceNotHomeEvent,
+)
+from config import Config, Device
 from mqtt.send_event import DeviceStatusUpdateData
+from mqtt.types import HomeState
+from utils.adaptive_schedule import AdaptiveSchedule
+from utils.advertisement_recording import AdvertisementRecorder
+from utils import irk_resolver
+from utils.irk_resolver import IrkResolver, is_resolvable_private_address
+from utils.last_seen import LastSeenTable
+from utils.presence_snapshot import PresenceSnapshot, SnapshotEntry
+from utils.rssi_history import PresenceFilter, RssiHistory
+from utils.metrics import (
+    detection_callback_duration,
+    detection_latency,
+    scan_duty_cycle,
+    scanner_start_duration,
+    scanner_stop_duration,
+)
+from utils.scan_scheduler import ScanPriority, ScanRequest, scan_scheduler
+from utils.scanner_backend import BleakScannerBackend, ScannerBackend, ScannerBackendFactory
+from utils.sighting_pipeline import PipelineEvent, SightingPipeline, WorkerSettings, set_active_pipeline
 
 logger = logging.getLogger("scan")
 
-scanning_filters: BlueZDiscoveryFilters = {
-    "Transport": "le",
-    "DuplicateData": False,
-    # "RSSI": -90
-}
+# Shortest scan timeout the adaptive schedule gives a device
+MIN_ADAPTIVE_SCAN_TIMEOUT = 2
+# New private addresses seen within this many seconds are resolved in one batch
+RESOLVE_BATCH_DELAY = 0.05
+# How often the pipeline scan loop checks the worker and logs its counters, in seconds
+PIPELINE_CHECK_INTERVAL = 5.0
+PIPELINE_STATS_INTERVAL = 60.0
 
 @dataclass
 class ScanContext:
     not_found_devices: set[str]
-    stop_event: asyncio.Event
+    started_at: float
+    # per-device time after which a device that was not found is reported not_home
+    deadlines: dict[str, float] = field(default_factory=lambda: {})
+    # when each device was added to the scan
+    requested_at: dict[str, float] = field(default_factory=lambda: {})
+    # highest priority of the requests served, only requests of this priority join the scan
+    priority: ScanPriority = ScanPriority.automatic
+
+
+    def add_requests(self, requests: list[ScanRequest], now: float) -> None:
+        for request in requests:
+            self.priority = max(self.priority, request.priority)
+            deadline = now + request.timeout
+            if request.address in self.not_found_devices:
+                self.deadlines[request.address] = max(self.deadlines[request.address], deadline)
+            else:
+                self.not_found_devices.add(request.address)
+                self.deadlines[request.address] = deadline
+                self.requested_at[request.address] = now
+
+    def remove_devices(self, addresses: list[str]) -> None:
+        for address in addresses:
+            self.not_found_devices.discard(address)
+
+    def preempt(self, manual: list[ScanRequest]) -> list[ScanRequest]:
+        """
+        Drop the targets that are not found yet and not in `manual`, returning them
+        as automatic requests with their original timeout, to be scanned later.
+        """
+        keep = {request.address for request in manual}
+        preempted = [
+            ScanRequest(address, self.deadlines[address] - self.requested_at[address], ScanPriority.automatic)
+            for address in sorted(self.not_found_devices - keep)
+        ]
+        for request in preempted:
+            self.not_found_devices.remove(request.address)
+        return preempted
+
+    def pop_expired(self, now: float) -> list[str]:
+        expired = [
+            address for address in self.not_found_devices if self.deadlines[address] <= now
+        ]
+        for address in expired:
+            self.not_found_devices.remove(address)
+        return sorted(expired)
+
+    def next_deadline(self) -> float | None:
+        if not self.not_found_devices:
+            return None
+        return min(self.deadlines[address] for address in self.not_found_devices)
 
 
 class BluetoothScanner:
-    is_scanning: bool = False
-    @staticmethod
-    def start_scanning() -> None:
-        BluetoothScanner.is_scanning = True
-    @staticmethod
-    def stop_scanning() -> None:
-        BluetoothScanner.is_scanning = False
-    
-    def __init__(self):
+    def __init__(
+        self,
+        backend_factory: ScannerBackendFactory = BleakScannerBackend,
+        snapshot: Optional[PresenceSnapshot] = None,
+        restored: Optional[dict[str, SnapshotEntry]] = None,
+    ):
+        config = Config.get_instance()
         self._scanner_kwargs: dict[str, Any] = {}
-        self._scanner: BleakScanner = BleakScanner(detection_callback=self._on_device_found, scanning_filters=scanning_filters, scanning_mode="active")
+        adapters: list[str | None] = list(config.adapters) or [None]
+        # one scanner per adapter, all feeding the same detection callback
+        self._backends: list[ScannerBackend] = [
+            backend_factory(adapter, self._on_device_found) for adapter in adapters
+        ]
+        self._backend_indexes = {backend: index for index, backend in enumerate(self._backends)}
         self._current_scan: Optional[ScanContext] = None
+        self._last_seen: Optional[LastSeenTable] = None
+        self._pipeline: Optional[SightingPipeline] = None
+        self._schedule: Optional[AdaptiveSchedule] = None
+        # RSSI history and enter/exit hysteresis of the tracked devices
+        self._presence = PresenceFilter(
+            RssiHistory(config.rssi_history_size),
+            enter_rssi=config.presence_enter_rssi,
+            exit_rssi=config.presence_exit_rssi,
+            enter_scans=config.presence_enter_scans,
+            exit_scans=config.presence_exit_scans,
+        )
+        self._presence.track(config.devices.get_addresses())
+        self._snapshot = snapshot
+        self._sighting_listeners: list[Callable[[str, int, float], None]] = []
+        # saved states and deadlines the scan loops resume from
+        self._restored: dict[str, SnapshotEntry] = {
+            address: entry for address, entry in (restored or {}).items() if address in config.devices
+        }
+        for address, entry in self._restored.items():
+            if entry.state is not None:
+                self._presence.set_reported(address, entry.state == HomeState.home)
+        self._resolver: Optional[IrkResolver] = None
+        # latest sighting of every private address waiting for the next resolution batch
+        self._deferred: dict[str, tuple[BLEDevice, AdvertisementData, ScannerBackend]] = {}
+        self._irks: dict[str, bytes] = {}
+        self._update_resolver()
         self._lock: Optional[asyncio.Lock] = None
+        self._recorder: Optional[AdvertisementRecorder] = None
+        if config.record_advertisements is not None:
+            logger.info("Recording advertisements to %s", config.record_advertisements)
+            self._recorder = AdvertisementRecorder(config.record_advertisements)
+
+    def close(self) -> None:
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
+    @property
+    def backends(self) -> list[ScannerBackend]:
+        return self._backends
+
+    @property
+    def presence(self) -> PresenceFilter:
+        return self._presence
+
+    def update_devices(self, added: list[str], removed: list[str]) -> None:
+        """Follow devices added to or removed from the config without stopping the scanner"""
+        config = Config.get_instance()
+        now = time.monotonic()
+        self._presence.untrack(removed)
+        self._presence.track(added)
+        if self._schedule is not None:
+            self._schedule.untrack(removed)
+            self._schedule.track(added, now)
+        if self._last_seen is not None:
+            self._last_seen.untrack(removed)
+            self._last_seen.track(added, now)
+        if self._pipeline is not None:
+            self._pipeline.untrack(removed)
+            self._pipeline.track(added)
+        if self._current_scan is not None:
+            self._current_scan.remove_devices(removed)
+        if self._snapshot is not None:
+            self._snapshot.remove(removed)
+        if config.devices.get_irks() != self._irks:
+            self._update_resolver()
+        if added and not config.continuous_scan and self._schedule is None:
+            # report the new devices right away instead of at the next automatic scan
+            scan_scheduler.request(added, config.automatic_scan_timeout, ScanPriority.automatic)
+        else:
+            # new devices are due in the adaptive schedule
+            scan_scheduler.wakeup()
+
+    def _update_resolver(self) -> None:
+        config = Config.get_instance()
+        irks = config.devices.get_irks()
+        self._irks = irks
+        self._resolver = None
+        if irks and irk_resolver.is_available():
+            self._resolver = IrkResolver(irks, config.irk_cache_size)
+        elif irks:
+            logger.warning(
+                "IRKs are configured but the cryptography package is not installed; private addresses are not resolved"
+            )
 
     async def scan_loop(self, shutdown_event: asyncio.Event) -> None:
+        config = Config.get_instance()
+        if config.continuous_scan:
+            await self.continuous_scan_loop(shutdown_event)
+            return
+
+        if config.pipeline:
+            logger.warning("The pipeline mode only applies to continuous scanning, deciding presence in this process")
         logger.info("Starting scan loop")
+        scan_scheduler.bind(asyncio.get_running_loop())
+        shutdown_watcher = asyncio.create_task(self._wake_on_shutdown(shutdown_event))
+
+        # automatic_scan of 0 disables automatic scans
+        automatic = config.automatic_scan > 0
+        next_automatic_scan = time.monotonic() + config.automatic_scan
+        if automatic and config.adaptive_scan:
+            self._schedule = AdaptiveSchedule(
+                base_interval=config.automatic_scan,
+                min_interval=config.adaptive_min_interval,
+                max_interval=config.adaptive_max_interval,
+                min_timeout=MIN_ADAPTIVE_SCAN_TIMEOUT,
+                max_timeout=config.automatic_scan_timeout,
+            )
+            self._schedule.track(config.devices.get_addresses(), time.monotonic())
+            self._resume_schedule(self._schedule)
         try:
-            # Check if automatic_scan exists and is greater than 0
-            config = Config.get_instance()
-            last_scan_time = time.time()
             while not shutdown_event.is_set():
-                if self.is_scanning:
-                    logger.info("Manual scan started")
-                    last_scan_time = time.time()
-                    await self.scan_devices(config.devices.get_addresses(), config.scan_timeout)
-                elif time.time() - last_scan_time > config.automatic_scan:
-                    logger.info("Automatic scan started")
-                    last_scan_time = time.time()
-                    await self.scan_devices(config.devices.get_addresses(), 10)
-                # wait 2 seonds
-                await asyncio.sleep(2)
-                
+                now = time.monotonic()
+                if self._schedule is not None:
+                    due = self._schedule.pop_due(now)
+                    if due:
+                        logger.info("Adaptive scan requested for %d devices", len(due))
+                        scan_scheduler.submit(
+                            ScanRequest(address, timeout, ScanPriority.automatic)
+                            for address, timeout in due
+                        )
+                elif automatic and now >= next_automatic_scan:
+                    logger.info("Automatic scan requested")
+                    next_automatic_scan = now + config.automatic_scan
+                    scan_scheduler.request(
+                        config.devices.get_addresses(),
+                        config.automatic_scan_timeout,
+                        ScanPriority.automatic,
+                    )
+                requests = scan_scheduler.take()
+                if requests:
+                    await self.scan_requests(requests)
+                refresh_device_states()
+
+                # sleep until the next deadline; button presses and shutdown wake the loop
+                if self._schedule is not None:
+                    next_scan = self._schedule.next_deadline()
+                else:
+                    next_scan = next_automatic_scan if automatic else None
+                deadlines = [
+                    deadline
+                    for deadline in (next_scan, get_state_cache().next_refresh_time())
+                    if deadline is not None
+                ]
+                wait_time = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+                # targets preempted by a manual request are back in the queue, and
+                # the wakeup they set was consumed by the manual scan
+                if scan_scheduler.has_pending():
+                    wait_time = 0
+                await scan_scheduler.wait(wait_time)
+
         except Exception as e:
             logger.error("Error in scan loop: %s", e)
+        finally:
+            shutdown_watcher.cancel()
+            self._schedule = None
+
+    def _resume_schedule(self, schedule: AdaptiveSchedule) -> None:
+        now = time.monotonic()
+        wall_now = time.time()
+        for address, entry in self._restored.items():
+            if entry.next_check is not None:
+                present = None if entry.state is None else entry.state == HomeState.home
+                schedule.restore(address, present, now + max(entry.next_check - wall_now, 0))
+        self._restored = {}
+
+    def _resume_last_seen(self, last_seen: LastSeenTable) -> None:
+        now = time.monotonic()
+        wall_now = time.time()
+        last_seen.restore([
+            (
+                address,
+                now - max(wall_now - entry.last_seen, 0),
+                entry.rssi,
+                None if entry.state is None else entry.state == HomeState.home,
+            )
+            for address, entry in self._restored.items()
+            if entry.last_seen is not None
+        ])
+        self._restored = {}
+
+    async def _wake_on_shutdown(self, shutdown_event: asyncio.Event) -> None:
+        await shutdown_event.wait()
+        scan_scheduler.wakeup()
+
+    async def continuous_scan_loop(self, shutdown_event: asyncio.Event) -> None:
+        """
+        Keep the scanner running and derive presence from advertisements:
+        a device is home as soon as it is heard and not_home once it has been
+        silent for `away_timeout` seconds.
+        """
+        config = Config.get_instance()
+        if config.pipeline:
+            await self.pipeline_scan_loop(shutdown_event)
+            return
+        logger.info(
+            "Starting continuous scan loop with away timeout %d seconds",
+            config.away_timeout,
+        )
+        last_seen = LastSeenTable(config.away_timeout)
+        last_seen.track(config.devices.get_addresses(), time.monotonic())
+        self._resume_last_seen(last_seen)
+        self._last_seen = last_seen
+
+        await self._start_scanner()
+        try:
+            while not shutdown_event.is_set():
+                now = time.monotonic()
+                expired = last_seen.pop_expired(now)
+                for address in expired:
+                    logger.info("Device %s not seen for %d seconds", address, config.away_timeout)
+                    self._presence.set_reported(address, False)
+                    sendDeviceNotHomeEvent(address)
+                if expired:
+                    log_publish_stats()
+                refresh_device_states()
+
+                # Manual scans are meaningless while the scanner never stops
+                scan_scheduler.clear()
+
+                deadlines = [
+                    deadline
+                    for deadline in (last_seen.next_deadline(), get_state_cache().next_refresh_time())
+                    if deadline is not None
+                ]
+                wait_time = max(min(deadlines) - now, 0) if deadlines else config.away_timeout
+                try:
+                    await asyncio.wait_for(shutdown_event.wait(), timeout=wait_time)
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            logger.error("Error in continuous scan loop: %s", e)
+        finally:
+            await self._stop_scanner()
+            self._last_seen = None
+
+    async def pipeline_scan_loop(self, shutdown_event: asyncio.Event) -> None:
+        """
+        Continuous scanning with the presence decisions in a worker process: the
+        detection callback only enqueues the tracked sightings, and this loop
+        publishes what the worker decided, refreshes states and keeps the worker
+        running.
+        """
+        config = Config.get_instance()
+        logger.info(
+            "Starting continuous scan loop with a presence worker process and away timeout %d seconds",
+            config.away_timeout,
+        )
+        pipeline = SightingPipeline(config.pipeline_ring_size, self._on_pipeline_events)
+        pipeline.start(asyncio.get_running_loop(), self._worker_settings())
+        self._pipeline = pipeline
+        set_active_pipeline(pipeline)
+
+        await self._start_scanner()
+        try:
+            next_stats = time.monotonic() + PIPELINE_STATS_INTERVAL
+            while not shutdown_event.is_set():
+                now = time.monotonic()
+                if not pipeline.is_alive():
+                    logger.error("Presence worker is not running, restarting it")
+                    pipeline.stop()
+                    pipeline.start(asyncio.get_running_loop(), self._worker_settings())
+                if now >= next_stats:
+                    next_stats = now + PIPELINE_STATS_INTERVAL
+                    stats = pipeline.ring.stats()
+                    logger.info(
+                        "Pipeline: %d sightings enqueued, %d processed, %d dropped, %d decisions, %d waiting",
+                        stats["enqueued"],
+                        stats["processed"],
+                        stats["dropped"],
+                        stats["decisions"],
+                        stats["depth"],
+                    )
+                refresh_device_states()
+
+                # Manual scans are meaningless while the scanner never stops
+                scan_scheduler.clear()
+
+                wait_time = PIPELINE_CHECK_INTERVAL
+                next_refresh = get_state_cache().next_refresh_time()
+                if next_refresh is not None:
+                    wait_time = min(max(next_refresh - now, 0), wait_time)
+                try:
+                    await asyncio.wait_for(shutdown_event.wait(), timeout=wait_time)
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            logger.error("Error in pipeline scan loop: %s", e)
+        finally:
+            await self._stop_scanner()
+            self._pipeline = None
+            set_active_pipeline(None)
+            pipeline.stop()
+
+    def _worker_settings(self) -> WorkerSettings:
+        config = Config.get_instance()
+        now = time.monotonic()
+        wall_now = time.time()
+        restored = [
+            (
+                address,
+                now - max(wall_now - entry.last_seen, 0),
+                entry.rssi,
+                None if entry.state is None else entry.state == HomeState.home,
+            )
+            for address, entry in self._restored.items()
+            if entry.last_seen is not None
+        ]
+        self._restored = {}
+        return WorkerSettings(
+            addresses=config.devices.get_addresses(),
+            adapters=[backend.name for backend in self._backends],
+            away_timeout=config.away_timeout,
+            enter_rssi=config.presence_enter_rssi,
+            exit_rssi=config.presence_exit_rssi,
+            rssi_history_size=config.rssi_history_size,
+            restored=restored,
+            log_level=logging.getLogger().getEffectiveLevel(),
+        )
+
+    def _on_pipeline_events(self, events: list[PipelineEvent]) -> None:
+        devices = Config.get_instance().devices
+        away = False
+        history = self._presence.history
+        for kind, address, rssi, ema, at in events:
+            tracked = devices.get(address)
+            if tracked is None:
+                continue
+            if kind == "sighting" and rssi is not None:
+                if ema is not None:
+                    # the smoothed RSSI read by the device sensors
+                    history.add_smoothed(tracked.address, rssi, ema, at)
+                self._record_sighting(tracked.address, rssi)
+            elif kind == "home":
+                self._presence.set_reported(tracked.address, True)
+                sendDeviceHomeEvent(DeviceStatusUpdateData(address=tracked.address, device=None, found=True))
+            elif kind == "not_home":
+                self._presence.set_reported(tracked.address, False)
+                sendDeviceNotHomeEvent(tracked.address)
+                away = True
+        if away:
+            log_publish_stats()
 
     async def scan_device(self, address: str, timeout: int) -> None:
         await self.scan_devices([address], timeout)
 
     async def scan_devices(self, known_devices: list[str], timeout: int) -> None:
-        logger.info(
-            "Scanning for %d devices with timeout %d seconds",
-            len(known_devices),
-            timeout,
+        await self.scan_requests(
+            [ScanRequest(address, timeout, ScanPriority.manual) for address in known_devices]
         )
 
-        if not known_devices:
+    async def scan_requests(self, requests: list[ScanRequest]) -> None:
+        """
+        Scan until every requested device is found or its own timeout passed.
+        Requests submitted to the scheduler meanwhile join the running scan.
+        """
+        if not requests:
             logger.warning("No devices to scan")
             return
 
+        logger.info(
+            "Scanning for %d devices (%d manual) with timeout up to %d seconds",
+            len(requests),
+            sum(request.priority == ScanPriority.manual for request in requests),
+            max(request.timeout for request in requests),
+        )
+
         lock = self._ensure_lock()
         missing_devices: list[str] = []
 
         async with lock:
-            self._scanner_kwargs["detection_callback"] = self._on_device_found
-            context = ScanContext(
-                not_found_devices=set(known_devices),
-                stop_event=asyncio.Event(),
-            )
+            now = time.monotonic()
+            context = ScanContext(not_found_devices=set(), started_at=now)
+            context.add_requests(requests, now)
             self._current_scan = context
 
             try:
                 logger.info("Starting scanner")
                 await self._start_scanner()
                 logger.info("Scanner started")
-                try:
-                    await asyncio.wait_for(context.stop_event.wait(), timeout=timeout)
-                    logger.info("Stopping scanner after devices were found")
-                except asyncio.TimeoutError:
-                    logger.info("Scan timed out after %d seconds", timeout)
+                while context.not_found_devices:
+                    now = time.monotonic()
+                    for address in context.pop_expired(now):
+                        logger.info("Device %s not found before its scan timeout", address)
+                        self._report_missing(address, now)
+                    merged = scan_scheduler.take(context.priority)
+                    if merged:
+                        if context.priority < ScanPriority.manual and merged[0].priority == ScanPriority.manual:
+                            preempted = context.preempt(merged)
+                            if preempted:
+                                logger.info("Manual scan request preempts %d automatic targets", len(preempted))
+                                scan_scheduler.submit(preempted)
+                        logger.info("Adding %d devices to the running scan", len(merged))
+                        context.add_requests(merged, now)
+                    next_deadline = context.next_deadline()
+                    if next_deadline is None:
+                        break
+                    await scan_scheduler.wait(max(next_deadline - now, 0))
+                logger.info("Stopping scanner after the requested devices were found or timed out")
             except Exception as exc:
                 logger.error("Error during scanning: %s", exc)
             finally:
@@ -104,55 +522,193 @@ class BluetoothScanner:
                 missing_devices = sorted(context.not_found_devices)
                 self._current_scan = None
 
+        now = time.monotonic()
         for address in missing_devices:
+            self._report_missing(address, now)
+        log_publish_stats()
+
+    def _report_missing(self, address: str, now: float) -> None:
+        present = self._presence.scan_result(address, False)
+        self._record_result(address, present, now)
+        if present:
+            logger.info("Device %s missed a scan, keeping it home", address)
+        else:
             sendDeviceNotHomeEvent(address)
 
+    def _record_result(self, address: str, found: bool, now: float, detection_time: float | None = None) -> None:
+        if self._schedule is None:
+            return
+        self._schedule.record_result(
+            address, found, now, detection_time, unconfirmed=self._presence.pending(address)
+        )
+        history = self._schedule.get(address)
+        if self._snapshot is not None and history is not None:
+            self._snapshot.record_next_check(address, time.time() + history.next_check - now)
+
+    def add_sighting_listener(self, listener: Callable[[str, int, float], None]) -> None:
+        """Call `listener` with the address, RSSI and wall-clock time of every counted sighting"""
+        self._sighting_listeners.append(listener)
+
+    def _record_sighting(self, address: str, rssi: int) -> None:
+        if not self._sighting_listeners:
+            return
+        seen_at = time.time()
+        for listener in self._sighting_listeners:
+            listener(address, rssi, seen_at)
+
     def _ensure_lock(self) -> asyncio.Lock:
         if self._lock is None:
             self._lock = asyncio.Lock()
         return self._lock
 
     async def _start_scanner(self) -> None:
-        try:
-            await self._scanner.start()
-        except Exception as exc:
-            logger.error("Error starting scanner: %s", exc)
+        started_at = time.perf_counter()
+        results = await asyncio.gather(
+            *(backend.start() for backend in self._backends), return_exceptions=True
+        )
+        started = 0
+        for backend, result in zip(self._backends, results):
+            if isinstance(result, BaseException):
+                logger.error("Error starting scanner on %s: %s", backend.name, result)
+            else:
+                started += 1
+        if started:
+            scanner_start_duration.observe(time.perf_counter() - started_at)
+            scan_duty_cycle.scanner_started()
 
     async def _stop_scanner(self) -> None:
-        try:
-            logger.info("Stopping scanner")
-            await self._scanner.stop()
-            BluetoothScanner.stop_scanning()
-            logger.info("Scanner stopped")
-        except Exception as exc:
-            logger.error("Error stopping scanner: %s", exc)
+        logger.info("Stopping scanner")
+        scan_duty_cycle.scanner_stopped()
+        started_at = time.perf_counter()
+        results = await asyncio.gather(
+            *(backend.stop() for backend in self._backends), return_exceptions=True
+        )
+        scanner_stop_duration.observe(time.perf_counter() - started_at)
+        for backend, result in zip(self._backends, results):
+            if isinstance(result, BaseException):
+                logger.error("Error stopping scanner on %s: %s", backend.name, result)
+            logger.info(
+                "Adapter %s: %d advertisements, %d tracked sightings",
+                backend.name,
+                backend.stats.advertisements,
+                backend.stats.tracked_sightings,
+            )
+        logger.info("Scanner stopped")
 
     def _on_device_found(
-        self, device: BLEDevice, advertisement_data: AdvertisementData
+        self,
+        device: BLEDevice,
+        advertisement_data: AdvertisementData,
+        source: ScannerBackend,
     ) -> None:
-        if self._current_scan is None:
-            return
+        started_at = time.perf_counter()
+        try:
+            if self._recorder is not None:
+                self._recorder.record(device.address, advertisement_data.rssi, device.name)
+            tracked = self._find_tracked(device, advertisement_data, source)
+            if tracked is not None:
+                source.stats.tracked_sightings += 1
+                self._on_tracked_sighting(tracked, device, advertisement_data, source)
+        finally:
+            detection_callback_duration.observe(time.perf_counter() - started_at)
+
+    def _on_tracked_sighting(
+        self,
+        tracked: Device,
+        device: BLEDevice,
+        advertisement_data: AdvertisementData,
+        source: ScannerBackend,
+    ) -> None:
+        if self._pipeline is not None:
+            # everything else happens in the presence worker
+            self._pipeline.submit(tracked.address, advertisement_data.rssi, self._backend_indexes[source], time.monotonic())
+            if device.name is not None and device.name != tracked.name:
+                Config.set_device_name(tracked.address, device.name)
+        elif self._last_seen is not None:
+            self._on_continuous_sighting(tracked, device, advertisement_data, source, self._last_seen)
+        elif self._current_scan is not None:
+            self._on_scan_sighting(tracked, device, advertisement_data, source, self._current_scan)
 
-        not_found_devices = self._current_scan.not_found_devices
-        stop_event = self._current_scan.stop_event
+    def _find_tracked(
+        self,
+        device: BLEDevice,
+        advertisement_data: AdvertisementData,
+        source: ScannerBackend,
+    ) -> Optional[Device]:
+        # the index lookup tolerates case and separator differences from the config
+        devices = Config.get_instance().devices
+        tracked = devices.get(device.address)
+        if tracked is not None or self._resolver is None:
+            return tracked
+        if not is_resolvable_private_address(device.address):
+            return None
 
-        if device.address not in not_found_devices:
+        known, address = self._resolver.cached(device.address)
+        if known:
+            return None if address is None else devices.get(address)
+        # resolved with the next batch, which replays the latest sighting
+        self._deferred[device.address] = (device, advertisement_data, source)
+        if self._resolver.queue(device.address):
+            asyncio.get_running_loop().call_later(RESOLVE_BATCH_DELAY, self._resolve_deferred)
+        return None
+
+    def _resolve_deferred(self) -> None:
+        deferred = self._deferred
+        self._deferred = {}
+        if self._resolver is None:
+            return
+        try:
+            results = self._resolver.resolve_pending()
+            devices = Config.get_instance().devices
+            for private_address, address in results.items():
+                tracked = None if address is None else devices.get(address)
+                if tracked is None:
+                    continue
+                logger.info("Resolved private address %s to %s", private_address, tracked.address)
+                device, advertisement_data, source = deferred[private_address]
+                source.stats.tracked_sightings += 1
+                self._on_tracked_sighting(tracked, device, advertisement_data, source)
+        except Exception as exc:
+            logger.error("Error resolving private addresses: %s", exc)
+
+    def _on_scan_sighting(
+        self,
+        tracked: Device,
+        device: BLEDevice,
+        advertisement_data: AdvertisementData,
+        source: ScannerBackend,
+        context: ScanContext,
+    ) -> None:
+        not_found_devices = context.not_found_devices
+        now = time.monotonic()
+        counted = self._presence.sighting(tracked.address, advertisement_data.rssi, now)
+        if not counted:
+            return
+        self._record_sighting(tracked.address, advertisement_data.rssi)
+        if tracked.address not in not_found_devices:
             return
 
         try:
             logger.info("Device details: %s, %s", device, advertisement_data)
             if device.name is not None:
-                Config.set_device_name(device.address, device.name)
+                Config.set_device_name(tracked.address, device.name)
 
-            device_data = DeviceStatusUpdateData(
-                address=device.address, device=device, found=True
-            )
-            sendDeviceHomeEvent(device_data)
-            not_found_devices.remove(device.address)
+            not_found_devices.remove(tracked.address)
+            present = self._presence.scan_result(tracked.address, True)
+            if present:
+                device_data = DeviceStatusUpdateData(
+                    address=tracked.address, device=device, found=True
+                )
+                sendDeviceHomeEvent(device_data)
+            else:
+                logger.info("Device %s found, waiting for more scans before reporting it home", tracked.address)
+            detection_time = now - context.requested_at[tracked.address]
+            detection_latency.observe(detection_time)
+            self._record_result(tracked.address, present, now, detection_time)
 
             if not not_found_devices:
                 logger.info("All devices found")
-                stop_event.set()
+                scan_scheduler.wakeup()
                 return
 
             formatted_device = pprint.pformat(device, width=100, depth=3)
@@ -167,3 +723,42 @@ class BluetoothScanner:
                 getattr(device, "address", "unknown"),
                 exc,
             )
+
+    def _on_continuous_sighting(
+        self,
+        tracked: Device,
+        device: BLEDevice,
+        advertisement_data: AdvertisementData,
+        source: ScannerBackend,
+        last_seen: LastSeenTable,
+    ) -> None:
+        try:
+            now = time.monotonic()
+            # sightings too weak to count do not keep the device present
+            if not self._presence.sighting(tracked.address, advertisement_data.rssi, now):
+                return
+            self._record_sighting(tracked.address, advertisement_data.rssi)
+            arrived = last_seen.seen(tracked.address, advertisement_data.rssi, now, source.name)
+            if not arrived:
+                return
+            self._presence.set_reported(tracked.address, True)
+
+            logger.info(
+                "Device %s arrived with RSSI %d on %s",
+                tracked.address,
+                advertisement_data.rssi,
+                source.name,
+            )
+            if device.name is not None:
+                Config.set_device_name(tracked.address, device.name)
+
+            device_data = DeviceStatusUpdateData(
+                address=tracked.address, device=device, found=True
+            )
+            sendDeviceHomeEvent(device_data)
+        except Exception as exc:
+            logger.error(
+                "Error processing device %s: %s",
+                getattr(device, "address", "unknown"),
+                exc,
+            )
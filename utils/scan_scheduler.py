@@ -0,0 +1,101 @@
+import asyncio
+import enum
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Iterable
+
+logger = logging.getLogger("utils.scan_scheduler")
+
+class ScanPriority(enum.IntEnum):
+	automatic = 0
+	manual = 1
+
+@dataclass
+class ScanRequest:
+	address: str
+	timeout: float
+	priority: ScanPriority
+
+class ScanScheduler:
+	"""
+	Pending per-device scan requests. Requests for the same device coalesce into
+	one, keeping the highest priority and the longest timeout. The scanner takes
+	the pending requests of the highest priority when it is idle, or merges them
+	into the running scan. Manual requests are served first: a manual request
+	joining an automatic scan takes it over, and the automatic targets go back to
+	the queue until no manual request is pending.
+	Requests may come from any thread; the scanner side runs on the event loop.
+	"""
+	def __init__(self):
+		self._pending: dict[str, ScanRequest] = {}
+		self._lock = threading.Lock()
+		self._loop: asyncio.AbstractEventLoop | None = None
+		self._wakeup: asyncio.Event | None = None
+
+	def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+		self._loop = loop
+		self._wakeup = asyncio.Event()
+		if self._pending:
+			self._wakeup.set()
+
+	def request(self, addresses: Iterable[str], timeout: float, priority: ScanPriority) -> None:
+		self.submit(ScanRequest(address, timeout, priority) for address in addresses)
+
+	def submit(self, requests: Iterable[ScanRequest]) -> None:
+		with self._lock:
+			for request in requests:
+				pending = self._pending.get(request.address)
+				if pending is None:
+					self._pending[request.address] = request
+					continue
+				pending.timeout = max(pending.timeout, request.timeout)
+				pending.priority = max(pending.priority, request.priority)
+		self.wakeup()
+
+	def take(self, min_priority: ScanPriority = ScanPriority.automatic) -> list[ScanRequest]:
+		"""Take the pending requests of the highest pending priority, if it is at least `min_priority`"""
+		with self._lock:
+			if not self._pending:
+				return []
+			priority = max(request.priority for request in self._pending.values())
+			if priority < min_priority:
+				return []
+			requests = [request for request in self._pending.values() if request.priority == priority]
+			for request in requests:
+				del self._pending[request.address]
+		return requests
+
+	def has_pending(self) -> bool:
+		with self._lock:
+			return bool(self._pending)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._pending.clear()
+
+	def wakeup(self) -> None:
+		"""Wake the scanner, from any thread"""
+		loop = self._loop
+		wakeup = self._wakeup
+		if loop is None or wakeup is None:
+			return
+		try:
+			if loop is asyncio.get_running_loop():
+				wakeup.set()
+				return
+		except RuntimeError:
+			pass
+		loop.call_soon_threadsafe(wakeup.set)
+
+	async def wait(self, timeout: float | None) -> None:
+		"""Wait until woken up or `timeout` seconds passed"""
+		if self._wakeup is None:
+			raise RuntimeError("Scan scheduler is not bound to an event loop")
+		try:
+			await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+		except asyncio.TimeoutError:
+			pass
+		self._wakeup.clear()
+
+scan_scheduler = ScanScheduler()
@@ -0,0 +1,57 @@
+import abc
+from dataclasses import dataclass
+from typing import Callable
+
+from bleak import BleakScanner
+from bleak.args.bluez import BlueZDiscoveryFilters
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+DetectionCallback = Callable[[BLEDevice, AdvertisementData, "ScannerBackend"], None]
+
+scanning_filters: BlueZDiscoveryFilters = {
+	"Transport": "le",
+	"DuplicateData": False,
+	# "RSSI": -90
+}
+
+@dataclass
+class AdapterStats:
+	advertisements: int = 0
+	tracked_sightings: int = 0
+
+class ScannerBackend(abc.ABC):
+	"""A source of advertisements, usually one Bluetooth adapter"""
+
+	def __init__(self, name: str, detection_callback: DetectionCallback):
+		self.name = name
+		self.detection_callback = detection_callback
+		self.stats = AdapterStats()
+
+	def dispatch(self, device: BLEDevice, advertisement_data: AdvertisementData) -> None:
+		"""Forward an advertisement to the detection callback, tagged with this backend"""
+		self.stats.advertisements += 1
+		self.detection_callback(device, advertisement_data, self)
+
+	@abc.abstractmethod
+	async def start(self) -> None: ...
+
+	@abc.abstractmethod
+	async def stop(self) -> None: ...
+
+# Creates the backend for an adapter name, None meaning the default adapter
+ScannerBackendFactory = Callable[[str | None, DetectionCallback], ScannerBackend]
+
+class BleakScannerBackend(ScannerBackend):
+	def __init__(self, adapter: str | None, detection_callback: DetectionCallback):
+		super().__init__(adapter or "default", detection_callback)
+		if adapter is None:
+			self._scanner = BleakScanner(detection_callback=self.dispatch, scanning_filters=scanning_filters, scanning_mode="active")
+		else:
+			self._scanner = BleakScanner(detection_callback=self.dispatch, scanning_filters=scanning_filters, scanning_mode="active", adapter=adapter)
+
+	async def start(self) -> None:
+		await self._scanner.start()
+
+	async def stop(self) -> None:
+		await self._scanner.stop()
@@ -0,0 +1,156 @@
+import heapq
+from typing import NamedTuple
+
+
+class SensorReading(NamedTuple):
+	rssi: int
+	# estimated distance in meters
+	distance: float
+	# wall-clock time of the latest sighting
+	last_seen: float
+
+
+def estimate_distance(rssi: float, rssi_at_1m: float, path_loss_exponent: float) -> float:
+	"""Log-distance path loss model: `rssi_at_1m` at one meter, weaker by 10 * n dB per decade"""
+	return round(10 ** ((rssi_at_1m - rssi) / (10 * path_loss_exponent)), 2)
+
+
+class SensorThrottle:
+	"""
+	Decides which sensor readings are worth publishing. A device's reading is
+	published on the leading edge when its values moved beyond the deadbands and
+	at least `min_interval` seconds passed since its last publish, otherwise it
+	waits and the latest reading is published once the interval elapsed. Unchanged
+	readings are re-published after `max_interval` seconds so the last seen time
+	keeps moving. On top of that a token bucket allows at most `max_rate`
+	publishes per second over all devices.
+
+	Waiting devices live in a heap of (publish time, address) with at most one
+	live entry per address; entries whose publish time changed are skipped when
+	popped.
+	"""
+
+	def __init__(
+		self,
+		min_interval: float,
+		max_interval: float,
+		rssi_deadband: float,
+		distance_deadband: float,
+		max_rate: float,
+		rssi_at_1m: float = -59,
+		path_loss_exponent: float = 2.0,
+	):
+		if path_loss_exponent <= 0:
+			raise ValueError("Path loss exponent must be greater than 0")
+		self.min_interval = min_interval
+		self.max_interval = max_interval
+		self.rssi_deadband = rssi_deadband
+		self.distance_deadband = distance_deadband
+		self.max_rate = max_rate
+		self.rssi_at_1m = rssi_at_1m
+		self.path_loss_exponent = path_loss_exponent
+		self._latest: dict[str, SensorReading] = {}
+		# last published reading and time per device, oldest publish first
+		self._published: dict[str, tuple[SensorReading, float]] = {}
+		# address -> time its waiting reading may be published
+		self._waiting: dict[str, float] = {}
+		self._heap: list[tuple[float, str]] = []
+		self._tokens = max(max_rate, 1)
+		self._tokens_at = 0.0
+		self.sent = 0
+		self.suppressed = 0
+
+	def __len__(self) -> int:
+		return len(self._latest)
+
+	def latest(self, address: str) -> SensorReading | None:
+		return self._latest.get(address)
+
+	def record(self, address: str, rssi: float, seen_at: float, now: float) -> SensorReading | None:
+		"""Store a sighting. Returns the reading if it must be published right away."""
+		reading = SensorReading(round(rssi), estimate_distance(rssi, self.rssi_at_1m, self.path_loss_exponent), seen_at)
+		self._latest[address] = reading
+		if address in self._waiting:
+			self.suppressed += 1
+			return None
+		entry = self._published.get(address)
+		if entry is None:
+			publish_at = now
+		elif self._changed(entry[0], reading):
+			publish_at = entry[1] + self.min_interval
+		else:
+			self.suppressed += 1
+			return None
+		if publish_at <= now and self._take_token(now):
+			self._mark_published(address, reading, now)
+			return reading
+		self._wait(address, max(publish_at, now))
+		self.suppressed += 1
+		return None
+
+	def due(self, now: float) -> list[tuple[str, SensorReading]]:
+		"""Readings whose interval elapsed, and keep-alives of unchanged readings, within the rate limit"""
+		if self.max_interval > 0:
+			for address, (_, published_at) in self._published.items():
+				if published_at + self.max_interval > now:
+					break
+				if address not in self._waiting:
+					self._wait(address, published_at + self.max_interval)
+
+		due: list[tuple[str, SensorReading]] = []
+		while self._heap and self._heap[0][0] <= now:
+			publish_at, address = self._heap[0]
+			if self._waiting.get(address) != publish_at:
+				heapq.heappop(self._heap)
+				continue
+			reading = self._latest[address]
+			entry = self._published.get(address)
+			keep_alive = entry is not None and self.max_interval > 0 and entry[1] + self.max_interval <= now
+			if entry is not None and not keep_alive and not self._changed(entry[0], reading):
+				# the values went back into the deadband while waiting
+				heapq.heappop(self._heap)
+				del self._waiting[address]
+				continue
+			if not self._take_token(now):
+				break
+			heapq.heappop(self._heap)
+			del self._waiting[address]
+			self._mark_published(address, reading, now)
+			due.append((address, reading))
+		return due
+
+	def forget(self, addresses: list[str]) -> None:
+		# their heap entries are dropped when popped
+		for address in addresses:
+			self._latest.pop(address, None)
+			self._published.pop(address, None)
+			self._waiting.pop(address, None)
+
+	def stats(self) -> dict[str, int]:
+		return {"sent": self.sent, "suppressed": self.suppressed, "waiting": len(self._waiting)}
+
+	def _changed(self, published: SensorReading, reading: SensorReading) -> bool:
+		return (
+			abs(reading.rssi - published.rssi) >= self.rssi_deadband
+			or abs(reading.distance - published.distance) >= self.distance_deadband
+		)
+
+	def _wait(self, address: str, publish_at: float) -> None:
+		self._waiting[address] = publish_at
+		heapq.heappush(self._heap, (publish_at, address))
+
+	def _take_token(self, now: float) -> bool:
+		if self.max_rate <= 0:
+			return True
+		self._tokens = min(max(self.max_rate, 1), self._tokens + (now - self._tokens_at) * self.max_rate)
+		self._tokens_at = now
+		if self._tokens < 1:
+			return False
+		self._tokens -= 1
+		return True
+
+	def _mark_published(self, address: str, reading: SensorReading, now: float) -> None:
+		# re-inserting keeps the dict ordered by publish time
+		self._published.pop(address, None)
+		self._published[address] = (reading, now)
+		self.sent += 1
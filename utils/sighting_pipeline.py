@@ -0,0 +1,380 @@
+"""
+Pipeline mode of the continuous scanner: the detection callback only filters
+advertisements and packs the tracked ones into a shared-memory ring buffer, and
+a worker process makes the presence decisions. Only the decisions, and at most
+one sighting per device and second, with the RSSI smoothed by the worker,
+come back to the event loop.
+"""
+import asyncio
+import ctypes
+import logging
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Callable, Iterator, NamedTuple, Protocol
+
+from config import normalize_address
+from utils.last_seen import LastSeenTable
+from utils.metrics import Counter, Gauge, registry
+from utils.rssi_history import PresenceFilter, RssiHistory
+
+logger = logging.getLogger("utils.sighting_pipeline")
+
+# write count, read count, dropped records, decisions of the worker
+_HEADER = struct.Struct("<QQQQ")
+_WRITE_OFFSET = 0
+_READ_OFFSET = 8
+_DROPPED_OFFSET = 16
+_DECISIONS_OFFSET = 24
+_COUNTER = struct.Struct("<Q")
+# address, RSSI, adapter index, monotonic time
+RECORD = struct.Struct("<6sbBd")
+_pack_record = RECORD.pack_into
+_pack_counter = _COUNTER.pack_into
+# Seconds to wait for the lock guarding the ring counts, which is only held for a
+# store or a load; a lock left held by a dead worker is replaced on restart
+LOCK_TIMEOUT = 0.01
+# Seconds the worker sleeps when the ring is empty
+POLL_INTERVAL = 0.01
+# Sightings of a device are forwarded to the sighting listeners at most this often, in seconds
+SIGHTING_INTERVAL = 1.0
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(processName)s %(name)s: %(message)s"
+
+# (kind, address, RSSI, smoothed RSSI, monotonic time); kind is "home", "not_home" or "sighting"
+PipelineEvent = tuple[str, str, int | None, float | None, float]
+
+def pack_address(address: str) -> bytes:
+	return bytes.fromhex(normalize_address(address).replace(":", ""))
+
+class RingLock(Protocol):
+	def acquire(self, block: bool = ..., timeout: float = ..., /) -> bool: ...
+	def release(self) -> None: ...
+
+class SightingRing:
+	"""
+	Single-producer single-consumer ring of fixed-size sighting records in shared
+	memory; a full ring drops new records. The producer only advances the write
+	count and the consumer the read count. Python gives no ordering guarantee for
+	plain stores to shared memory, and weakly ordered CPUs such as ARM may make a
+	count visible before the records it covers, so both counts are only stored and
+	loaded while holding `lock`: the semaphore behind a multiprocessing lock is a
+	full memory barrier. The records themselves are written and read outside of it.
+	"""
+	def __init__(
+		self,
+		buffer: "ctypes.Array[ctypes.c_ubyte] | bytearray",
+		capacity: int,
+		lock: RingLock | None = None,
+	):
+		if capacity <= 0 or capacity & (capacity - 1):
+			raise ValueError("Ring capacity must be a power of two")
+		self.buffer = buffer
+		self.capacity = capacity
+		# a thread lock is enough when both sides live in one process
+		self.set_lock(lock if lock is not None else threading.Lock())
+		self._view = memoryview(buffer).cast("B")
+		self._mask = capacity - 1
+		self._write = self._counter(_WRITE_OFFSET)
+		self._read = self._counter(_READ_OFFSET)
+		# free slots as last seen by the producer, refreshed from the read count when used up
+		self._free = 0
+
+	@staticmethod
+	def size(capacity: int) -> int:
+		return _HEADER.size + capacity * RECORD.size
+
+	def _counter(self, offset: int) -> int:
+		return _COUNTER.unpack_from(self._view, offset)[0]
+
+	def set_lock(self, lock: RingLock) -> None:
+		"""Replace the lock, e.g. one left held by a worker that died"""
+		self._lock = lock
+		self._acquire = lock.acquire
+		self._release = lock.release
+
+	def _load(self, offset: int) -> int | None:
+		if not self._acquire(True, LOCK_TIMEOUT):
+			return None
+		try:
+			return _COUNTER.unpack_from(self._view, offset)[0]
+		finally:
+			self._release()
+
+	def _store(self, offset: int, value: int) -> bool:
+		if not self._acquire(True, LOCK_TIMEOUT):
+			return False
+		try:
+			_pack_counter(self._view, offset, value)
+		finally:
+			self._release()
+		return True
+
+	def push(self, address: bytes, rssi: int, adapter: int, at: float) -> bool:
+		"""Producer side. Returns False if the record was dropped."""
+		write = self._write
+		if self._free == 0:
+			# the consumer is done with the slots below the read count
+			read = self._load(_READ_OFFSET)
+			self._free = 0 if read is None else self.capacity - (write - read)
+			if self._free == 0:
+				_COUNTER.pack_into(self._view, _DROPPED_OFFSET, self._counter(_DROPPED_OFFSET) + 1)
+				return False
+		if not -128 <= rssi <= 127:
+			rssi = -128 if rssi < 0 else 127
+		_pack_record(self._view, _HEADER.size + (write & self._mask) * RECORD.size, address, rssi, adapter, at)
+		self._write = write + 1
+		self._free -= 1
+		# the release makes the record visible before the new count; when the lock
+		# is busy the count is published with the next record
+		if self._acquire(True, LOCK_TIMEOUT):
+			_pack_counter(self._view, _WRITE_OFFSET, write + 1)
+			self._release()
+		return True
+
+	def pop_all(self) -> Iterator[tuple[bytes, int, int, float]]:
+		"""Consumer side: the records written so far, oldest first"""
+		write = self._load(_WRITE_OFFSET)
+		if write is None:
+			return
+		while self._read < write:
+			start = self._read & self._mask
+			end = min(self.capacity, start + (write - self._read))
+			chunk = self._view[_HEADER.size + start * RECORD.size:_HEADER.size + end * RECORD.size]
+			yield from RECORD.iter_unpack(chunk)
+			self._read += end - start
+			if not self._store(_READ_OFFSET, self._read):
+				# the producer keeps seeing these slots as used until the next store
+				return
+
+	def add_decisions(self, count: int) -> None:
+		_COUNTER.pack_into(self._view, _DECISIONS_OFFSET, self._counter(_DECISIONS_OFFSET) + count)
+
+	def stats(self) -> dict[str, int]:
+		written, read, dropped, decisions = _HEADER.unpack_from(self._view, 0)
+		return {"enqueued": written, "processed": read, "dropped": dropped, "decisions": decisions, "depth": written - read}
+
+class WorkerSettings(NamedTuple):
+	addresses: list[str]
+	adapters: list[str]
+	away_timeout: float
+	enter_rssi: int | None
+	exit_rssi: int | None
+	rssi_history_size: int
+	# (address, monotonic last seen, RSSI, present) of the devices restored from the snapshot
+	restored: list[tuple[str, float, int | None, bool | None]]
+	log_level: int
+
+class PresenceWorker:
+	"""The presence decisions of the continuous scan mode, on records popped from the ring"""
+	def __init__(self, settings: WorkerSettings):
+		self.adapters = settings.adapters
+		self.presence = PresenceFilter(
+			RssiHistory(settings.rssi_history_size),
+			enter_rssi=settings.enter_rssi,
+			exit_rssi=settings.exit_rssi,
+		)
+		self.last_seen = LastSeenTable(settings.away_timeout)
+		self._addresses: dict[bytes, str] = {}
+		self._forwarded_at: dict[str, float] = {}
+		self.track(settings.addresses, time.monotonic())
+		self.last_seen.restore(settings.restored)
+		for address, _, _, present in settings.restored:
+			if present is not None:
+				self.presence.set_reported(address, present)
+
+	def track(self, addresses: list[str], now: float) -> None:
+		normalized = [normalize_address(address) for address in addresses]
+		for address in normalized:
+			self._addresses[pack_address(address)] = address
+		self.presence.track(normalized)
+		self.last_seen.track(normalized, now)
+
+	def untrack(self, addresses: list[str]) -> None:
+		normalized = [normalize_address(address) for address in addresses]
+		for address in normalized:
+			self._addresses.pop(pack_address(address), None)
+			self._forwarded_at.pop(address, None)
+		self.presence.untrack(normalized)
+		self.last_seen.untrack(normalized)
+
+	def process(self, records: Iterator[tuple[bytes, int, int, float]], events: list[PipelineEvent]) -> int:
+		"""Feed sighting records, appending the resulting events. Returns the number of records."""
+		count = 0
+		for packed, rssi, adapter, at in records:
+			count += 1
+			address = self._addresses.get(packed)
+			# sightings too weak to count do not keep the device present
+			if address is None or not self.presence.sighting(address, rssi, at):
+				continue
+			if at - self._forwarded_at.get(address, float("-inf")) >= SIGHTING_INTERVAL:
+				self._forwarded_at[address] = at
+				events.append(("sighting", address, rssi, self.presence.history.ema(address), at))
+			source = self.adapters[adapter] if adapter < len(self.adapters) else str(adapter)
+			if not self.last_seen.seen(address, rssi, at, source):
+				continue
+			self.presence.set_reported(address, True)
+			logger.info("Device %s arrived with RSSI %d on %s", address, rssi, source)
+			events.append(("home", address, rssi, None, at))
+		return count
+
+	def expire(self, now: float, events: list[PipelineEvent]) -> None:
+		for address in self.last_seen.pop_expired(now):
+			logger.info("Device %s not seen for %d seconds", address, self.last_seen.away_timeout)
+			self.presence.set_reported(address, False)
+			events.append(("not_home", address, None, None, now))
+
+def run_worker(
+	buffer: "ctypes.Array[ctypes.c_ubyte]",
+	capacity: int,
+	lock: RingLock,
+	settings: WorkerSettings,
+	control: Connection,
+	events_out: Connection,
+) -> None:
+	"""Entry point of the worker process"""
+	logging.basicConfig(level=settings.log_level, format=LOG_FORMAT)
+	ring = SightingRing(buffer, capacity, lock)
+	worker = PresenceWorker(settings)
+	logger.info("Presence worker started for %d devices", len(settings.addresses))
+	try:
+		while True:
+			while control.poll():
+				message = control.recv()
+				if message[0] == "stop":
+					return
+				if message[0] == "track":
+					worker.track(message[1], time.monotonic())
+				elif message[0] == "untrack":
+					worker.untrack(message[1])
+			events: list[PipelineEvent] = []
+			processed = worker.process(ring.pop_all(), events)
+			worker.expire(time.monotonic(), events)
+			if events:
+				ring.add_decisions(sum(kind != "sighting" for kind, _, _, _, _ in events))
+				events_out.send(events)
+			if not processed:
+				time.sleep(POLL_INTERVAL)
+	except (EOFError, BrokenPipeError, KeyboardInterrupt):
+		# the service is gone or shutting down
+		pass
+
+class SightingPipeline:
+	"""
+	The event loop side of the pipeline: owns the ring and the worker process,
+	and hands the events of the worker to `on_events`.
+	"""
+	def __init__(self, capacity: int, on_events: Callable[[list[PipelineEvent]], None]):
+		capacity = 1 << max(capacity - 1, 1).bit_length()
+		self._context = multiprocessing.get_context("spawn")
+		self._buffer = self._context.RawArray("B", SightingRing.size(capacity))
+		self._lock = self._context.Lock()
+		self.ring = SightingRing(self._buffer, capacity, self._lock)
+		self.on_events = on_events
+		self._packed: dict[str, bytes] = {}
+		self._process: BaseProcess | None = None
+		self._control: Connection | None = None
+		self._events: Connection | None = None
+		self._loop: asyncio.AbstractEventLoop | None = None
+
+	def start(self, loop: asyncio.AbstractEventLoop, settings: WorkerSettings) -> None:
+		self._loop = loop
+		self._lock = self._context.Lock()
+		self.ring.set_lock(self._lock)
+		control_out, control_in = self._context.Pipe(duplex=False)
+		events_in, events_out = self._context.Pipe(duplex=False)
+		self._process = self._context.Process(
+			target=run_worker,
+			args=(self._buffer, self.ring.capacity, self._lock, settings, control_out, events_out),
+			name="presence-worker",
+			daemon=True,
+		)
+		self._process.start()
+		# the child holds its own copies
+		control_out.close()
+		events_out.close()
+		self._control = control_in
+		self._events = events_in
+		loop.add_reader(events_in.fileno(), self._read_events)
+		logger.info("Started presence worker process %s with a ring of %d records", self._process.pid, self.ring.capacity)
+
+	def is_alive(self) -> bool:
+		return self._process is not None and self._process.is_alive()
+
+	def submit(self, address: str, rssi: int, adapter: int, at: float) -> bool:
+		packed = self._packed.get(address)
+		if packed is None:
+			packed = self._packed[address] = pack_address(address)
+		return self.ring.push(packed, rssi, adapter, at)
+
+	def track(self, addresses: list[str]) -> None:
+		self._send(("track", addresses))
+
+	def untrack(self, addresses: list[str]) -> None:
+		for address in addresses:
+			self._packed.pop(address, None)
+		self._send(("untrack", addresses))
+
+	def stop(self) -> None:
+		self._send(("stop",))
+		if self._events is not None:
+			if self._loop is not None:
+				self._loop.remove_reader(self._events.fileno())
+			self._events.close()
+			self._events = None
+		if self._process is not None:
+			self._process.join(timeout=2)
+			if self._process.is_alive():
+				self._process.terminate()
+			self._process = None
+		if self._control is not None:
+			self._control.close()
+			self._control = None
+
+	def _send(self, message: tuple[object, ...]) -> None:
+		if self._control is None:
+			return
+		try:
+			self._control.send(message)
+		except (BrokenPipeError, OSError) as e:
+			logger.warning("Could not reach the presence worker: %s", e)
+
+	def _read_events(self) -> None:
+		if self._events is None:
+			return
+		try:
+			events: list[PipelineEvent] = self._events.recv()
+		except (EOFError, OSError):
+			logger.error("Presence worker exited")
+			if self._loop is not None:
+				self._loop.remove_reader(self._events.fileno())
+			self._events.close()
+			self._events = None
+			return
+		self.on_events(events)
+
+_pipeline: SightingPipeline | None = None
+
+def set_active_pipeline(pipeline: SightingPipeline | None) -> None:
+	"""The pipeline whose counters are exported as metrics"""
+	global _pipeline
+	_pipeline = pipeline
+
+for _stat, _help in (
+	("enqueued", "Sightings enqueued by the detection callback"),
+	("dropped", "Sightings dropped because the ring was full"),
+	("processed", "Sightings processed by the presence worker"),
+	("decisions", "Home and not_home decisions of the presence worker"),
+):
+	registry.register(Counter(
+		f"pipeline_{_stat}_total",
+		_help,
+		lambda stat=_stat: _pipeline.ring.stats()[stat] if _pipeline is not None else 0,
+	))
+registry.register(Gauge(
+	"pipeline_ring_depth",
+	"Sightings waiting in the ring",
+	lambda: _pipeline.ring.stats()["depth"] if _pipeline is not None else 0,
+))
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Iterable, Iterator
+
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from utils.advertisement_recording import RecordedAdvertisement
+from utils.scanner_backend import DetectionCallback, ScannerBackend
+
+logger = logging.getLogger("utils.synthetic_backend")
+
+# Time ranges, relative to the start of the stream, during which a device advertises
+PresenceWindows = dict[str, list[tuple[float, float]]]
+
+def generate_advertisements(
+	addresses: list[str],
+	rate: float,
+	duration: float,
+	presence: PresenceWindows | None = None,
+	seed: int = 0,
+) -> Iterator[RecordedAdvertisement]:
+	"""
+	Advertisements at `rate` per second from randomly chosen addresses. Addresses
+	listed in `presence` only advertise inside their windows, the others always do.
+	"""
+	rng = random.Random(seed)
+	presence = presence or {}
+	always_present = [address for address in addresses if address not in presence]
+	# every presence window start or end changes the pool of advertising devices
+	changes = sorted(
+		{edge for windows in presence.values() for window in windows for edge in window if 0 < edge < duration}
+	)
+	boundaries = [0.0, *changes, duration]
+
+	index = 0
+	for window_start, window_end in zip(boundaries, boundaries[1:]):
+		midpoint = (window_start + window_end) / 2
+		pool = always_present + [
+			address
+			for address, windows in presence.items()
+			if any(start <= midpoint < end for start, end in windows)
+		]
+		while index / rate < window_end:
+			if pool:
+				yield RecordedAdvertisement(index / rate, rng.choice(pool), rng.randint(-95, -40), None)
+			index += 1
+
+class SyntheticScannerBackend(ScannerBackend):
+	"""
+	Feeds a generated or recorded advertisement stream into the detection callback,
+	in real time scaled by `speed`, without any Bluetooth hardware.
+	"""
+	def __init__(
+		self,
+		name: str,
+		detection_callback: DetectionCallback,
+		advertisements: Iterable[RecordedAdvertisement],
+		speed: float = 1.0,
+	):
+		super().__init__(name, detection_callback)
+		self._advertisements = iter(advertisements)
+		self.speed = speed
+		self.stream_started_at: float | None = None
+		self._devices: dict[str, BLEDevice] = {}
+		self._advertisement_data: dict[int, AdvertisementData] = {}
+		self._task: asyncio.Task[None] | None = None
+		self.finished = asyncio.Event()
+
+	async def start(self) -> None:
+		if self._task is None:
+			self._task = asyncio.create_task(self._run())
+
+	async def stop(self) -> None:
+		# the stream keeps its position, like a radio that keeps advertising while
+		# nobody listens, but nothing is delivered until the next start
+		if self._task is not None:
+			self._task.cancel()
+			self._task = None
+
+	async def _run(self) -> None:
+		run_started_at = time.monotonic()
+		if self.stream_started_at is None:
+			self.stream_started_at = run_started_at
+		for advertisement in self._advertisements:
+			due = self.stream_started_at + advertisement.offset / self.speed
+			if due < run_started_at:
+				# sent while the scanner was stopped
+				continue
+			delay = due - time.monotonic()
+			if delay > 0.001:
+				await asyncio.sleep(delay)
+			self.dispatch(self._device(advertisement), self._advertisement(advertisement.rssi))
+		self.finished.set()
+
+	def _device(self, advertisement: RecordedAdvertisement) -> BLEDevice:
+		device = self._devices.get(advertisement.address)
+		if device is None or device.name != advertisement.name:
+			device = BLEDevice(advertisement.address, advertisement.name, None)
+			self._devices[advertisement.address] = device
+		return device
+
+	def _advertisement(self, rssi: int) -> AdvertisementData:
+		data = self._advertisement_data.get(rssi)
+		if data is None:
+			data = AdvertisementData(
+				local_name=None,
+				manufacturer_data={},
+				service_data={},
+				service_uuids=[],
+				tx_power=None,
+				rssi=rssi,
+				platform_data=(),
+			)
+			self._advertisement_data[rssi] = data
+		return data